@@ -158,6 +158,37 @@ app.post('/api/generate-insight', validateRequest, async (req, res) => {
     }
 });
 
+// Forward dataset questions to the Python query service (src/scripts/service.py),
+// which keeps the dataframe, indexes and chains warm; the NDJSON stream is piped through
+app.post('/api/query', async (req, res) => {
+    const { query } = req.body;
+    if (!query || typeof query !== 'string' || query.trim().length === 0) {
+        return res.status(400).json({ error: 'Invalid query. Please provide a non-empty string.' });
+    }
+    if (!process.env.QUERY_SERVICE_URL) {
+        return res.status(503).json({ error: 'Query service not configured' });
+    }
+
+    try {
+        const response = await fetch(`${process.env.QUERY_SERVICE_URL}/query`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ query })
+        });
+
+        if (!response.ok) {
+            console.error('Query service error:', response.status);
+            return res.status(response.status).json({ error: 'Unable to answer query' });
+        }
+
+        res.setHeader('Content-Type', 'application/x-ndjson');
+        response.body.pipe(res);
+    } catch (error) {
+        console.error('Error in query endpoint:', error);
+        res.status(500).json({ error: 'Service temporarily unavailable' });
+    }
+});
+
 // Error handling middleware
 app.use((err, req, res, next) => {
     console.error('Unhandled error:', err);
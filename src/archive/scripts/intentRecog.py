@@ -4,6 +4,7 @@
 # moving beyond retrieve and answer
 
 import os
+import sys
 import pandas as pd
 from datetime import datetime
 from langchain_google_genai import ChatGoogleGenerativeAI
@@ -11,7 +12,11 @@ from langchain_experimental.agents import create_pandas_dataframe_agent
 # from langchain.agents.agent_types import AgentType
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_community.tools.tavily_search import TavilySearchResults
+
+# offline gazetteer lives with the eval scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "scripts"))
+from gazetteer import Gazetteer
+from context_sketch import sketch_for
 
 # --- Configuration ---
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -28,6 +33,9 @@ os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 # 1. load data
 df = pd.read_csv(CSV_PATH)
+# compact summary (quantiles, trends, diverse rows) for the analysis prompt;
+# computed once per dataset version
+data_sketch = sketch_for(df)
 
 # 2. initialize models
 llm = ChatGoogleGenerativeAI(
@@ -78,8 +86,8 @@ pandas_agent = create_pandas_dataframe_agent(
     handle_parsing_errors=True
 )
 
-# 5. web search with tavily; convert lat/lon coords to landmarks
-web_search_tool = TavilySearchResults(max_results=1)
+# 5. offline reverse geocoding; convert lat/lon coords to campus landmarks
+gazetteer = Gazetteer()
 
 # 5.5 logging function
 def log_response(query, response, status="success"):
@@ -113,10 +121,9 @@ def process_bus_query(user_query):
 
     # b) analytical translation (schema-aware structured prompt)
     col_list = ", ".join(df.columns)
-    sample_values = df.head(2).to_dict(orient="records")
     analysis_prompt = (
         f"Dataset schema — columns: [{col_list}]. "
-        f"Sample rows: {sample_values}. "
+        f"Data sketch:\n{data_sketch}\n"
         f"Total rows: {len(df)}. "
         f"\nUser question: '{user_query}'.\n"
         "Instructions: Identify the relevant column(s) from the schema, "
@@ -135,18 +142,10 @@ def process_bus_query(user_query):
     print(f"Insight found! {insight}")
 
     # c) contextual enrichment
-    enrichment_context = ""
-    if "latitude" in insight.lower() or "longitude" in insight.lower():
-         # Ask LLM to extract coordinates for search
-        coord_extraction = llm.invoke(f"Extract just the latitude and longitude from this text as a string 'lat, lon': {insight}")
-        coords = coord_extraction.content.strip()
-
-        print(f"reverse geocoding coords: {coords}")
-        try:
-            search_result = web_search_tool.invoke(f"What landmark is at coordinates {coords}?")
-            enrichment_context = f"Location context: {search_result}"
-        except:
-            enrichment_context = "Location context: Could not retrieve external landmark data"
+    # coordinates are parsed from the insight directly (no LLM call, no web search)
+    enrichment_context = gazetteer.annotate(insight)
+    if enrichment_context:
+        print(f"reverse geocoded: {enrichment_context}")
     
     # d) final synthesis; combining into one
     final_prompt = f"""
@@ -0,0 +1,368 @@
+"""
+approx.py
+---------
+Approximate query mode: stratified reservoir samples with confidence intervals.
+
+Rows are stratified by hour of day x location cell (CELL_DEG grid), a grid
+that stops growing once the route and the service hours are covered, and every
+stratum keeps a uniform reservoir plus its population count N_h. Reservoirs
+share a global SAMPLE_BUDGET: each holds min(RESERVOIR_K, SAMPLE_BUDGET /
+strata) rows (at least MIN_RESERVOIR), and when new strata appear the others
+are subsampled down, which keeps them uniform. A new batch is merged per
+stratum by drawing how many of the merged reservoir come from the batch
+(hypergeometric) and taking uniform subsets of both sides, so loading the
+dataset and appending ingest batches are the same vectorized update.
+
+Estimates use the standard stratified estimators with weights N_h / n_h:
+    mean / proportion / count / sum   ratio estimator over the strata, variance
+                                      by linearization with finite-population
+                                      correction (1 - n_h / N_h)
+    quantile                          weighted quantile, Woodruff interval
+and come back as {estimate, ci_low, ci_high, ...}. Strata that fit in their
+reservoir are exact (zero variance), so small data gives exact answers and big
+data keeps a sample of about SAMPLE_BUDGET rows however long the history is:
+interactive latency does not grow with the row count. exact() re-runs the same
+request on the full dataframe.
+
+Usage:
+    # Compare estimates + CIs with exact answers on a dataset:
+    python approx.py --csv ../../data/raw/bus_data_enlarged.csv
+
+    # Agent / eval: approx_* tools and `sample` in the REPL
+    python eval.py --approx
+"""
+
+import io
+import os
+import json
+import time
+import hashlib
+import argparse
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+BASE_DIR      = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT   = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
+SAMPLE_PATH   = os.path.join(PROCESSED_DIR, "approx_sample.csv")
+
+CELL_DEG      = 0.005     # one stratum per ~550 m grid cell x hour of day
+RESERVOIR_K   = 200       # most rows kept per stratum ...
+MIN_RESERVOIR = 30        # ... and fewest, however many strata there are
+SAMPLE_BUDGET = 20_000    # rows kept across all strata
+CONFIDENCE    = 0.95
+STRATUM       = "_stratum"
+LAYOUT        = "hour_of_day:cell"   # strata key format (ingest rebuilds on change)
+
+
+def strata_keys(df, cell_deg=CELL_DEG):
+    """'<hour of day>:<lat cell>:<lon cell>' per row."""
+    ts = pd.to_datetime(df["timestamp"]).to_numpy("datetime64[s]").astype(np.int64)
+    parts = (ts // 3600 % 24,
+             np.floor(df["latitude"].to_numpy(np.float64) / cell_deg).astype(np.int64),
+             np.floor(df["longitude"].to_numpy(np.float64) / cell_deg).astype(np.int64))
+    return pd.Series(parts[0].astype(str), index=df.index).str.cat(
+        [pd.Series(p.astype(str), index=df.index) for p in parts[1:]], sep=":")
+
+
+def _take_random(keys, quota, rng):
+    """Boolean mask keeping quota[key] uniformly chosen rows of each key."""
+    order = rng.permutation(len(keys))
+    shuffled = keys.iloc[order]
+    rank = shuffled.groupby(shuffled, sort=False).cumcount().to_numpy()
+    keep = np.zeros(len(keys), dtype=bool)
+    keep[order] = rank < shuffled.map(quota).fillna(0).to_numpy()
+    return keep
+
+
+class StratifiedSample:
+    """Per-stratum uniform reservoirs sharing one row budget, plus population counts."""
+
+    def __init__(self, k=RESERVOIR_K, budget=SAMPLE_BUDGET, seed=0, cell_deg=CELL_DEG):
+        self.k_max, self.budget = k, budget
+        self.k = k
+        self.cell_deg = cell_deg
+        self.rng = np.random.default_rng(seed)
+        self.rows = None                     # sample rows + _stratum
+        self.population = pd.Series(dtype=np.int64)   # N_h
+
+    @classmethod
+    def from_frame(cls, df, **kwargs):
+        sample = cls(**kwargs)
+        sample.update(df)
+        return sample
+
+    def __len__(self):
+        return 0 if self.rows is None else len(self.rows)
+
+    @property
+    def n_population(self):
+        return int(self.population.sum())
+
+    def _reservoir_size(self, n_strata):
+        return min(self.k_max, max(MIN_RESERVOIR, self.budget // max(n_strata, 1)))
+
+    def _shrink(self, k):
+        """Cut every reservoir to k rows (a uniform subset of a uniform sample is uniform)."""
+        self.k = k
+        if self.rows is not None and len(self.rows):
+            quota = pd.Series(k, index=self.rows[STRATUM].unique())
+            self.rows = self.rows[_take_random(self.rows[STRATUM], quota, self.rng)].reset_index(drop=True)
+
+    def update(self, batch):
+        """Merge a batch of new rows into every stratum it touches."""
+        if batch.empty:
+            return self
+        batch = batch.assign(**{STRATUM: strata_keys(batch, self.cell_deg)})
+        m = batch[STRATUM].value_counts()
+        k = self._reservoir_size(len(self.population.index.union(m.index)))
+        if k < self.k:
+            self._shrink(k)
+        old_n = self.population.reindex(m.index, fill_value=0)
+        target = np.minimum(self.k, old_n + m)
+        # how many of each merged reservoir come from the batch
+        from_new = pd.Series(self.rng.hypergeometric(m.to_numpy(), old_n.to_numpy(), target.to_numpy()),
+                             index=m.index)
+        keep_new = _take_random(batch[STRATUM], from_new, self.rng)
+
+        if self.rows is None:
+            self.rows = batch[keep_new].reset_index(drop=True)
+        else:
+            old_quota = (target - from_new).reindex(self.rows[STRATUM].unique())
+            old_quota = old_quota.fillna(self.k)   # untouched strata keep everything
+            keep_old = _take_random(self.rows[STRATUM], old_quota, self.rng)
+            self.rows = pd.concat([self.rows[keep_old], batch[keep_new]], ignore_index=True)
+        self.population = self.population.add(m, fill_value=0).astype(np.int64)
+        return self
+
+    # ---- estimators ----
+
+    def _domain(self, where):
+        rows = self.rows
+        mask = np.ones(len(rows), dtype=bool) if not where else rows.eval(where).to_numpy(bool)
+        n_h = rows.groupby(STRATUM, sort=False)[STRATUM].transform("size").to_numpy()
+        N_h = rows[STRATUM].map(self.population).to_numpy(np.float64)
+        return rows, mask, n_h, N_h
+
+    def _ratio(self, y, mask, n_h, N_h, strata):
+        """Estimated sum(y * mask) / sum(mask) and its standard error."""
+        w = N_h / n_h
+        total_d = float(np.sum(w * mask))
+        if total_d == 0:
+            raise ValueError("No sampled rows match the condition")
+        r = float(np.sum(w * y * mask)) / total_d
+        z = (y - r) * mask        # linearized residual
+        frame = pd.DataFrame({"s": strata, "z": z})
+        g = frame.groupby("s", sort=False)["z"]
+        var_h = g.var(ddof=1).fillna(0.0)
+        n = g.size()
+        N = self.population.reindex(n.index).astype(np.float64)
+        var = float(np.sum(N ** 2 * (1 - n / N) * var_h / n)) / total_d ** 2
+        return r, np.sqrt(max(var, 0.0)), total_d
+
+    def _result(self, kind, estimate, se, where, **extra):
+        z = NormalDist().inv_cdf(0.5 + CONFIDENCE / 2)
+        return {"kind": kind, "estimate": estimate, "ci_low": estimate - z * se,
+                "ci_high": estimate + z * se, "confidence": CONFIDENCE, "where": where,
+                "sample_rows": len(self), "population_rows": self.n_population,
+                "exact": se == 0.0, **extra}
+
+    def mean(self, column, where=None):
+        rows, mask, n_h, N_h = self._domain(where)
+        y = rows[column].to_numpy(np.float64)
+        r, se, _ = self._ratio(y, mask, n_h, N_h, rows[STRATUM].to_numpy())
+        return self._result("mean", r, se, where, column=column)
+
+    def proportion(self, where):
+        rows, mask, n_h, N_h = self._domain(where)
+        ones = np.ones(len(rows), dtype=bool)
+        p, se, _ = self._ratio(mask.astype(np.float64), ones, n_h, N_h, rows[STRATUM].to_numpy())
+        return self._result("proportion", p, se, where)
+
+    def count(self, where):
+        p = self.proportion(where)
+        n = self.n_population
+        return {**p, "kind": "count", "estimate": p["estimate"] * n,
+                "ci_low": max(p["ci_low"], 0.0) * n, "ci_high": min(p["ci_high"], 1.0) * n}
+
+    def quantile(self, column, q, where=None):
+        rows, mask, n_h, N_h = self._domain(where)
+        y = rows[column].to_numpy(np.float64)[mask]
+        w = (N_h / n_h)[mask]
+        if not len(y):
+            raise ValueError("No sampled rows match the condition")
+        order = np.argsort(y, kind="stable")
+        y, w = y[order], w[order]
+        cdf = np.cumsum(w) / w.sum()
+
+        def at(p):
+            return float(y[min(np.searchsorted(cdf, p, side="left"), len(y) - 1)])
+
+        estimate = at(q)
+        # Woodruff: CI of the proportion below the estimate, mapped back through the cdf
+        below = rows[column].to_numpy(np.float64) <= estimate
+        _, se, _ = self._ratio(below.astype(np.float64), mask, n_h, N_h, rows[STRATUM].to_numpy())
+        z = NormalDist().inv_cdf(0.5 + CONFIDENCE / 2)
+        result = self._result("quantile", estimate, se, where, column=column, q=q)
+        result.update(ci_low=at(max(q - z * se, 0.0)), ci_high=at(min(q + z * se, 1.0)))
+        return result
+
+    def frame(self):
+        """Sample rows with their weight N_h / n_h (for ad-hoc weighted pandas)."""
+        rows = self.rows
+        n_h = rows.groupby(STRATUM, sort=False)[STRATUM].transform("size")
+        return rows.assign(_weight=rows[STRATUM].map(self.population) / n_h)
+
+    # ---- persistence (ingest.py keeps the sample current) ----
+    # rows go to the CSV, then the population goes to <name>_strata.json along
+    # with a hash of that CSV; load() refuses a pair written by different saves
+
+    def save(self, path=SAMPLE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        body = self.rows.to_csv(index=False)
+        with open(path + ".tmp", "w", encoding="utf-8", newline="") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        strata_path = path.replace(".csv", "_strata.json")
+        with open(strata_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"layout": LAYOUT, "rows_sha1": hashlib.sha1(body.encode("utf-8")).hexdigest(),
+                       "population": {str(k): int(v) for k, v in self.population.items()}}, f)
+        os.replace(strata_path + ".tmp", strata_path)
+
+    @classmethod
+    def load(cls, path=SAMPLE_PATH, **kwargs):
+        with open(path.replace(".csv", "_strata.json"), encoding="utf-8") as f:
+            strata = json.load(f)
+        with open(path, encoding="utf-8", newline="") as f:
+            body = f.read()
+        if (strata.get("layout") != LAYOUT
+                or hashlib.sha1(body.encode("utf-8")).hexdigest() != strata["rows_sha1"]):
+            raise ValueError(f"{path} does not match its strata file (interrupted save or old layout)")
+        sample = cls(**kwargs)
+        sample.rows = pd.read_csv(io.StringIO(body), dtype={STRATUM: str})
+        sample.population = pd.Series(strata["population"], dtype=np.int64)
+        sample.k = sample._reservoir_size(len(sample.population))
+        return sample
+
+
+def exact(df, kind, column=None, where=None, q=None):
+    """The same request answered on the full dataframe."""
+    rows = df if not where else df[df.eval(where).to_numpy(bool)]
+    if kind == "mean":
+        value = float(rows[column].mean())
+    elif kind == "proportion":
+        value = len(rows) / len(df)
+    elif kind == "count":
+        value = float(len(rows))
+    elif kind == "quantile":
+        value = float(rows[column].quantile(q, interpolation="lower"))
+    else:
+        raise ValueError(f"Unknown estimate kind '{kind}'")
+    return {"kind": kind, "estimate": value, "ci_low": value, "ci_high": value,
+            "confidence": 1.0, "where": where, "sample_rows": len(df),
+            "population_rows": len(df), "exact": True}
+
+
+def describe(result):
+    est = result["estimate"]
+    if result["exact"]:
+        return f"{est:.6g} (exact, {result['population_rows']:,} rows)"
+    return (f"~{est:.6g} ({result['confidence']:.0%} CI {result['ci_low']:.6g} to "
+            f"{result['ci_high']:.6g}; estimated from {result['sample_rows']:,} of "
+            f"{result['population_rows']:,} rows)")
+
+
+# ====================================================
+# Agent tools
+# ====================================================
+
+def _parse_args(text):
+    """'column=c, q=0.9, where=<pandas expr>' — where runs to the end of the input."""
+    from kernels import _parse_tool_input
+    text = str(text).strip().strip("'\"` ")
+    head, sep, where = text.partition("where=")
+    args = _parse_tool_input(head)
+    if sep:
+        args["where"] = where.strip().strip("'\"` ") or None
+    return args
+
+
+class ApproxToolkit:
+    """approx_* tools over a StratifiedSample; exact=true re-runs on the full df."""
+
+    def __init__(self, sample, df):
+        self.sample, self.df = sample, df
+
+    def _run(self, kind, text):
+        args = _parse_args(text)
+        kwargs = {k: args[k] for k in ("column", "where", "q") if k in args}
+        t0 = time.perf_counter()
+        if str(args.get("exact", "")).lower() in ("true", "1", "yes"):
+            result = exact(self.df, kind, **kwargs)
+        else:
+            result = getattr(self.sample, kind)(**kwargs)
+        return f"{describe(result)} [{(time.perf_counter() - t0) * 1000:.1f}ms]"
+
+    def as_tools(self):
+        from langchain_core.tools import Tool
+
+        def tool(kind, usage):
+            def call(text):
+                try:
+                    return self._run(kind, text)
+                # unknown columns in where= raise pandas' UndefinedVariableError, a NameError
+                except (ValueError, KeyError, TypeError, SyntaxError, NameError) as e:
+                    return f"Error: {e}"
+            return Tool(name=f"approx_{kind}", func=call, description=(
+                f"Approximate {kind} from a stratified sample (time x location) with a "
+                f"{CONFIDENCE:.0%} confidence interval; constant time on any data size. "
+                f"Input: '{usage}'. Optional where=<pandas expression> LAST; add exact=true "
+                "only when the user asks for an exact answer."))
+
+        return [
+            tool("mean", "column=<col>"),
+            tool("proportion", "where=<condition>"),
+            tool("count", "where=<condition>"),
+            tool("quantile", "column=<col>, q=<0..1>"),
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stratified-sample estimates vs exact answers.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    parser.add_argument("--k", type=int, default=RESERVOIR_K, help="Largest reservoir per stratum.")
+    parser.add_argument("--budget", type=int, default=SAMPLE_BUDGET, help="Rows kept across all strata.")
+    parser.add_argument("--save", action="store_true", help=f"Write the sample to {SAMPLE_PATH}.")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    t0 = time.perf_counter()
+    sample = StratifiedSample.from_frame(df, k=args.k, budget=args.budget)
+    print(f"{len(sample):,}-row sample of {len(df):,} rows across {len(sample.population)} strata "
+          f"in {time.perf_counter() - t0:.2f}s")
+
+    requests = [
+        ("mean", {"column": "accel_mean"}),
+        ("mean", {"column": "accel_variance", "where": "accel_stats_z_p99 > 10.5"}),
+        ("proportion", {"where": "accel_stats_x_p99 > 2"}),
+        ("count", {"where": "longitude > -84.39 and longitude < -84.38"}),
+        ("quantile", {"column": "accel_stats_z_p99", "q": 0.9}),
+    ]
+    for kind, kwargs in requests:
+        t0 = time.perf_counter()
+        est = getattr(sample, kind)(**kwargs)
+        t_est = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        truth = exact(df, kind, **kwargs)
+        t_exact = time.perf_counter() - t0
+        # exact answers have a zero-width interval: allow float summation noise
+        tol = 1e-9 * max(1.0, abs(truth["estimate"])) if est["exact"] else 0.0
+        covered = est["ci_low"] - tol <= truth["estimate"] <= est["ci_high"] + tol
+        print(f"\n{kind} {kwargs}\n  approx {describe(est)} in {t_est * 1000:.1f}ms"
+              f"\n  exact  {truth['estimate']:.6g} in {t_exact * 1000:.1f}ms  (inside CI: {covered})")
+    if args.save:
+        sample.save()
+        print(f"\nSaved → {SAMPLE_PATH}")
@@ -0,0 +1,243 @@
+"""
+context_sketch.py
+-----------------
+Compact, token-bounded summary of a dataset for LLM prompts, replacing
+df.head(2).
+
+The CSV is stored newest-first, so head(2) is two identical rows from the last
+seconds of the trip: the model learns nothing about ranges, trends or typical
+rows and spends agent iterations exploring. The sketch instead gives:
+
+    span        time range, row count, sort order
+    quantiles   min / p5 / p25 / p50 / p75 / p95 / max per numeric column
+    trends      Largest-Triangle-Three-Buckets (Steinarsson 2013) downsampling
+                of KEY_COLUMNS in time order: few points, but the peaks and
+                turns of the series survive
+    exemplars   a handful of distinct rows chosen by greedy k-center (farthest
+                point) selection over standardized numeric columns, so they
+                cover the data instead of clustering at one end
+
+Detail is reduced level by level until the text fits TOKEN_BUDGET (estimated
+at ~4 characters per token): trends go first, then exemplars, then quantile
+rows; if even the span line does not fit, the text is cut to the budget. The result is cached in
+data/processed/context_sketch.json per dataset version (row count, columns and
+a strided row hash), so it is computed once per version of the data.
+
+Usage:
+    # Print the sketch and its token estimate:
+    python context_sketch.py --csv ../../data/raw/bus_data.csv
+
+    # Tighter budget:
+    python context_sketch.py --budget 400
+"""
+
+import os
+import json
+import time
+import hashlib
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+BASE_DIR      = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT   = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
+SKETCH_CACHE  = os.path.join(PROCESSED_DIR, "context_sketch.json")
+
+KEY_COLUMNS  = ("accel_mean", "accel_variance", "accel_stats_x_p99",
+                "accel_stats_y_p99", "accel_stats_z_p99")
+CONTEXT_COLUMNS = ("timestamp", "latitude", "longitude")
+COORD_COLUMNS = ("latitude", "longitude")
+QUANTILES    = (0.0, 0.05, 0.25, 0.5, 0.75, 0.95, 1.0)
+TOKEN_BUDGET = 600
+CHARS_PER_TOKEN = 4
+MAX_FULL_ROW_COLUMNS = 24   # wider rows show CONTEXT_COLUMNS + KEY_COLUMNS only
+HASH_ROWS    = 1000         # rows hashed for the dataset version
+
+# (trend points, exemplar rows, quantile columns; None = all), most detailed first
+LEVELS = [(16, 5, None), (12, 4, None), (10, 4, 12), (8, 3, 8), (6, 2, 6), (4, 1, 4), (0, 1, 3),
+          (0, 0, 3), (0, 0, 1), (0, 0, 0)]
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def lttb(x, y, n_out):
+    """Indices of the n_out points LTTB keeps from the series (x, y), x ascending."""
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:max(n_out, 0)]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)   # n_out - 2 inner buckets
+    keep = [0]
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # average of the next bucket (or the last point) is the third triangle corner
+        nlo, nhi = edges[b + 1], edges[b + 2] if b + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        ax, ay = x[keep[-1]], y[keep[-1]]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        keep.append(lo + int(np.argmax(area)))
+    keep.append(n - 1)
+    return np.asarray(keep)
+
+
+def k_center(X, k):
+    """Greedy farthest-point selection; starts from the row nearest the median."""
+    if len(X) == 0:
+        return np.array([], dtype=np.int64)
+    first = int(np.argmin(np.abs(X - np.median(X, axis=0)).sum(axis=1)))
+    chosen = [first]
+    dist = np.linalg.norm(X - X[first], axis=1)
+    while len(chosen) < min(k, len(X)):
+        nxt = int(np.argmax(dist))
+        if dist[nxt] == 0:
+            break
+        chosen.append(nxt)
+        dist = np.minimum(dist, np.linalg.norm(X - X[nxt], axis=1))
+    return np.asarray(chosen)
+
+
+def _fmt(value, column=None):
+    if isinstance(value, (float, np.floating)):
+        # coordinates need ~1 m resolution to be worth showing
+        return f"{value:.8g}" if column in COORD_COLUMNS else f"{value:.4g}"
+    return str(value)
+
+
+def _order_note(ts):
+    if ts.is_monotonic_decreasing:
+        return "df is sorted newest-first"
+    if ts.is_monotonic_increasing:
+        return "df is sorted oldest-first"
+    return "df is not sorted by time"
+
+
+class SketchParts:
+    """Everything the sketch can show; render(level) formats one detail level."""
+
+    def __init__(self, df):
+        self.rows = len(df)
+        self.numeric = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+        self.ts = pd.to_datetime(df["timestamp"]) if "timestamp" in df.columns else None
+        self.quantiles = df[self.numeric].quantile(list(QUANTILES)) if self.numeric else None
+        self.key = [c for c in KEY_COLUMNS if c in df.columns] or self.numeric[:3]
+
+        # row order for the trend columns; None = df is already oldest-first
+        # (attached shm frames), so no sorted copy of df is kept
+        self.frame, self.trend_order = df, None
+        if self.ts is not None:
+            order = None if self.ts.is_monotonic_increasing else np.argsort(self.ts.to_numpy(), kind="stable")
+            self.trend_ts = self.ts if order is None else self.ts.iloc[order]
+            self.trend_order = order
+            self.trend_x = self.trend_ts.to_numpy("datetime64[s]").astype(np.int64).astype(np.float64)
+            multi_day = self.ts.max() - self.ts.min() > pd.Timedelta(days=1)
+            self.stamp_format = "%m-%d %H:%M" if multi_day else "%H:%M"
+        else:
+            self.trend_ts, self.trend_x = None, np.arange(len(df), dtype=np.float64)
+
+        # distinct rows only: the feed repeats each window for minutes
+        distinct = df.drop_duplicates(subset=self.numeric) if self.numeric else df
+        values = distinct[self.numeric].to_numpy(np.float64) if self.numeric else np.zeros((len(distinct), 1))
+        scale = np.nanstd(values, axis=0)
+        standardized = np.nan_to_num((values - np.nanmean(values, axis=0)) / np.where(scale > 0, scale, 1))
+        self.exemplar_order = distinct.iloc[k_center(standardized, max(l[1] for l in LEVELS))]
+        wide = len(df.columns) > MAX_FULL_ROW_COLUMNS
+        self.row_columns = ([c for c in CONTEXT_COLUMNS + tuple(self.key) if c in df.columns]
+                            if wide else list(df.columns))
+
+    def render(self, level):
+        points, exemplars, quantile_cols = level
+        lines = []
+        if self.ts is not None:
+            lines.append(f"Span: {self.ts.min()} to {self.ts.max()}, {self.rows:,} rows "
+                         f"({_order_note(self.ts)}).")
+        else:
+            lines.append(f"{self.rows:,} rows.")
+
+        if self.quantiles is not None:
+            # key columns first, so trimming drops the less informative ones
+            ranked = self.key + [c for c in self.numeric if c not in self.key]
+            cols = ranked[:quantile_cols] if quantile_cols is not None else ranked
+            header = "/".join("min" if q == 0 else "max" if q == 1 else f"p{int(q * 100)}" for q in QUANTILES)
+            if cols:
+                lines.append(f"Quantiles ({header}):")
+            for col in cols:
+                lines.append(f"  {col}: " + " / ".join(_fmt(v, col) for v in self.quantiles[col]))
+            if len(cols) < len(self.numeric):
+                lines.append(f"  ... {len(self.numeric) - len(cols)} more numeric column(s)")
+
+        if points:
+            lines.append(f"Trends in time order (LTTB, {points} points, time=value):")
+            for col in self.key:
+                y = self.frame[col].to_numpy(np.float64)
+                if self.trend_order is not None:
+                    y = y[self.trend_order]
+                idx = lttb(self.trend_x, np.nan_to_num(y), points)
+                stamps = (self.trend_ts.iloc[idx].dt.strftime(self.stamp_format) if self.trend_ts is not None
+                          else idx.astype(str))
+                lines.append(f"  {col}: " + ", ".join(f"{t}={_fmt(v)}" for t, v in zip(stamps, y[idx])))
+
+        if exemplars:
+            lines.append("Representative rows (k-center over standardized numeric columns):")
+            lines.append("  " + ", ".join(self.row_columns))
+            for _, row in self.exemplar_order.head(exemplars)[self.row_columns].iterrows():
+                lines.append("  " + ", ".join(_fmt(v, col) for col, v in row.items()))
+        return "\n".join(lines)
+
+
+def build_sketch(df, token_budget=TOKEN_BUDGET):
+    """The most detailed LEVELS entry that fits the token budget (cut to fit if none does)."""
+    parts = SketchParts(df)
+    for level in LEVELS:
+        text = parts.render(level)
+        if estimate_tokens(text) <= token_budget:
+            return text
+    # whole lines first, then characters
+    text = text[:max(0, (token_budget - 1) * CHARS_PER_TOKEN)]
+    cut = text.rfind("\n")
+    return text[:cut] if cut > 0 else text
+
+
+def dataset_version(df):
+    """Row count, columns and a hash of up to HASH_ROWS evenly spaced rows."""
+    step = max(1, len(df) // HASH_ROWS)
+    digest = hashlib.sha1(f"{len(df)}|{'|'.join(map(str, df.columns))}".encode())
+    digest.update(pd.util.hash_pandas_object(df.iloc[::step], index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def sketch_for(df, token_budget=TOKEN_BUDGET, cache_path=SKETCH_CACHE):
+    """build_sketch, cached per dataset version and budget."""
+    key = f"{dataset_version(df)}:{token_budget}"
+    cache = {}
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+    if key not in cache:
+        cache[key] = build_sketch(df, token_budget)
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f, indent=2)
+    return cache[key]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Token-bounded dataset sketch for LLM prompts.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    parser.add_argument("--budget", type=int, default=TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    t0 = time.perf_counter()
+    sketch = build_sketch(df, args.budget)
+    elapsed = time.perf_counter() - t0
+    print(sketch)
+    head = str(df.head(2).to_dict(orient="records"))
+    print(f"\n~{estimate_tokens(sketch)} tokens (budget {args.budget}) in {elapsed * 1000:.0f}ms; "
+          f"df.head(2) was ~{estimate_tokens(head)} tokens")
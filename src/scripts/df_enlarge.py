@@ -1,13 +1,21 @@
 import os
+import argparse
 import numpy as np
 import pandas as pd
 
+from partitions import PARTITION_ROOT, write_partitions
+
 # --- Configuration ---
 CSV_PATH = "../../data/raw/bus_data.csv"
 OUTPUT_DIR = "./output"
 NEWCSV_FILE = os.path.join(OUTPUT_DIR, "bus_data_enlarged.csv")
 MULTIPLIER = 100
 
+parser = argparse.ArgumentParser(description="Enlarge the bus dataset by simulating more days.")
+parser.add_argument("--partitioned", action="store_true",
+                    help=f"Also write the date=/vehicle= Parquet layout to {PARTITION_ROOT}.")
+args = parser.parse_args()
+
 # Ensure output directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
@@ -47,4 +55,9 @@ df_enlarged = pd.concat(enlarged_frames, ignore_index=True)
 df_enlarged.to_csv(NEWCSV_FILE, index=False)
 
 print(f"\nENLARGED SHAPE: {df_enlarged.shape}")
-print(f"Saved to {NEWCSV_FILE}")
\ No newline at end of file
+print(f"Saved to {NEWCSV_FILE}")
+
+# 4. one directory per simulated day, so day-scoped queries read one day (partitions.py)
+if args.partitioned:
+    written = write_partitions(df_enlarged, PARTITION_ROOT)
+    print(f"Wrote {len(written)} partition file(s) under {PARTITION_ROOT}")
\ No newline at end of file
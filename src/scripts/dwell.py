@@ -0,0 +1,287 @@
+"""
+dwell.py
+--------
+Vectorized dwell-event detector for the dwellTime intent.
+
+A fix-to-fix step is "still" when the bus moved slower than STILL_SPEED_MPS
+(GPS jitter at a stop is a few metres per 3 s fix). Maximal runs of still steps
+lasting at least MIN_DWELL_S become dwell events with start/end/duration and a
+centroid. Detection is pure NumPy (kernels.consecutive_runs + cumsum), no per-row Python.
+
+The detector is incremental: it keeps the still run that is still open at the
+end of the data, so appending rows only scans the new rows plus that tail.
+Results are persisted to data/processed/dwell_events.csv (+ a small state file)
+for the agent (`dwell_events` in its REPL) and the `dwell-events` template.
+The state records the detector parameters and a fingerprint of the fixes it
+has folded in (row count + an order-independent sum of row hashes), so it is
+only reused for a dataset that extends exactly those fixes with those
+parameters; anything else rebuilds.
+
+Usage:
+    # Build / incrementally refresh the persisted dwell table:
+    python dwell.py
+
+    # Point to any CSV:
+    python dwell.py --csv path/to/file.csv
+"""
+
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from geo import haversine_m, time_ordered_fixes
+from kernels import consecutive_runs
+
+# --- Configuration ---
+BASE_DIR      = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT   = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
+DWELL_TABLE   = os.path.join(PROCESSED_DIR, "dwell_events.csv")
+DWELL_STATE   = os.path.join(PROCESSED_DIR, "dwell_state.json")
+
+STILL_SPEED_MPS = 1.0   # slower than walking pace between fixes = not moving
+MIN_DWELL_S     = 30    # shorter pauses are just traffic noise
+MAX_GAP_S       = 120   # a longer gap between fixes breaks a run (sensor dropout)
+SPOT_DECIMALS   = 4     # ~10 m cells when ranking dwell spots
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+EVENT_COLUMNS = ["start", "end", "duration_s", "latitude", "longitude", "n_fixes", "ongoing"]
+
+
+# ====================================================
+# Run detection
+# ====================================================
+
+def fixes_hash(ts, lat, lon):
+    """Order-independent hash of a set of fixes (sum of row hashes mod 2**64)."""
+    rows = pd.DataFrame({"ts": ts, "lat": lat, "lon": lon})
+    return int(pd.util.hash_pandas_object(rows, index=False).to_numpy().sum(dtype=np.uint64))
+
+
+def detect_runs(ts, lat, lon, still_speed=STILL_SPEED_MPS, max_gap_s=MAX_GAP_S):
+    """
+    Stationary runs over time-ordered fixes.
+    Returns (starts, ends) as inclusive fix indices.
+    """
+    if len(ts) < 2:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+
+    dt = np.diff(ts)
+    step = haversine_m(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    still = (dt <= max_gap_s) & (step <= still_speed * np.maximum(dt, 1))
+
+    # step k joins fix k -> k+1, so a run of steps s..e spans fixes s..e+1
+    starts, ends = consecutive_runs(still)
+    return starts, ends + 1
+
+
+def _events_from_runs(ts, lat, lon, starts, ends):
+    """Event arrays for the given runs; centroids via prefix sums."""
+    csum_lat = np.concatenate(([0.0], np.cumsum(lat)))
+    csum_lon = np.concatenate(([0.0], np.cumsum(lon)))
+    n_fixes = ends - starts + 1
+    return {
+        "start": ts[starts],
+        "end": ts[ends],
+        "duration_s": ts[ends] - ts[starts],
+        "latitude": (csum_lat[ends + 1] - csum_lat[starts]) / n_fixes,
+        "longitude": (csum_lon[ends + 1] - csum_lon[starts]) / n_fixes,
+        "n_fixes": n_fixes,
+    }
+
+
+# ====================================================
+# Incremental detector
+# ====================================================
+
+class DwellDetector:
+    """Keeps closed dwell events plus the open run at the end of the data."""
+
+    def __init__(self, still_speed=STILL_SPEED_MPS, min_dwell_s=MIN_DWELL_S,
+                 max_gap_s=MAX_GAP_S):
+        self.still_speed = still_speed
+        self.min_dwell_s = min_dwell_s
+        self.max_gap_s = max_gap_s
+        self.closed = pd.DataFrame(columns=EVENT_COLUMNS[:-1])
+        self.tail = (np.empty(0, np.int64), np.empty(0), np.empty(0))
+        self.first_ts = None
+        self.watermark = None    # newest timestamp already processed
+        self.n_rows = 0
+        self.fingerprint = 0     # fixes_hash of every fix processed so far
+
+    def update(self, df):
+        """Feed new rows (any order). Rows at or before the watermark are skipped."""
+        ts, lat, lon = time_ordered_fixes(df)
+        if self.watermark is not None:
+            keep = ts > self.watermark
+            ts, lat, lon = ts[keep], lat[keep], lon[keep]
+        if not len(ts):
+            return 0
+
+        if self.first_ts is None:
+            self.first_ts = int(ts[0])
+        self.watermark = int(ts[-1])
+        self.n_rows += len(ts)
+        self.fingerprint = (self.fingerprint + fixes_hash(ts, lat, lon)) % 2**64
+
+        ts  = np.concatenate((self.tail[0], ts))
+        lat = np.concatenate((self.tail[1], lat))
+        lon = np.concatenate((self.tail[2], lon))
+
+        starts, ends = detect_runs(ts, lat, lon, self.still_speed, self.max_gap_s)
+        last = len(ts) - 1
+        is_open = ends == last
+
+        events = pd.DataFrame(_events_from_runs(ts, lat, lon, starts[~is_open], ends[~is_open]))
+        events = events[events["duration_s"] >= self.min_dwell_s]
+        if len(events):
+            self.closed = (events.reset_index(drop=True) if self.closed.empty
+                           else pd.concat([self.closed, events], ignore_index=True))
+
+        # carry the open run (or just the last fix) into the next update
+        tail_from = starts[is_open][0] if is_open.any() else last
+        self.tail = (ts[tail_from:], lat[tail_from:], lon[tail_from:])
+        return len(events)
+
+    def params(self):
+        return {"still_speed": self.still_speed, "min_dwell_s": self.min_dwell_s,
+                "max_gap_s": self.max_gap_s}
+
+    def covers(self, ts, lat, lon):
+        """True when exactly the fixes of (ts, lat, lon) up to the watermark were processed."""
+        if self.watermark is None:
+            return False
+        seen = ts <= self.watermark
+        return (int(seen.sum()) == self.n_rows
+                and fixes_hash(ts[seen], lat[seen], lon[seen]) == self.fingerprint)
+
+    def table(self, include_open=True):
+        events = self.closed.assign(ongoing=False)
+        ts, lat, lon = self.tail
+        if include_open and len(ts) > 1 and ts[-1] - ts[0] >= self.min_dwell_s:
+            tail_event = pd.DataFrame(_events_from_runs(
+                ts, lat, lon, np.array([0]), np.array([len(ts) - 1]))).assign(ongoing=True)
+            events = pd.concat([events, tail_event], ignore_index=True)
+
+        events = events.astype({"start": np.int64, "end": np.int64,
+                                "duration_s": np.int64, "n_fixes": np.int64})
+        for col in ("start", "end"):
+            events[col] = pd.to_datetime(events[col], unit="s").dt.strftime(TS_FORMAT)
+        return events[EVENT_COLUMNS]
+
+    # ---- persistence ----
+
+    def save(self, table_path=DWELL_TABLE, state_path=DWELL_STATE):
+        os.makedirs(os.path.dirname(table_path), exist_ok=True)
+        self.table().to_csv(table_path, index=False)
+        state = {
+            "params": self.params(),
+            "first_ts": self.first_ts,
+            "watermark": self.watermark,
+            "n_rows": self.n_rows,
+            # the table is written first: after a crash between the two files the
+            # state still describes the previous table's first n_closed events
+            "n_closed": len(self.closed),
+            "fingerprint": str(self.fingerprint),
+            "tail": [arr.tolist() for arr in self.tail],
+        }
+        tmp = state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, state_path)
+
+    @classmethod
+    def load(cls, table_path=DWELL_TABLE, state_path=DWELL_STATE):
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        detector = cls(**state["params"])
+        detector.first_ts = state["first_ts"]
+        detector.watermark = state["watermark"]
+        detector.n_rows = state["n_rows"]
+        # older state files carry no fingerprint: they never match, so they rebuild
+        detector.fingerprint = int(state.get("fingerprint", -1))
+        detector.tail = (np.asarray(state["tail"][0], np.int64),
+                         np.asarray(state["tail"][1], np.float64),
+                         np.asarray(state["tail"][2], np.float64))
+
+        closed = pd.read_csv(table_path)
+        closed = closed[~closed["ongoing"]].drop(columns="ongoing")
+        closed = closed.head(state.get("n_closed", len(closed))).reset_index(drop=True)
+        for col in ("start", "end"):
+            closed[col] = pd.to_datetime(closed[col]).astype("int64") // 10**9
+        detector.closed = closed
+        return detector
+
+
+def load_dwell_events(df, table_path=DWELL_TABLE, state_path=DWELL_STATE,
+                      still_speed=STILL_SPEED_MPS, min_dwell_s=MIN_DWELL_S, max_gap_s=MAX_GAP_S):
+    """
+    Dwell table for df, reusing the persisted table when it was built with the
+    same parameters from a prefix of df's fixes (scanning only the rows past its
+    watermark), and rebuilding it otherwise.
+    """
+    params = {"still_speed": still_speed, "min_dwell_s": min_dwell_s, "max_gap_s": max_gap_s}
+    ts, lat, lon = time_ordered_fixes(df)
+    last_ts = int(ts[-1]) if len(ts) else None
+
+    detector = None
+    if os.path.exists(table_path) and os.path.exists(state_path):
+        detector = DwellDetector.load(table_path, state_path)
+        # other parameters, a different dataset or a rewritten one -> rebuild
+        if detector.params() != params or not detector.covers(ts, lat, lon):
+            detector = None
+
+    if detector is None:
+        detector = DwellDetector(**params)
+    if detector.watermark != last_ts:
+        detector.update(df)
+        detector.save(table_path, state_path)
+    return detector.table()
+
+
+# ====================================================
+# Summaries for the template / router
+# ====================================================
+
+def top_dwell_spots(events, n=5, decimals=SPOT_DECIMALS):
+    """Total dwell time per ~10 m cell, longest first."""
+    spots = events.assign(latitude=events["latitude"].round(decimals),
+                          longitude=events["longitude"].round(decimals))
+    return (
+        spots.groupby(["latitude", "longitude"])
+        .agg(events=("duration_s", "size"), total_dwell_s=("duration_s", "sum"))
+        .nlargest(n, "total_dwell_s")
+        .reset_index()
+    )
+
+
+def dwell_summary(df):
+    """Template variables for the `dwell-events` prompt."""
+    events = load_dwell_events(df)
+    if events.empty:
+        return {"dwellEvents": "No dwell events detected."}
+    longest = events.nlargest(5, "duration_s")[["start", "end", "duration_s", "latitude", "longitude"]]
+    text = (
+        f"{len(events)} dwell events (stationary >= {MIN_DWELL_S}s), "
+        f"total dwell time {events['duration_s'].sum()}s.\n"
+        f"Top spots by total dwell time:\n{top_dwell_spots(events).to_string(index=False)}\n"
+        f"Longest events:\n{longest.round(6).to_string(index=False)}"
+    )
+    return {"dwellEvents": text}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detect and persist dwell events.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    t0 = time.perf_counter()
+    events = load_dwell_events(df)
+    print(f"{len(events)} dwell events in {(time.perf_counter() - t0) * 1000:.1f}ms "
+          f"-> {DWELL_TABLE}")
+    print(top_dwell_spots(events).to_string(index=False))
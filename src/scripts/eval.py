@@ -18,6 +18,59 @@ Usage:
     # when the queries are beyond the scope..
     python eval.py --out_of_scope
 
+    # Distance / detour queries answered from the route index:
+    python eval.py --route
+
+    # Force the LLM guardrail for every query (no local scope classifier):
+    python eval.py --llm_guardrail
+
+    # Disable the intent router (every query runs the full agent pipeline):
+    python eval.py --no_router
+
+    # DuckDB text-to-SQL backend (sql_engine.py), alone or next to the pandas agent:
+    python eval.py --engine sql
+    python eval.py --engine both
+
+    # Always run the agent, ignoring cached generated code (plan_cache.py):
+    python eval.py --no_plan_cache
+
+    # Start the agent while the LLM guardrail is still deciding (cancelled on REJECT):
+    python eval.py --speculative
+
+    # All queries in one batched session (one rewrite+guard call, one agent program):
+    python eval.py --batch
+
+    # Approximate mode: aggregates from stratified samples with confidence intervals (approx.py):
+    python eval.py --approx
+
+    # Date/vehicle-partitioned Parquet (partitions.py; written by df_enlarge.py --partitioned);
+    # --dates / --vehicles prune at load, so every index and tool sees the same rows:
+    python eval.py --partitioned
+    python eval.py --partitioned --dates 2025-06-08:2025-06-10 --vehicles bus-01
+
+    # Drop rows failing the percentile integrity checks before answering (quality.py):
+    python eval.py --exclude_bad_rows
+
+    # Top-k schema retrieval for the rewriter / guardrail prompts (schema_index.py;
+    # on by default for schemas wider than SCHEMA_INDEX_MIN_COLUMNS):
+    python eval.py --schema_index
+
+    # Results stream to output/eval_results.jsonl (result_log.py); also append the
+    # run to output/eval_responses.md as markdown:
+    python eval.py --markdown
+
+    # Ground truth only: pandas, no LangChain import, no GROQ_API_KEY needed:
+    python eval.py --ground_truth_only
+    python eval.py --ground_truth_only --route
+
+    # Append an `-X importtime` summary of the entry points (import_profile.py):
+    python eval.py --profile_imports
+
+Heavy dependencies (langchain_groq, the langchain_experimental agent, prompts,
+callbacks) and the pipeline modules are imported by the stage that first needs
+them, so importing eval (loadgen, service, sql_engine, scope_classifier) and the
+ground-truth path only pay for pandas.
+
 
 DESCRIPTION:
 i) Inferring analytical intent and query rewriting
@@ -29,40 +82,44 @@ counts). The rewriter maps the loose human vocabulary in the query ti exact, ava
 
 ii) Integrated guardrail and data extraction
 Focuses on feasibility, rejects queries that require external data (e.g., "what was the weather?") or speculative
-derivations that the available sensors cannot support. Once approved, the query is handed to a Pandas DataFrame Agent.
+derivations that the available sensors cannot support. A local embedding classifier (scope_classifier.py) settles
+clear-cut cases in about a millisecond; only ambiguous queries escalate to the LLM guardrail.
+Once approved, the query is handed to a Pandas DataFrame Agent.
 Executes python code against the IoT CSV dataframe.
 
 iii) Natural language contextualization
 The raw data returned from the Pandas execution (e.g., a list of coordinates with high variance) is
 transformed back into a human-readable format.
-GOAL [will take care of this with tavily];
-TODO (ignore for now)]: map the raw data points to meaningful real-world anchors, such as campus specific landmarks or timestamps
+Coordinates in the raw result are mapped to the nearest campus landmark offline (gazetteer.py: local landmark
+file, grid index, memoized lookups) and passed along as location context.
 LLM synthesizes this contextualized data into a natural language response that matches the conversational style 
 of the original user query, providing a direct answer without requiring the user to interpret technical coordinates
 or statistics.
 """
 
 import os
+import re
 import sys
 import time
+import asyncio
 import argparse
+import threading
+import contextlib
 import warnings
-import pandas as pd
 from datetime import datetime
-from langchain_groq import ChatGroq
-from langchain_experimental.agents import create_pandas_dataframe_agent
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.callbacks import BaseCallbackHandler
-from langchain_core.agents import AgentAction, AgentFinish
+from functools import lru_cache
+
+import pandas as pd
 
 from queries import (
-    TEST_QUERIES, QUERY_INTENT, OUT_OF_SCOPE,
-    GROUND_TRUTH_FNS, GT_OUT_OF_SCOPE,
+    TEST_QUERIES, QUERY_INTENT, OUT_OF_SCOPE, ROUTE_QUERIES,
+    GT_OUT_OF_SCOPE, GT_ROUTE_FNS,
 )
 
 # --- Configuration ---
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+# Point ChatGroq at another OpenAI-compatible endpoint (e.g. mock_llm.py for load tests)
+GROQ_API_BASE = os.getenv("GROQ_API_BASE")
 
 BASE_DIR     = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 CSV_DEFAULT  = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
@@ -71,7 +128,9 @@ CSV_ENLARGED = os.path.join(BASE_DIR, "data", "raw", "bus_data_enlarged.csv")
 OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "output")
 LOG_FILE   = os.path.join(OUTPUT_DIR, "eval_responses.md")
 
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Wider schemas put only the top-k retrieved columns into the rewriter /
+# guardrail prompts (schema_index.py) instead of every column
+SCHEMA_INDEX_MIN_COLUMNS = 40
 
 
 # ====================================================
@@ -133,24 +192,45 @@ UNMAPPABLE: <comma-separated list of unmappable concepts, or NONE>
 # Callback handler to capture agent reasoning trace
 # ====================================================
 
-class ThinkingCaptureHandler(BaseCallbackHandler):
-    """Collects the agent's Thought / Action / Observation steps into a list."""
+@lru_cache(maxsize=None)
+def _thinking_handler_class():
+    # defined on first use so importing eval does not import langchain_core
+    from langchain_core.callbacks import BaseCallbackHandler
+    from langchain_core.agents import AgentAction, AgentFinish
+
+    class ThinkingCaptureHandler(BaseCallbackHandler):
+        """Collects the agent's Thought / Action / Observation steps into a list."""
 
-    def __init__(self):
-        self.steps: list[str] = []
+        def __init__(self):
+            self.steps: list[str] = []
+            # (tool, input, observation) per call, for the plan cache
+            self.tool_calls: list[tuple[str, str, str]] = []
+            self.last_value = None
 
-    def on_agent_action(self, action: AgentAction, **kwargs) -> None:
-        self.steps.append(f"Thought + Action: {action.log.strip()}")
-        self.steps.append(f"Action Input: {action.tool_input}")
+        def on_agent_action(self, action: AgentAction, **kwargs) -> None:
+            self.steps.append(f"Thought + Action: {action.log.strip()}")
+            self.steps.append(f"Action Input: {action.tool_input}")
+            self.tool_calls.append((action.tool, str(action.tool_input), None))
 
-    def on_tool_end(self, output: str, **kwargs) -> None:
-        self.steps.append(f"Observation: {output.strip()}")
+        def on_tool_end(self, output, **kwargs) -> None:
+            # the REPL hands back the evaluated object (DataFrame, Series, ...)
+            self.last_value = output
+            self.steps.append(f"Observation: {str(output).strip()}")
+            if self.tool_calls and self.tool_calls[-1][2] is None:
+                tool, tool_input, _ = self.tool_calls[-1]
+                self.tool_calls[-1] = (tool, tool_input, str(output))
 
-    def on_agent_finish(self, finish: AgentFinish, **kwargs) -> None:
-        self.steps.append(f"Final Answer: {finish.return_values.get('output', '').strip()}")
+        def on_agent_finish(self, finish: AgentFinish, **kwargs) -> None:
+            self.steps.append(f"Final Answer: {finish.return_values.get('output', '').strip()}")
 
-    def get_trace(self) -> str:
-        return "\n".join(self.steps) if self.steps else "(no steps captured)"
+        def get_trace(self) -> str:
+            return "\n".join(self.steps) if self.steps else "(no steps captured)"
+
+    return ThinkingCaptureHandler
+
+
+def new_thinking_handler():
+    return _thinking_handler_class()()
 
 def build_schema_summary(dataframe):
     """Auto-derive column summary from any dataframe — no hardcoding.
@@ -164,21 +244,64 @@ def build_schema_summary(dataframe):
     return "\n".join(lines)
 
 
-def init_llm_components(df):
-    if not GROQ_API_KEY:
-        raise ValueError("Missing GROQ_API_KEY. Set it before running eval.py")
-
-    llm = ChatGroq(
+def build_llm(http_client=None, http_async_client=None):
+    """Optional httpx clients let a long-lived process reuse pooled keep-alive connections."""
+    from langchain_groq import ChatGroq
+    return ChatGroq(
         groq_api_key=GROQ_API_KEY,
         model_name="llama-3.1-8b-instant",
         temperature=0.0,
+        base_url=GROQ_API_BASE,
+        http_client=http_client,
+        http_async_client=http_async_client,
     )
 
-    # Pre-compute column metadata (min, max, unique counts) once at load time;
-    # fed as context to the rewriter so it can map ambiguous terms to real columns.
-    column_metadata = build_column_metadata(df)
 
-    # Build the rewriter chain (needs the live llm instance)
+GUARDRAIL_SYSTEM = """
+You are a schema gatekeeper for a tabular dataset.
+
+Dataset columns (and dtypes/examples):
+{schema}
+
+Decision policy:
+1. Return PROCEED only if the query can be answered using ONLY these dataset columns.
+2. Return REJECT if the query needs:
+   - missing columns,
+   - external data sources,
+   - speculative modeling/derivation not directly supported by available columns.
+
+Output contract (MUST follow exactly, single line):
+- If answerable: PROCEED
+- If not answerable: REJECT: <short reason>
+"""
+
+
+def build_guardrail_chain(llm, schema, schema_index=None):
+    """With a schema_index the prompt lists only the columns retrieved for the query."""
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnablePassthrough
+    prompt = ChatPromptTemplate.from_messages(
+        [
+            ("system", GUARDRAIL_SYSTEM),
+            ("human", "Query: {query}"),
+        ]
+    )
+    if schema_index is None:
+        # variable values are not parsed, so braces in the examples need no escaping
+        return prompt.partial(schema=schema) | llm | StrOutputParser()
+
+    def retrieved_schema(inputs):
+        columns = [col for col, _ in schema_index.retrieve(inputs["query"])]
+        return schema_index.schema_text(columns) or "(no column relates to this query)"
+
+    return RunnablePassthrough.assign(schema=retrieved_schema) | prompt | llm | StrOutputParser()
+
+
+def build_rewriter(llm, column_metadata, schema_index=None):
+    """Schema-aware rewriter shared by the pandas and SQL engines."""
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
     rewriter_chain = (
         ChatPromptTemplate.from_messages([
             ("system", REWRITER_SYSTEM),
@@ -187,18 +310,26 @@ def init_llm_components(df):
         | llm
         | StrOutputParser()
     )
+    meta_str = "\n".join(
+        f"- '{col}': {info}" for col, info in column_metadata.items()
+    )
 
     def rewrite_query(user_query):
         """
         Schema-aware query rewriter.
         Returns (rewritten_query: str, unmappable: list[str])
         """
-        meta_str = "\n".join(
-            f"- '{col}': {info}" for col, info in column_metadata.items()
-        )
+        column_metadata_str = meta_str
+        if schema_index is not None:
+            # only the top-k columns for this query; none relevant = unmappable
+            hits = schema_index.retrieve(user_query)
+            if not hits:
+                return user_query, [user_query.strip()]
+            column_metadata_str = schema_index.metadata_lines([col for col, _ in hits])
+
         response = rewriter_chain.invoke({
             "query": user_query,
-            "column_metadata": meta_str,
+            "column_metadata": column_metadata_str,
         }).strip()
 
         rewritten = user_query      # fallback
@@ -214,15 +345,20 @@ def init_llm_components(df):
 
         return rewritten, unmappable
 
-    # NL response contextualizer — converts raw agent output into a
-    # human-readable natural language answer
-    contextualizer_chain = (
+    return rewrite_query
+
+
+def build_contextualizer(llm):
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    return (
         ChatPromptTemplate.from_messages([
             ("system",
              "You are a data analyst assistant. Given the user's original question "
              "and the raw analytical result, produce a clear, concise natural language "
              "response that directly answers the question. Do NOT include code or "
-             "technical details — just the answer in plain English."),
+             "technical details — just the answer in plain English. If location context "
+             "is given, refer to the named landmark rather than raw coordinates."),
             ("human",
              "Question: {question}\n\nRaw result: {raw_answer}"),
         ])
@@ -230,63 +366,343 @@ def init_llm_components(df):
         | StrOutputParser()
     )
 
-    col_list     = ", ".join(df.columns)
-    sample_rows  = df.head(2).to_dict(orient="records")
-    total_rows   = len(df)
 
+def local_gate(rewritten_query, scope_classifier):
     """
-    TODO [IGNORE] -- one idea...
-    RAG for schema: creating a tiny vector store of column descriptions
-    we search for relevant columns first; if none match the query keywords, REJECT
-    but i feel build_schema_summary(df) doesn't take all that long anyway
+    Local scope classifier verdict: ("reject", (answer, trace)), ("proceed", None),
+    or ("escalate", None) when the LLM guardrail has to decide.
     """
+    from scope_classifier import IN_SCOPE, OUT_OF_SCOPE_LABEL
+    scope = scope_classifier.classify(rewritten_query) if scope_classifier else None
+    if scope and scope["label"] == OUT_OF_SCOPE_LABEL:
+        missing = ", ".join(scope["out_hits"]) or "concepts outside the dataset"
+        return "reject", (
+            f"[REJECTED] Query requires data not present in dataset: {missing}",
+            f"Local scope classifier: {scope}",
+        )
+    if scope and scope["label"] == IN_SCOPE:
+        return "proceed", None
+    return "escalate", None
 
-    schema = build_schema_summary(df)
-    guardrail_context = f"""
-You are a schema gatekeeper for a tabular dataset.
+
+def guardrail_rejection(decision):
+    """None for PROCEED, else (rejection answer, trace)."""
+    decision = decision.strip()
+    if decision == "PROCEED":
+        return None
+    if decision.startswith("REJECT:"):
+        reason = decision.split("REJECT:", 1)[1].strip()
+        return f"[REJECTED] {reason}", f"Guardrail decision: {decision}"
+    return f"[REJECTED] {decision}", f"Guardrail decision: {decision}"
+
+
+def gate_query(rewritten_query, scope_classifier, guardrail_chain):
+    """
+    Local scope classifier first; only ambiguous queries (or all of them when
+    the classifier is disabled) escalate to the LLM guardrail.
+    Returns None to proceed, else (rejection answer, trace).
+    """
+    verdict, rejection = local_gate(rewritten_query, scope_classifier)
+    if verdict != "escalate":
+        return rejection
+    return guardrail_rejection(guardrail_chain.invoke({"query": rewritten_query}))
+
+
+# ====================================================
+# Multi-question batches
+# One structured rewrite+guard call for N questions, one agent program that
+# computes every answer, one contextualizer call for whatever is not rendered.
+# ====================================================
+
+BATCH_GATE_SYSTEM = """
+You are the schema-aware query rewriter AND gatekeeper for a batch of questions about one
+tabular IoT sensor dataset.
+
+Column metadata (names, dtypes, statistics):
+{column_metadata}
 
 Dataset columns (and dtypes/examples):
 {schema}
 
-Decision policy:
-1. Return PROCEED only if the query can be answered using ONLY these dataset columns.
-2. Return REJECT if the query needs:
-   - missing columns,
-   - external data sources,
-   - speculative modeling/derivation not directly supported by available columns.
+For EACH numbered question:
+1. Rewrite it into a precise, unambiguous question that uses the exact column names above.
+Keep every threshold, date, count and aggregation; replace vague terms with columns; do NOT invent columns.
+2. Decide whether it can be answered using ONLY these columns. REJECT questions that need missing
+columns, external data sources, or speculative modeling the columns cannot support.
 
-Output contract (MUST follow exactly, single line):
-- If answerable: PROCEED
-- If not answerable: REJECT: <short reason>
+Output exactly one line per question, in the given order, and nothing else:
+Q<n>: PROCEED | <rewritten question>
+Q<n>: REJECT | <short reason>
 """
 
-    guardrail_chain = (
-        ChatPromptTemplate.from_messages(
-            [
-                ("system", guardrail_context),
-                ("human", "Query: {query}"),
-            ]
-        )
+BATCH_CONTEXT_SYSTEM = (
+    "You are a data analyst assistant. For each numbered question and its raw analytical "
+    "result, write a clear, concise natural language answer that directly answers it. Do NOT "
+    "include code or technical details. If location context is given, refer to the named "
+    "landmark rather than raw coordinates.\n"
+    "Output exactly one line per question, in the given order: A<n>: <answer>"
+)
+
+BATCH_GATE_LINE = re.compile(r"^\s*Q(\d+)\s*:\s*(PROCEED|REJECT)\s*\|\s*(.*)$", re.IGNORECASE)
+
+
+def split_numbered(text, prefix="Q"):
+    """{n: text} from 'Q1: ...' style output; a result may run over several lines."""
+    parts = re.split(rf"^\s*\**{prefix}(\d+)\**\s*:", str(text), flags=re.MULTILINE)
+    numbered = {}
+    for n, body in zip(parts[1::2], parts[2::2]):
+        body = body[1:] if body.startswith(" ") else body
+        # keep a table's header indentation (renderer.py relies on it)
+        numbered[int(n)] = body.strip("\n").rstrip() if "\n" in body.strip() else body.strip()
+    return numbered
+
+
+def _numbered(items, prefix="Q"):
+    return "\n".join(f"{prefix}{i}: {item}" for i, item in enumerate(items, 1))
+
+
+def build_batch_gate(llm, column_metadata, schema, schema_index=None):
+    """Rewrite + guard N questions in one call -> [(verdict, rewritten or reason) or None]."""
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    meta_str = "\n".join(f"- '{col}': {info}" for col, info in column_metadata.items())
+    chain = (
+        ChatPromptTemplate.from_messages([
+            ("system", BATCH_GATE_SYSTEM),
+            ("human", "Questions:\n{questions}"),
+        ])
         | llm
         | StrOutputParser()
     )
 
-    # Escape curly braces in sample_rows to prevent LangChain template variable errors
-    sample_rows_str = str(sample_rows).replace("{", "{{").replace("}", "}}")
-    
+    def gate_batch(questions):
+        context = {"column_metadata": meta_str, "schema": schema}
+        if schema_index is not None:
+            # union of every question's top-k columns, in retrieval order
+            columns = list(dict.fromkeys(col for q in questions for col, _ in schema_index.retrieve(q)))
+            context = {"column_metadata": schema_index.metadata_lines(columns),
+                       "schema": schema_index.schema_text(columns)}
+        decisions = {}
+        for line in chain.invoke({"questions": _numbered(questions), **context}).splitlines():
+            m = BATCH_GATE_LINE.match(line)
+            if m:
+                decisions[int(m.group(1))] = (m.group(2).upper(), m.group(3).strip())
+        # a question the model skipped comes back as None (the caller gates it alone)
+        return [decisions.get(i) for i in range(1, len(questions) + 1)]
+
+    return gate_batch
+
+
+def build_batch_contextualizer(llm):
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    return (
+        ChatPromptTemplate.from_messages([
+            ("system", BATCH_CONTEXT_SYSTEM),
+            ("human", "{items}"),
+        ])
+        | llm
+        | StrOutputParser()
+    )
+
+
+def batch_agent_prompt(questions):
+    return (
+        "Answer ALL of the following questions about df with ONE python_repl_ast action.\n"
+        "Write a single program that computes every answer (reuse filters, groupbys and "
+        "intermediate results between questions on the same columns), builds a dict `answers` "
+        "mapping each question number to its result, and ends with:\n"
+        "print('\\n'.join(f'Q{k}: {v}' for k, v in answers.items()))\n"
+        "Then give the Final Answer as the same lines, one per question (Q1: <result>).\n\n"
+        f"Questions:\n{_numbered(questions)}"
+    )
+
+
+class LazyNamespace(dict):
+    """
+    The agent REPL's locals, with the precomputed indexes built on first lookup:
+    agent code (or a tool) touching `dwell_events` builds that one index, and a
+    session that never asks about stops never pays for it.
+    """
+
+    def __init__(self, values, builders):
+        super().__init__(values)
+        self.builders = builders
+        self.keep = set(values)   # names reset() leaves alone, besides the indexes
+        self._lock = threading.Lock()
+
+    def __missing__(self, name):
+        # exec() looks names up here first; anything else falls through to builtins
+        if name not in self.builders:
+            raise KeyError(name)
+        with self._lock:   # concurrent first lookups build the index once
+            if name not in self:
+                self[name] = self.builders[name]()
+        return dict.__getitem__(self, name)
+
+    def reset(self):
+        """Drop the variables agent code defined, keeping df and the (built) indexes."""
+        for name in [n for n in self if n not in self.keep and n not in self.builders]:
+            del self[name]
+
+
+class _Deferred:
+    """
+    Stand-in `self` for a toolkit's as_tools(): tool names and descriptions
+    exist at init, each method call resolves (and so builds) the index first.
+    """
+
+    def __init__(self, resolve, **attrs):
+        self._resolve = resolve
+        self.__dict__.update(attrs)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: getattr(self._resolve(), name)(*args, **kwargs)
+
+
+def init_llm_components(df, local_guardrail=True, use_router=True, use_plan_cache=True,
+                        llm=None, speculative=False, approximate=False, quality=None,
+                        retrieve_schema=None):
+    if not GROQ_API_KEY:
+        raise ValueError("Missing GROQ_API_KEY. Set it before running eval.py")
+
+    from langchain_experimental.agents import create_pandas_dataframe_agent
+    from scope_classifier import ScopeClassifier
+    from intent_router import IntentRouter
+    from dwell import load_dwell_events, EVENT_COLUMNS
+    from route_index import RouteIndex
+    from kernels import build_kernel_tools
+    from stats_state import MomentState
+    from plan_cache import PlanCache, repl_failed
+    from renderer import render_answer
+    from gazetteer import Gazetteer
+    from approx import StratifiedSample, ApproxToolkit
+    from quality import QualityReport, PLATEAU_MIN_S
+    from schema_index import SchemaIndex
+    from context_sketch import sketch_for
+    from extremes import ExtremeIndex, ExtremeToolkit, SCORES
+
+    llm = llm or build_llm()
+
+    # Pre-compute column metadata (min, max, unique counts) once at load time;
+    # fed as context to the rewriter so it can map ambiguous terms to real columns.
+    column_metadata = build_column_metadata(df)
+    schema = build_schema_summary(df)
+
+    # Local embedding classifier decides clear in/out-of-scope cases in ~1ms;
+    # only ambiguous queries pay for the LLM guardrail call.
+    scope_classifier = ScopeClassifier(df.columns) if local_guardrail else None
+
+    # Wide schemas: rewriter / guardrail prompts get the top-k retrieved
+    # columns only (None = decide by column count)
+    if retrieve_schema is None:
+        retrieve_schema = len(df.columns) > SCHEMA_INDEX_MIN_COLUMNS
+    schema_index = (SchemaIndex(column_metadata, schema,
+                                model=scope_classifier.model if scope_classifier else None)
+                    if retrieve_schema else None)
+
+    rewrite_query = build_rewriter(llm, column_metadata, schema_index)
+
+    # NL response contextualizer — converts raw agent output into a
+    # human-readable natural language answer
+    contextualizer_chain = build_contextualizer(llm)
+
+    # Precomputed indexes live in the REPL namespace and are built on first use
+    # (LazyNamespace); their tools bind through _Deferred, so init builds none
+    builders = {
+        # Dwell events (stops) are persisted and refreshed incrementally
+        "dwell_events": lambda: load_dwell_events(df),
+        # Cumulative-distance index: O(1) traveled distance / detour / speed per segment
+        "route_index": lambda: RouteIndex(df),
+        # Mergeable moments + co-moment matrix: correlation / PCA / skew / kurtosis
+        # are answered from this state instead of rescanning df
+        "stats_state": lambda: MomentState.from_frame(df),
+        # Top-k heaps + quantile sketches per extreme score (extremes.py): max / top-N /
+        # top-p% questions, optionally per time window or area, without a sort
+        "extremes": lambda: ExtremeIndex.from_frame(df),
+        # Percentile integrity bitmasks (quality.py); load_checked passes the
+        # persisted report, anything else is scanned in one vectorized pass
+        "quality": lambda: QualityReport.from_frame(df),
+    }
+    if approximate:
+        # Approximate mode: stratified (time x area) reservoirs answer aggregates
+        # with confidence intervals without scanning df
+        builders["sample"] = lambda: StratifiedSample.from_frame(df)
+    namespace = LazyNamespace({} if quality is None else {"quality": quality}, builders)
+
+    def deferred(name, **attrs):
+        return _Deferred(lambda: namespace[name], **attrs)
+
+    quality_tools = (quality.as_tools() if quality is not None
+                     else QualityReport.as_tools(deferred("quality", plateau_min_s=PLATEAU_MIN_S)))
+    approx_tools = ApproxToolkit(deferred("sample"), df).as_tools() if approximate else []
+
+    col_list     = ", ".join(df.columns)
+    # quantiles, LTTB trends and k-center exemplar rows instead of df.head(2)
+    # (two identical newest rows); cached per dataset version
+    data_sketch  = sketch_for(df)
+    total_rows   = len(df)
+
+    guardrail_chain = build_guardrail_chain(llm, schema, schema_index)
+    # batch API: N questions share one gate call, one agent program, one contextualizer call
+    batch_gate = build_batch_gate(llm, column_metadata, schema, schema_index)
+    batch_contextualizer = build_batch_contextualizer(llm)
+
+    # Intent router: broad questions answered from precomputed summaries with
+    # one LLM call; clear out-of-scope queries rejected before the rewriter.
+    router = (IntentRouter(df, llm, scope_classifier,
+                           guardrail=lambda q: gate_query(q, None, guardrail_chain))
+              if use_router else None)
+
+    # Escape curly braces in the sketch to prevent LangChain template variable errors
+    data_sketch_str = data_sketch.replace("{", "{{").replace("}", "}}")
+
     prefix_prompt = (
         f"You are a data analyst. The dataset has columns: {col_list}.\n"
-        f"Total rows: {total_rows}.\n\n"
+        f"Total rows: {total_rows}.\n"
+        f"DATA SKETCH (use it to pick columns and thresholds without exploring):\n"
+        f"{data_sketch_str}\n\n"
         "TOOL USAGE:\n"
         "- To execute Python: Action: python_repl_ast\n"
         "- Then provide Action Input with valid pandas code\n"
-        "- Example: Action Input: df['column'].sum()\n\n"
+        "- Example: Action Input: df['column'].sum()\n"
+        "- For consecutive runs, rolling-window bursts, sudden jumps or driving patterns "
+        "(braking, turns), call consecutive_high / rolling_bursts / transitions / patterns "
+        "instead of writing loops\n"
+        "- Example: Action: consecutive_high\n"
+        "  Action Input: column=accel_stats_z_p99, threshold=11, min_len=5\n"
+        "- For correlations, PCA, skew/kurtosis or heavy tails, call correlation / pca / "
+        "moments (precomputed, instant)\n"
+        "- For data integrity (percentile monotonicity, identical percentiles, p1 > p90, "
+        "frozen/saturated plateaus, missing values), call data_quality\n"
+        "- For maxima, top-N or top-p% extreme events (per-axis p99, combined or magnitude of the "
+        "x/y/z p99s, instability), optionally in a time window or near a place, call extreme_events\n"
+        "- Example: Action: extreme_events\n"
+        "  Action Input: score=x_p99, n=1\n\n"
         "WORKFLOW:\n"
         "1. Think about what calculation is needed\n"
         "2. Execute ONE python_repl_ast action with the necessary pandas code\n"
         "3. Return Final Answer: <result>\n\n"
-        "Avoid multiple actions when one suffices. Be direct and concise.\n"
+        "Avoid multiple actions when one suffices. Be direct and concise.\n\n"
+        "PRECOMPUTED TABLES (already loaded, prefer them over recomputing):\n"
+        "- dwell_events: one row per stop of 30s+, columns "
+        f"{', '.join(EVENT_COLUMNS)}\n"
+        "- route_index: route_index.segment_between(start, end) returns traveled_m, "
+        "straight_m, detour_ratio, elapsed_s, avg_speed_mps for a time window "
+        "(no arguments = whole dataset); route_index.trips() lists per-trip metrics\n"
+        "- quality: quality.ok is a boolean row mask of rows passing every integrity check "
+        "(df[quality.ok] skips known-bad rows)\n"
     )
+    if approximate:
+        prefix_prompt += (
+            "\nAPPROXIMATE MODE:\n"
+            "- For means, proportions, counts and quantiles call approx_mean / approx_proportion / "
+            "approx_count / approx_quantile (stratified sample, instant) and report the estimate "
+            "with its confidence interval\n"
+            "- Example: Action: approx_mean\n"
+            "  Action Input: column=accel_mean, where=accel_variance > 2\n"
+            "- Add exact=true only when the question asks for an exact value\n"
+        )
 
     agent = create_pandas_dataframe_agent(
         llm,
@@ -296,13 +712,107 @@ Output contract (MUST follow exactly, single line):
         agent_type="zero-shot-react-description",
         prefix=prefix_prompt,
         max_iterations=3,  # reduce from 5 to 3 for faster execution
+        # vectorized event kernels + precomputed statistics, one call each
+        extra_tools=build_kernel_tools(df) + MomentState.as_tools(deferred("stats_state"))
+                    + quality_tools + ExtremeToolkit(deferred("extremes", scores=SCORES), df).as_tools()
+                    + approx_tools,
         agent_executor_kwargs={
             "handle_parsing_errors": True,
         },
     )
 
-    def ask_agent(user_query):
-        t0 = time.time()
+    # Precomputed tables live next to `df` in the agent's REPL namespace
+    repl_tool = next(t for t in agent.tools if t.name == "python_repl_ast")
+    namespace.update(repl_tool.locals)
+    namespace.keep.update(repl_tool.locals)
+    repl_tool.locals = namespace
+
+    # Validated agent code keyed by query shape; repeat shapes with new
+    # thresholds / dates re-run the stored code instead of the agent; new plans
+    # are validated on the cache's worker thread, after the answer is returned
+    plan_cache = PlanCache(df.columns, background=True) if use_plan_cache else None
+    # The REPL namespace (df, lazy indexes, the agent's own variables) and the plan
+    # cache are shared by every caller — service requests, loadgen threads — so
+    # agent, plan and plan-validation runs take turns; rewriter, gates, router and
+    # contextualizer calls still run concurrently
+    repl_lock = threading.RLock()
+
+    @contextlib.contextmanager
+    def repl_turn():
+        """One caller in the REPL at a time; the variables it defined go afterwards."""
+        with repl_lock:
+            try:
+                yield
+            finally:
+                namespace.reset()
+
+    def validation_run(code):
+        """REPL run for the plan cache's validation thread: takes its own turn."""
+        with repl_turn():
+            return repl_tool.run(code)
+
+    def cache_lookup(rewritten_query):
+        # PlanCache locks its own table: a lookup never waits for a REPL turn
+        return plan_cache.lookup(rewritten_query) if plan_cache else None
+
+    columns = list(df.columns)
+    # offline nearest-landmark lookup for coordinates in raw results,
+    # loaded with the first answer that needs it
+    gazetteer = lru_cache(maxsize=1)(Gazetteer)
+    speculation_stats = {"started": 0, "wasted": 0}
+
+    def agent_input(rewritten_query, exact):
+        if approximate and exact:
+            return f"{rewritten_query}\n(Exact answer required: compute it on df, not the sample.)"
+        return rewritten_query
+
+    def routed(user_query):
+        """(answer, trace) when the intent router settles the query (reject / summary), else None."""
+        if not router:
+            return None
+        route = router.route(user_query)
+        if route["action"] == "reject":
+            return (f"[REJECTED] {route['message']}",
+                    f"Intent router: policy={route['policy_id']}, scope={route['scope']}")
+        if route["action"] == "summary":
+            try:
+                answer = router.answer(route)
+            except Exception as e:
+                answer = f"[ERROR] {e}"
+            return (answer, f"Intent router: intent={route['intent']['intent_id']}, "
+                            f"template={route['prompt']['template_id']} (agent skipped)")
+        return None
+
+    def run_cached(cached):
+        """
+        Re-run a plan cache hit: (raw answer, trace, value). A failing plan is
+        evicted and comes back as (None, trace, None) for the agent to take over.
+        """
+        code, template = cached
+        trace = f"Plan cache hit: {template}\nCode: {code}"
+        with repl_turn():
+            try:
+                value = repl_tool.run(code)
+            except Exception as e:
+                value = f"{type(e).__name__}: {e}"
+            raw_answer = str(value)
+            if not repl_failed(raw_answer):
+                return raw_answer, f"{trace}\nObservation: {raw_answer}", value
+            # the stored code does not fit these constants: drop it, ask the agent
+            plan_cache.evict(template)
+        return None, f"{trace}\nObservation: {raw_answer}\nPlan evicted, running the agent\n", None
+
+    def resolve(user_query, exact=False):
+        """
+        Every stage up to (not including) contextualization.
+        Returns (final answer or None, raw answer to contextualize, trace, rewritten
+        query, value the REPL last returned — a DataFrame / Series when structured).
+        exact=True makes approximate mode compute on the full dataframe.
+        """
+        settled = routed(user_query)
+        if settled:
+            answer, trace = settled
+            return answer, None, trace, None, None
 
         # stage 0: rewrite query -> column-grounded version
         rewritten_query, unmappable = rewrite_query(user_query)
@@ -310,40 +820,246 @@ Output contract (MUST follow exactly, single line):
         # If the rewriter found unmappable concepts, reject early
         if unmappable:
             reason = f"Query requires concepts not present in dataset: {', '.join(unmappable)}"
-            latency = time.time() - t0
-            return (
-                f"[REJECTED] {reason}",
-                f"Unmappable concepts detected: {unmappable}",
-                latency,
-            )
-
-        decision = guardrail_chain.invoke({"query": rewritten_query}).strip()
-
-        if decision != "PROCEED":
-            latency = time.time() - t0
-            if decision.startswith("REJECT:"):
-                reason = decision.split("REJECT:", 1)[1].strip()
-                return f"[REJECTED] {reason}", f"Guardrail decision: {decision}", latency
-            return f"[REJECTED] {decision}", f"Guardrail decision: {decision}", latency
+            return f"[REJECTED] {reason}", None, f"Unmappable concepts detected: {unmappable}", None, None
+
+        verdict, rejection = local_gate(rewritten_query, scope_classifier)
+        if verdict == "reject":
+            answer, trace = rejection
+            return answer, None, trace, None, None
+
+        cached = cache_lookup(rewritten_query)
+        if verdict == "escalate" and speculative and not cached:
+            # guardrail and agent race; the agent is cancelled on REJECT
+            with repl_turn():
+                return asyncio.run(speculate(rewritten_query, exact))
+
+        if verdict == "escalate":
+            rejection = guardrail_rejection(guardrail_chain.invoke({"query": rewritten_query}))
+            if rejection:
+                answer, trace = rejection
+                return answer, None, trace, None, None
+
+        evicted = ""
+        if cached:
+            raw_answer, evicted, value = run_cached(cached)
+            if raw_answer is not None:
+                return None, raw_answer, evicted, rewritten_query, value
 
         # Pass rewritten query — the rewriter already resolved typos / ambiguous
         # column references (e.g. 'accl variance' → 'accel_variance')
-        handler = ThinkingCaptureHandler()
+        handler = new_thinking_handler()
+        try:
+            with repl_turn():
+                result = agent.invoke(agent_input(rewritten_query, exact),
+                                      config={"callbacks": [handler]})
+                answer, raw_answer, trace, rewritten_query, value = finish_agent(rewritten_query, result, handler)
+            return answer, raw_answer, evicted + trace, rewritten_query, value
+        except Exception as e:
+            return f"[ERROR] {e}", None, handler.get_trace(), None, None
+
+    def finish_agent(rewritten_query, result, handler):
+        if plan_cache:
+            plan_cache.record(rewritten_query, handler.tool_calls, validation_run)
+        return None, result["output"], handler.get_trace(), rewritten_query, handler.last_value
+
+    async def speculate(rewritten_query, exact=False):
+        """
+        Start the agent on the rewritten query while the LLM guardrail decides.
+        PROCEED (the common case) takes the guardrail round trip off the
+        critical path; REJECT cancels the agent and counts as wasted.
+        """
+        handler = new_thinking_handler()
+        agent_task = asyncio.create_task(
+            agent.ainvoke(agent_input(rewritten_query, exact), config={"callbacks": [handler]}))
+        speculation_stats["started"] += 1
+        try:
+            decision = await guardrail_chain.ainvoke({"query": rewritten_query})
+        except Exception:
+            agent_task.cancel()
+            raise
+        rejection = guardrail_rejection(decision)
+        if rejection:
+            agent_task.cancel()
+            speculation_stats["wasted"] += 1
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await agent_task
+            answer, trace = rejection
+            return answer, None, f"{trace} (speculative agent cancelled)", None, None
         try:
-            result = agent.invoke(rewritten_query, config={"callbacks": [handler]})
-            raw_answer = result["output"]
+            result = await agent_task
+            return finish_agent(rewritten_query, result, handler)
+        except Exception as e:
+            return f"[ERROR] {e}", None, handler.get_trace(), None, None
+
+    def ask_agent(user_query, exact=False):
+        t0 = time.time()
+        answer, raw_answer, trace, rewritten_query, value = resolve(user_query, exact)
+        if answer is not None:
+            return answer, trace, time.time() - t0
 
-            # Contextualize: convert raw agent output to natural language
+        location = gazetteer().annotate(value if value is not None else raw_answer)
+
+        # Simple results (scalar / record / top-k) are rendered without an LLM call
+        rendered = render_answer(rewritten_query, raw_answer, columns)
+        if rendered:
+            answer = f"{rendered} {location}".strip()
+            return answer, f"{trace}\nRendered without LLM", time.time() - t0
+
+        # Contextualize: convert raw agent output to natural language
+        try:
             nl_answer = contextualizer_chain.invoke({
                 "question": user_query,
-                "raw_answer": raw_answer,
+                "raw_answer": f"{raw_answer}\n{location}".strip(),
             }).strip()
-
-            latency = time.time() - t0
-            return nl_answer, handler.get_trace(), latency
+            return nl_answer, trace, time.time() - t0
         except Exception as e:
-            latency = time.time() - t0
-            return f"[ERROR] {e}", handler.get_trace(), latency
+            return f"[ERROR] {e}", trace, time.time() - t0
+
+    async def astream_agent(user_query):
+        """
+        Yields answer text as it becomes available: rendered / rejected answers
+        in one piece, LLM contextualizations token by token (astream).
+        """
+        answer, raw_answer, _, rewritten_query, value = await asyncio.to_thread(resolve, user_query)
+        if answer is not None:
+            yield answer
+            return
+        location = gazetteer().annotate(value if value is not None else raw_answer)
+        rendered = render_answer(rewritten_query, raw_answer, columns)
+        if rendered:
+            yield f"{rendered} {location}".strip()
+            return
+        async for chunk in contextualizer_chain.astream({
+            "question": user_query,
+            "raw_answer": f"{raw_answer}\n{location}".strip(),
+        }):
+            yield chunk
+
+    def ask_batch(user_queries):
+        """
+        Several questions in one session: one rewrite+guard call, one agent
+        program, one contextualizer call. Returns [(answer, trace, latency)] in
+        order; latency is the time until that question's answer was ready.
+        Questions the intent router settles and plan cache hits take the same
+        deterministic paths as ask_agent and never reach the batch agent. Every
+        trace ends with the batch's LLM call count.
+        """
+        t0 = time.time()
+        n = len(user_queries)
+        results = [None] * n
+        traces = [[] for _ in range(n)]
+        llm_calls = 0
+
+        def done(i, answer):
+            results[i] = (answer, "\n".join(traces[i]), time.time() - t0)
+
+        # router rejections / summaries first, then clear out-of-scope questions
+        # never reach the LLM
+        pending = []
+        for i, query in enumerate(user_queries):
+            settled = routed(query)
+            if settled:
+                answer, trace = settled
+                if not answer.startswith("[REJECTED]"):
+                    llm_calls += 1   # the summary template's one call
+                traces[i].append(trace)
+                done(i, answer)
+                continue
+            verdict, rejection = local_gate(query, scope_classifier)
+            if verdict == "reject":
+                answer, trace = rejection
+                traces[i].append(trace)
+                done(i, answer)
+            else:
+                pending.append(i)
+
+        rewritten = {}
+        if pending:
+            decisions = batch_gate([user_queries[i] for i in pending])
+            llm_calls += 1
+            for i, decision in zip(pending, decisions):
+                if decision is None:
+                    # skipped by the batch call: the single-question path decides
+                    rewritten_query, unmappable = rewrite_query(user_queries[i])
+                    llm_calls += 1
+                    rejection = (
+                        (f"[REJECTED] Query requires concepts not present in dataset: "
+                         f"{', '.join(unmappable)}", f"Unmappable concepts detected: {unmappable}")
+                        if unmappable else gate_query(rewritten_query, scope_classifier, guardrail_chain)
+                    )
+                    decision = ("REJECT", rejection[0]) if rejection else ("PROCEED", rewritten_query)
+                verdict, text = decision
+                traces[i].append(f"Batch gate: {verdict} | {text}")
+                if verdict == "REJECT":
+                    done(i, text if text.startswith("[REJECTED]") else f"[REJECTED] {text}")
+                else:
+                    rewritten[i] = text
+
+        raw, values = {}, {}
+        for i in sorted(rewritten):
+            cached = cache_lookup(rewritten[i])
+            if cached:
+                raw_answer, trace, value = run_cached(cached)
+                traces[i].append(trace)
+                if raw_answer is not None:
+                    raw[i], values[i] = raw_answer, value
+
+        # one agent program for everything the plan cache did not answer
+        order = [i for i in sorted(rewritten) if i not in raw]
+        if order:
+            handler = new_thinking_handler()
+            try:
+                with repl_turn():
+                    result = agent.invoke(batch_agent_prompt([rewritten[i] for i in order]),
+                                          config={"callbacks": [handler]})
+                llm_calls += len(handler.tool_calls) + 1
+                # the printed program output is exact; the Final Answer fills gaps
+                observation = handler.tool_calls[-1][2] if handler.tool_calls else ""
+                parsed = {**split_numbered(result["output"]), **split_numbered(observation or "")}
+                for k, i in enumerate(order, 1):
+                    traces[i].append(f"Rewritten: {rewritten[i]}\nBatch agent:\n{handler.get_trace()}")
+                    if parsed.get(k):
+                        raw[i] = parsed[k]
+                    else:
+                        done(i, "[ERROR] No answer for this question in the batch output")
+            except Exception as e:
+                for i in order:
+                    traces[i].append(handler.get_trace())
+                    done(i, f"[ERROR] {e}")
+
+        to_contextualize = []
+        for i, raw_answer in raw.items():
+            value = values.get(i)
+            location = gazetteer().annotate(value if value is not None else raw_answer)
+            rendered = render_answer(rewritten[i], raw_answer, columns)
+            if rendered:
+                traces[i].append("Rendered without LLM")
+                done(i, f"{rendered} {location}".strip())
+            else:
+                to_contextualize.append((i, f"{raw_answer}\n{location}".strip()))
+
+        if to_contextualize:
+            items = "\n\n".join(
+                f"Q{k}: {user_queries[i]}\nRaw result {k}: {raw_answer}"
+                for k, (i, raw_answer) in enumerate(to_contextualize, 1)
+            )
+            try:
+                answers = split_numbered(batch_contextualizer.invoke({"items": items}), prefix="A")
+                llm_calls += 1
+                for k, (i, raw_answer) in enumerate(to_contextualize, 1):
+                    done(i, answers.get(k) or raw_answer)
+            except Exception as e:
+                for i, _ in to_contextualize:
+                    done(i, f"[ERROR] {e}")
+
+        summary = f"Batch of {n}: {llm_calls} LLM call(s) in {time.time() - t0:.2f}s"
+        return [(answer, f"{trace}\n{summary}".strip(), latency) for answer, trace, latency in results]
+
+    ask_agent.astream = astream_agent
+    ask_agent.batch = ask_batch
+    ask_agent.speculation_stats = speculation_stats
+    # approximate mode: re-run one question on the full dataframe
+    ask_agent.exact = lambda user_query: ask_agent(user_query, exact=True)
 
     # TODO [IGNORE] - q: why does the llm take so long; latency is high; reducing it could be flash-fusion's contribution
     # think about it...this is our naive baseline (RAG, SQL, VocalDB)
@@ -354,89 +1070,232 @@ Output contract (MUST follow exactly, single line):
 # Logging
 # ====================================================
 
-def log_results(results, csv_path):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+def log_results(run_id):
+    """Append one run, rendered from the JSONL result log, to the markdown LOG_FILE."""
+    from result_log import read_records, render_markdown
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
     with open(LOG_FILE, "a", encoding="utf-8") as f:
-        f.write(f"\n# Eval Run [{timestamp}] — {csv_path}\n\n")
-        for i, (query, gt, llm_ans, thinking, latency) in enumerate(results, 1):
-            f.write(f"## Q{i}: {query}\n\n")
-            f.write(f"| | Answer |\n|---|---|\n")
-            f.write(f"| **Ground Truth** | {gt} |\n")
-            f.write(f"| **LLM** | {llm_ans} |\n")
-            f.write(f"| **Latency** | {latency:.2f}s |\n\n")
-            f.write(f"**Agent Reasoning:**\n```\n{thinking}\n```\n\n")
-            f.write("---\n")
-
-        # Summary stats
-        latencies = [r[4] for r in results]
-        avg_lat = sum(latencies) / len(latencies) if latencies else 0
-        f.write(f"\n**Latency summary:** avg={avg_lat:.2f}s, "
-                f"min={min(latencies):.2f}s, max={max(latencies):.2f}s\n")
-    print(f"\nResults logged → {LOG_FILE}")
+        f.write(render_markdown(read_records(run_id=run_id)))
+    print(f"Markdown report → {LOG_FILE}")
 
 
 # ====================================================
 # Main
 # ====================================================
 
-def run(csv_path, out_of_scope=False):
-    print(f"\nLoading: {csv_path}")
-    df = pd.read_csv(csv_path)
-    print(f"Rows: {len(df):,}  Columns: {len(df.columns)}")
-    
-    # Store out_of_scope flag for use in the evaluation loop
-    run.out_of_scope = out_of_scope
-
-    ask_agent = init_llm_components(df)
-
-    results = []
-
-    # Select queries and ground truth based on evaluation mode
-    if run.out_of_scope:
-        queries = OUT_OF_SCOPE
-        ground_truths = GT_OUT_OF_SCOPE
+def select_queries(csv_path, out_of_scope=False, route=False, df=None, partition_filter=None,
+                   rows_excluded=False):
+    """
+    (queries, ground truths) for the evaluation mode. df is read for route
+    queries, and for every query when rows_excluded (df dropped rows the file has).
+    """
+    if out_of_scope:
         print("\n🔍 Evaluating OUT-OF-SCOPE queries (should be rejected)...")
-    else:
-        # User requested to test rewriter with conversational queries instead of standard ones
-        queries = QUERY_INTENT      # you can swap this out with TEST_QUERIES instead
-        ground_truths = [gt_fn(df) for gt_fn in GROUND_TRUTH_FNS]
-        print("\n📊 Evaluating CONVERSATIONAL queries (testing rewriter)...")
-
+        return OUT_OF_SCOPE, GT_OUT_OF_SCOPE
+    if route:
+        if df is None:
+            from shm_frame import load_dataframe
+            df = load_dataframe(csv_path, partition_filter=partition_filter)
+        print("\n🗺️  Evaluating ROUTE queries (route index)...")
+        return ROUTE_QUERIES, [gt_fn(df) for gt_fn in GT_ROUTE_FNS]
+    from gt_executor import compute_ground_truth
+    # User requested to test rewriter with conversational queries instead of standard ones
+    queries = QUERY_INTENT      # you can swap this out with TEST_QUERIES instead
+    # one fused streaming pass instead of ten in-memory passes
+    # (same strings as GROUND_TRUTH_FNS; see gt_executor.py --check)
+    ground_truths = (compute_ground_truth(csv_path, frame=df) if rows_excluded
+                     else compute_ground_truth(csv_path, partition_filter=partition_filter))
+    print("\n📊 Evaluating CONVERSATIONAL queries (testing rewriter)...")
+    return queries, ground_truths
+
+
+def run_ground_truth(csv_path, out_of_scope=False, route=False, partition_filter=None,
+                     exclude_bad_rows=False):
+    """Ground truth only — pandas, no LLM components."""
+    t0 = time.time()
+    df = None
+    if exclude_bad_rows:
+        from quality import load_checked
+        df, quality = load_checked(csv_path, exclude=True, partition_filter=partition_filter)
+        print(f"Excluded {int((~quality.ok).sum()):,} row(s) failing integrity checks")
+    queries, ground_truths = select_queries(csv_path, out_of_scope, route, df=df,
+                                            partition_filter=partition_filter,
+                                            rows_excluded=df is not None)
     for i, (query, gt_answer) in enumerate(zip(queries, ground_truths), 1):
-        print(f"\n{'─' * 60}")
-        print(f"Q{i}: {query}")
-        print(f"{'─' * 60}")
+        print(f"\nQ{i}: {query}")
+        print(f"  GROUND TRUTH : {gt_answer}")
+    print(f"\n{len(queries)} ground truths in {time.time() - t0:.2f}s")
+    return list(zip(queries, ground_truths))
 
-        llm_answer, thinking, latency = ask_agent(query)
 
-        print(f"  GROUND TRUTH : {gt_answer}")
-        print(f"  LLM ANSWER   : {llm_answer}")
-        print(f"  LATENCY      : {latency:.2f}s")
+def run(csv_path, out_of_scope=False, route=False, local_guardrail=True, use_router=True,
+        engine="pandas", use_plan_cache=True, speculative=False, batch=False,
+        approximate=False, exclude_bad_rows=False, markdown=False, retrieve_schema=None,
+        partition_filter=None):
+    from quality import load_checked
+    from result_log import ResultLog, RESULTS_LOG, new_run_id
 
-        results.append((query, gt_answer, llm_answer, thinking, latency))
+    print(f"\nLoading: {csv_path}")
+    if partition_filter:
+        from partitions import describe_filter
+        print(f"Partitions: {describe_filter(partition_filter)}")
+    df, quality = load_checked(csv_path, exclude=exclude_bad_rows, partition_filter=partition_filter)
+    print(f"Rows: {len(df):,}  Columns: {len(df.columns)}  "
+          f"Failing integrity checks: {int((~quality.ok).sum()):,}"
+          f"{' (excluded)' if exclude_bad_rows else ''}")
+    # agent and ground truth both answer on the kept rows; the log records which were dropped
+    excluded = None
+    if exclude_bad_rows and not quality.ok.all():
+        excluded = {"rows": int((~quality.ok).sum()),
+                    "checks": {check: int(quality.flagged(check).sum()) for check in quality.counts()}}
+        print("Excluded: " + ", ".join(f"{check}={n:,}" for check, n in excluded["checks"].items()))
+
+    engines = {}
+    if engine in ("pandas", "both"):
+        engines["pandas"] = init_llm_components(df, local_guardrail=local_guardrail,
+                                                use_router=use_router,
+                                                use_plan_cache=use_plan_cache,
+                                                speculative=speculative,
+                                                approximate=approximate,
+                                                # the loaded report indexes the unfiltered rows
+                                                quality=None if exclude_bad_rows else quality,
+                                                retrieve_schema=retrieve_schema)
+    if engine in ("sql", "both"):
+        from sql_engine import init_sql_components
+        engines["sql"] = init_sql_components(csv_path, local_guardrail=local_guardrail,
+                                             retrieve_schema=retrieve_schema, df=df)
+
+    results = []
+    run_id = new_run_id()
+    started = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    log_results(results, csv_path)
+    # Select queries and ground truth based on evaluation mode
+    queries, ground_truths = select_queries(csv_path, out_of_scope, route, df=df,
+                                            partition_filter=partition_filter,
+                                            rows_excluded=excluded is not None)
+
+    # --batch: engines with a batch API answer the whole suite in one session
+    batched = {name: ask_agent.batch(queries) for name, ask_agent in engines.items()
+               if batch and hasattr(ask_agent, "batch")}
+
+    # one JSONL record per answer, written by a background thread as it arrives
+    with ResultLog() as result_log:
+        for i, (query, gt_answer) in enumerate(zip(queries, ground_truths), 1):
+            print(f"\n{'─' * 60}")
+            print(f"Q{i}: {query}")
+            print(f"{'─' * 60}")
+
+            print(f"  GROUND TRUTH : {gt_answer}")
+            answers = {}
+            for name, ask_agent in engines.items():
+                llm_answer, thinking, latency = batched[name][i - 1] if name in batched else ask_agent(query)
+                answers[name] = (llm_answer, thinking, latency)
+                print(f"  LLM ANSWER   : [{name}] {llm_answer}")
+                print(f"  LATENCY      : [{name}] {latency:.2f}s")
+                result_log.write({
+                    "run": run_id, "time": started, "csv": csv_path, "engine": name, "i": i,
+                    "query": query, "ground_truth": gt_answer, "answer": llm_answer,
+                    "latency": round(latency, 3), "reasoning": thinking, "excluded": excluded,
+                })
+
+            results.append((query, gt_answer, answers))
+
+    if speculative and "pandas" in engines:
+        stats = engines["pandas"].speculation_stats
+        print(f"\nSpeculation: {stats['started']} agent run(s) started early, "
+              f"{stats['wasted']} cancelled by a guardrail REJECT")
+
+    print(f"\nResults logged → {RESULTS_LOG} (run {run_id})")
+    if markdown:
+        log_results(run_id)
     return results
 
 
-if __name__ == "__main__":
+def main(argv=None):
     parser = argparse.ArgumentParser(description="Run eval: LLM agent vs pandas ground truth.")
     group = parser.add_mutually_exclusive_group()
     group.add_argument("--enlarged", action="store_true",
                        help="Use the 100x enlarged dataset.")
     group.add_argument("--csv", type=str, default=None,
-                       help="Path to a custom CSV file.")
+                       help="Path to a custom CSV file (or a partitions.py directory).")
+    group.add_argument("--partitioned", action="store_true",
+                       help="Use the date/vehicle-partitioned Parquet layout (partitions.py).")
+    parser.add_argument("--dates", type=str, default=None,
+                        help="Partitioned layout only: load START[:END] days (inclusive).")
+    parser.add_argument("--vehicles", type=str, default=None,
+                        help="Partitioned layout only: load these comma-separated vehicle ids.")
     
     group.add_argument("--out_of_scope", action="store_true",
                        help="Evaluate out-of-scope queries that should be rejected.")
-    
-    args = parser.parse_args()
+    parser.add_argument("--route", action="store_true",
+                        help="Evaluate distance/detour queries answered via the route index.")
+    parser.add_argument("--llm_guardrail", action="store_true",
+                        help="Always use the LLM guardrail (skip the local scope classifier).")
+    parser.add_argument("--no_router", action="store_true",
+                        help="Send every query through the full agent (skip the intent router).")
+    parser.add_argument("--engine", choices=["pandas", "sql", "both"], default="pandas",
+                        help="Execution backend: pandas agent, DuckDB text-to-SQL, or both side by side.")
+    parser.add_argument("--speculative", action="store_true",
+                        help="Run the agent concurrently with the LLM guardrail; cancel it on REJECT.")
+    parser.add_argument("--no_plan_cache", action="store_true",
+                        help="Always run the agent (skip the parameterized generated-code cache).")
+    parser.add_argument("--batch", action="store_true",
+                        help="Answer all queries in one batched session (one gate call, one agent program).")
+    parser.add_argument("--approx", action="store_true",
+                        help="Give the agent stratified-sample tools that answer with confidence intervals.")
+    parser.add_argument("--exclude_bad_rows", action="store_true",
+                        help="Drop rows failing the percentile integrity checks (quality.py) at load.")
+    parser.add_argument("--schema_index", action="store_true", default=None,
+                        help="Retrieve the top-k relevant columns into the rewriter/guardrail prompts "
+                             f"(default: only for schemas wider than {SCHEMA_INDEX_MIN_COLUMNS} columns).")
+    parser.add_argument("--markdown", action="store_true",
+                        help="Also append this run, rendered from the JSONL result log, to eval_responses.md.")
+    parser.add_argument("--ground_truth_only", action="store_true",
+                        help="Print the pandas ground truth only (no LLM imports, no API key).")
+    parser.add_argument("--profile_imports", action="store_true",
+                        help="Append an -X importtime summary of the entry points to the output.")
+
+    args = parser.parse_args(argv)
 
     if args.csv:
         csv_path = args.csv
     elif args.enlarged:
         csv_path = CSV_ENLARGED
+    elif args.partitioned:
+        from partitions import PARTITION_ROOT
+        csv_path = PARTITION_ROOT
     else:
         csv_path = CSV_DEFAULT
 
-    run(csv_path, out_of_scope=getattr(args, 'out_of_scope', False))
+    partition_filter = None
+    if args.dates or args.vehicles:
+        from partitions import parse_filter
+        if not os.path.isdir(csv_path):
+            parser.error("--dates / --vehicles need a partitioned layout (--partitioned or a partitions.py --csv)")
+        try:
+            partition_filter = parse_filter(args.dates, args.vehicles)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.ground_truth_only:
+        run_ground_truth(csv_path, out_of_scope=args.out_of_scope, route=args.route,
+                         partition_filter=partition_filter, exclude_bad_rows=args.exclude_bad_rows)
+    else:
+        run(csv_path, out_of_scope=args.out_of_scope, route=args.route,
+            local_guardrail=not args.llm_guardrail, use_router=not args.no_router,
+            engine=args.engine, use_plan_cache=not args.no_plan_cache,
+            speculative=args.speculative, batch=args.batch, approximate=args.approx,
+            exclude_bad_rows=args.exclude_bad_rows, markdown=args.markdown,
+            retrieve_schema=args.schema_index, partition_filter=partition_filter)
+
+    if args.profile_imports:
+        from import_profile import profile_entry_points, format_profiles
+        report = format_profiles(profile_entry_points())
+        print(f"\n{report}")
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        with open(LOG_FILE, "a", encoding="utf-8") as f:
+            f.write(f"\n**Import-time profile:**\n```\n{report}\n```\n")
+
+
+if __name__ == "__main__":
+    main()
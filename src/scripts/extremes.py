@@ -0,0 +1,584 @@
+"""
+extremes.py
+-----------
+Incrementally maintained top-k index of extreme events.
+
+"Max accel_stats_x_p99 and when", "top 1% most extreme events by combined
+x/y/z p99" and the dashboard's extreme_event_magnitude ranking all need the
+global extremes, and each used to be a full sort or idxmax per question. Here
+every score in SCORES (a pandas expression over the row; per axis, combined,
+magnitude, instability) keeps:
+
+    top      a min-heap of the TOP_K highest rows overall
+    strata   a min-heap of the STRATUM_K highest rows per hour x grid cell
+             (TIME_BUCKET_S x CELL_DEG), for time windows
+    minutes  the same per minute x grid cell (FINE_BUCKET_S), read only for
+             the hours a time window cuts
+    areas    a min-heap of the AREA_K highest rows per grid cell over all time,
+             for area-only windows
+    sketch   a relative-error quantile sketch (DDSketch, Masson et al. 2019:
+             log-spaced buckets, SKETCH_ALPHA relative accuracy) for thresholds
+
+A batch is ranked once per score with NumPy; only its best TOP_K rows overall
+and best k rows per stratum / cell are offered to the heaps, each at
+O(log k), and the sketch update is one np.unique. Ties rank the earlier row
+first (idxmax semantics).
+
+Queries never touch the data: the global top n is read off the heap; a time /
+area window only visits the strata of its hours (or the cells, without a time
+bound), keeps whole heaps inside the window and filters the ones it cuts; an
+hour the window cuts is read from its minute heaps instead, so only the (at
+most two) minutes at the window's ends are cut. The answer is certified exact
+when its n-th row outranks every row a full heap dropped; otherwise
+ExtremeToolkit recomputes it on the dataframe. "Top p%" (top= is always a
+percent) is exact while p% of the rows fit in TOP_K and reads the threshold
+off the sketch beyond; rows tied with the threshold are counted separately
+("at or above"), so the row count and the threshold agree.
+
+The index is kept current by ingest.py (extremes artifact, checkpointed to
+data/processed/extremes.json; the file records how many store rows it holds,
+so a restart re-folds only the rows after the last checkpoint) and built at
+load time for the agent's extreme_events tool.
+
+Usage:
+    # Build on a dataset, time index queries against full sorts:
+    python extremes.py --csv ../../data/raw/bus_data_enlarged.csv
+
+    # Extra composite score:
+    python extremes.py --score "xz=accel_stats_x_p99 + accel_stats_z_p99"
+
+    # One query on the index ingest.py maintains:
+    python extremes.py --load --query "score=magnitude, n=5, start=2025-06-06"
+"""
+
+import os
+import re
+import json
+import math
+import time
+import heapq
+import argparse
+from bisect import bisect_left, bisect_right, insort
+
+import numpy as np
+import pandas as pd
+
+from geo import haversine_m
+
+# --- Configuration ---
+BASE_DIR      = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT   = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
+EXTREMES_PATH = os.path.join(PROCESSED_DIR, "extremes.json")
+
+# score name -> pandas expression (DataFrame.eval) over one row
+SCORES = {
+    "x_p99": "accel_stats_x_p99",
+    "y_p99": "accel_stats_y_p99",
+    "z_p99": "accel_stats_z_p99",
+    "combined": "accel_stats_x_p99 + accel_stats_y_p99 + accel_stats_z_p99",
+    # the dashboard's extreme_event_magnitude
+    "magnitude": "(accel_stats_x_p99 ** 2 + accel_stats_y_p99 ** 2 + accel_stats_z_p99 ** 2) ** 0.5",
+    "instability": "accel_variance",
+}
+DEFAULT_SCORE = "magnitude"
+TOP_K         = 2000     # global heap per score
+STRATUM_K     = 10       # heap per (hour, cell) and score
+AREA_K        = 500      # heap per cell (all time) and score, for area-only windows
+TIME_BUCKET_S = 3600
+FINE_BUCKET_S = 60       # minute heaps for the hours a window cuts; divides TIME_BUCKET_S
+CELL_DEG      = 0.005    # ~550 m
+SKETCH_ALPHA  = 0.005    # quantile thresholds within 0.5% (relative)
+DEFAULT_RADIUS_M = 200.0
+MAX_ROWS_SHOWN   = 10
+
+# heap entry: (score, -row, ts_seconds, latitude, longitude, timestamp)
+# -row makes the earlier of two equal scores rank higher and keeps entries unique
+SCORE, NEG_ROW, TS, LAT, LON, STAMP = range(6)
+
+
+class LogSketch:
+    """DDSketch-style quantile sketch: counts per log-spaced bucket of |value|."""
+
+    def __init__(self, alpha=SKETCH_ALPHA, positive=None, negative=None, zero=0):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self.positive = positive or {}
+        self.negative = negative or {}
+        self.zero = zero
+
+    @property
+    def count(self):
+        return sum(self.positive.values()) + sum(self.negative.values()) + self.zero
+
+    def update(self, values):
+        values = values[np.isfinite(values)]
+        tiny = np.finfo(np.float64).tiny
+        self.zero += int((np.abs(values) < tiny).sum())
+        for buckets, v in ((self.positive, values[values >= tiny]), (self.negative, -values[values <= -tiny])):
+            if len(v):
+                # bucket i holds (gamma^(i-1), gamma^i]
+                keys, counts = np.unique(np.ceil(np.log(v) / np.log(self.gamma)).astype(np.int64),
+                                         return_counts=True)
+                for k, n in zip(keys.tolist(), counts.tolist()):
+                    buckets[k] = buckets.get(k, 0) + n
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        """Value at quantile q (0..1), within alpha relative error; None when empty."""
+        n = self.count
+        if not n:
+            return None
+        rank, seen = q * (n - 1), 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+        return self._value(max(self.positive))
+
+    def to_dict(self):
+        return {"alpha": self.alpha, "zero": self.zero,
+                "positive": {str(k): v for k, v in self.positive.items()},
+                "negative": {str(k): v for k, v in self.negative.items()}}
+
+    @classmethod
+    def from_dict(cls, state):
+        return cls(state["alpha"], {int(k): v for k, v in state["positive"].items()},
+                   {int(k): v for k, v in state["negative"].items()}, state["zero"])
+
+
+def _offer(heap, capacity, entries):
+    """Keep the `capacity` largest entries; O(log capacity) per offered entry."""
+    for entry in entries:
+        if len(heap) < capacity:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+
+def _best_per_group(idx, values, row, keys, k):
+    """The rows of idx among the k best (earlier row first on ties) of their `keys` group."""
+    order = idx[np.lexsort((row[idx], -values[idx], *[key[idx] for key in reversed(keys)]))]
+    group = np.column_stack([key[order] for key in keys])
+    new_group = np.r_[True, (group[1:] != group[:-1]).any(axis=1)]
+    group_start = np.maximum.accumulate(np.where(new_group, np.arange(len(order)), 0))
+    return order[np.arange(len(order)) - group_start < k]
+
+
+def _seconds(value, end=False):
+    if value is None or value == "":
+        return None
+    text = str(value).strip()
+    ts = pd.Timestamp(text)
+    # a bare date as the end bound means the whole day
+    if end and len(text) == 10:
+        ts += pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
+    return int(ts.value // 10**9)
+
+
+class Window:
+    """Time range [start, end] (inclusive) and an optional circle around (lat, lon)."""
+
+    def __init__(self, start=None, end=None, lat=None, lon=None, radius_m=None):
+        self.start, self.end = _seconds(start), _seconds(end, end=True)
+        self.circle = None
+        if lat is not None and lon is not None:
+            self.circle = (float(lat), float(lon), float(radius_m or DEFAULT_RADIUS_M))
+
+    @property
+    def unbounded(self):
+        return self.start is None and self.end is None and self.circle is None
+
+    def contains(self, ts, lat, lon):
+        if (self.start is not None and ts < self.start) or (self.end is not None and ts > self.end):
+            return False
+        if self.circle is None:
+            return True
+        clat, clon, radius = self.circle
+        return haversine_m(clat, clon, lat, lon) <= radius
+
+    def mask(self, ts, lat, lon):
+        """contains() over arrays."""
+        keep = np.ones(len(ts), dtype=bool)
+        if self.start is not None:
+            keep &= ts >= self.start
+        if self.end is not None:
+            keep &= ts <= self.end
+        if self.circle is not None:
+            clat, clon, radius = self.circle
+            keep &= haversine_m(clat, clon, lat, lon) <= radius
+        return keep
+
+    def time_relation(self, hour, bucket_s):
+        """'inside', 'partial' or 'outside' for one time bucket."""
+        lo, hi = hour * bucket_s, (hour + 1) * bucket_s - 1
+        if (self.start is not None and hi < self.start) or (self.end is not None and lo > self.end):
+            return "outside"
+        inside = (self.start is None or lo >= self.start) and (self.end is None or hi <= self.end)
+        return "inside" if inside else "partial"
+
+    def area_relation(self, ilat, ilon, cell_deg):
+        """'inside', 'partial' or 'outside' for one grid cell."""
+        if self.circle is None:
+            return "inside"
+        clat, clon, radius = self.circle
+        lat0, lon0 = ilat * cell_deg, ilon * cell_deg
+        lat1, lon1 = lat0 + cell_deg, lon0 + cell_deg
+        # nearest point of the cell to the centre decides "outside"; its corners decide "inside"
+        if haversine_m(clat, clon, min(max(clat, lat0), lat1), min(max(clon, lon0), lon1)) > radius:
+            return "outside"
+        corners = haversine_m(clat, clon, np.array([lat0, lat0, lat1, lat1]), np.array([lon0, lon1, lon0, lon1]))
+        return "inside" if (corners <= radius).all() else "partial"
+
+
+def _relation(timing, area):
+    """Combine the time and area relations of one stratum."""
+    if "outside" in (timing, area):
+        return "outside"
+    return "inside" if timing == area == "inside" else "partial"
+
+
+class ExtremeIndex:
+    """Bounded heaps + quantile sketches per score; update(rows) per batch, queries in microseconds."""
+
+    def __init__(self, scores=None, k=TOP_K, stratum_k=STRATUM_K, area_k=AREA_K,
+                 time_bucket_s=TIME_BUCKET_S, cell_deg=CELL_DEG, fine_bucket_s=FINE_BUCKET_S):
+        if fine_bucket_s and time_bucket_s % fine_bucket_s:
+            raise ValueError(f"fine_bucket_s ({fine_bucket_s}) must divide time_bucket_s ({time_bucket_s})")
+        self.scores = dict(scores or SCORES)
+        self.k, self.stratum_k, self.area_k = k, stratum_k, area_k
+        self.time_bucket_s, self.cell_deg = time_bucket_s, cell_deg
+        self.fine_bucket_s = fine_bucket_s                    # None: no minute heaps
+        self.rows = 0
+        self.top = {name: [] for name in self.scores}
+        self.strata = {name: {} for name in self.scores}      # {(hour, ilat, ilon): heap}
+        self.minutes = {name: {} for name in self.scores}     # {(minute, ilat, ilon): heap}
+        self.areas = {name: {} for name in self.scores}       # {(ilat, ilon): heap}
+        self.sketches = {name: LogSketch() for name in self.scores}
+        self.hours = []                                       # sorted stratum hours
+        self.cells = {}                                       # hour -> {(ilat, ilon)}
+
+    @classmethod
+    def from_frame(cls, df, **kwargs):
+        index = cls(**kwargs)
+        index.update(df)
+        return index
+
+    def update(self, rows):
+        """Fold one batch in; row numbers continue from the rows already seen."""
+        n = len(rows)
+        if not n:
+            return
+        row = self.rows + np.arange(n, dtype=np.int64)
+        ts = pd.to_datetime(rows["timestamp"]).to_numpy("datetime64[s]").astype(np.int64)
+        lat = rows["latitude"].to_numpy(np.float64)
+        lon = rows["longitude"].to_numpy(np.float64)
+        stamps = rows["timestamp"].astype(str).to_numpy()
+        hour = ts // self.time_bucket_s
+        minute = ts // (self.fine_bucket_s or self.time_bucket_s)
+        ilat = np.floor(lat / self.cell_deg).astype(np.int64)
+        ilon = np.floor(lon / self.cell_deg).astype(np.int64)
+
+        def entries(idx, values):
+            return [(float(values[i]), -int(row[i]), int(ts[i]), float(lat[i]), float(lon[i]), str(stamps[i]))
+                    for i in idx]
+
+        # eval() resolves every column of the frame it runs on: give it only the ones scored
+        names = set(re.findall(r"[A-Za-z_]\w*", " ".join(self.scores.values())))
+        scored = rows[[c for c in rows.columns if c in names]]
+        for name, expr in self.scores.items():
+            values = np.asarray(scored.eval(expr), dtype=np.float64).reshape(-1)
+            self.sketches[name].update(values)
+            finite = np.flatnonzero(np.isfinite(values))
+            # best first, earlier row first on ties
+            ranked = finite[np.lexsort((row[finite], -values[finite]))]
+            _offer(self.top[name], self.k, entries(ranked[:self.k], values))
+
+            groups = [(self.strata[name], (hour, ilat, ilon), self.stratum_k),
+                      (self.areas[name], (ilat, ilon), self.area_k)]
+            if self.fine_bucket_s:
+                groups.append((self.minutes[name], (minute, ilat, ilon), self.stratum_k))
+            for heaps, keys, k in groups:
+                keep = _best_per_group(finite, values, row, keys, k)
+                for i, entry in zip(keep.tolist(), entries(keep, values)):
+                    _offer(heaps.setdefault(tuple(int(key[i]) for key in keys), []), k, [entry])
+
+        for h, a, b in set(zip(hour.tolist(), ilat.tolist(), ilon.tolist())):
+            if h not in self.cells:
+                self.cells[h] = set()
+                insort(self.hours, h)
+            self.cells[h].add((a, b))
+        self.rows += n
+
+    # ---- queries ----
+
+    def _check(self, score):
+        if score not in self.scores:
+            raise KeyError(f"Unknown score '{score}'. Available: {', '.join(self.scores)}")
+
+    def top_n(self, score=DEFAULT_SCORE, n=MAX_ROWS_SHOWN, start=None, end=None,
+              lat=None, lon=None, radius_m=None):
+        """
+        {score, n, rows (entries, best first), exact, strata}; exact=False means
+        a dropped row might rank (ExtremeToolkit then recomputes on the data).
+        """
+        self._check(score)
+        window = Window(start, end, lat, lon, radius_m)
+        if window.unbounded:
+            heap = self.top[score]
+            return {"score": score, "n": n, "rows": heapq.nlargest(n, heap),
+                    "exact": n <= len(heap) or len(heap) < self.k, "strata": 0}
+
+        areas = {cell: window.area_relation(*cell, self.cell_deg) for cell in self.areas[score]}
+        if window.start is None and window.end is None:
+            groups = [(areas[cell], heap, self.area_k) for cell, heap in self.areas[score].items()]
+        else:
+            lo = 0 if window.start is None else bisect_left(self.hours, window.start // self.time_bucket_s)
+            hi = len(self.hours) if window.end is None else bisect_right(self.hours, window.end // self.time_bucket_s)
+            heaps, minutes, groups = self.strata[score], self.minutes[score], []
+            per_hour = self.time_bucket_s // (self.fine_bucket_s or self.time_bucket_s)
+            for hour in self.hours[lo:hi]:
+                timing = window.time_relation(hour, self.time_bucket_s)
+                for cell in self.cells[hour]:
+                    area = areas.get(cell, "outside")
+                    if timing != "partial" or not self.fine_bucket_s:
+                        groups.append((_relation(timing, area), heaps.get((hour, *cell)), self.stratum_k))
+                        continue
+                    # a cut hour: whole minutes inside the window, only the end minutes cut
+                    for m in range(hour * per_hour, (hour + 1) * per_hour):
+                        if (m, *cell) in minutes:
+                            relation = _relation(window.time_relation(m, self.fine_bucket_s), area)
+                            groups.append((relation, minutes[(m, *cell)], self.stratum_k))
+
+        candidates, cut, floor, visited = [], [], None, 0
+        for relation, heap, capacity in groups:
+            if not heap or relation == "outside":
+                continue
+            visited += 1
+            (candidates if relation == "inside" else cut).extend(heap)
+            if len(heap) >= capacity and (floor is None or heap[0] > floor):
+                floor = heap[0]   # rows this heap dropped all rank below it
+        if cut:
+            ts, lat, lon = (np.array([e[j] for e in cut]) for j in (TS, LAT, LON))
+            candidates.extend(e for e, keep in zip(cut, window.mask(ts, lat, lon)) if keep)
+        best = heapq.nlargest(n, candidates)
+        exact = floor is None or (len(best) == n and best[-1] >= floor)
+        return {"score": score, "n": n, "rows": best, "exact": exact, "strata": visited}
+
+    def tail(self, score=DEFAULT_SCORE, fraction=0.01, show=MAX_ROWS_SHOWN):
+        """
+        The top `fraction` of rows: {top_rows (how many), threshold (score of the
+        last of them), at_or_above (rows scoring >= threshold, ties included;
+        None when the ties may run past the heap), exact, rows (first `show`)}.
+        """
+        self._check(score)
+        sketch, heap = self.sketches[score], self.top[score]
+        m = math.ceil(fraction * sketch.count)
+        at_or_above = None
+        if m <= len(heap):
+            best = heapq.nlargest(m, heap)
+            threshold, exact = (best[-1][SCORE] if best else None), True
+            if threshold is not None:
+                tied = sum(1 for e in heap if e[SCORE] >= threshold)
+                # a full heap whose every row ties or beats it may have dropped more ties
+                if tied < len(heap) or len(heap) < self.k:
+                    at_or_above = tied
+        else:
+            best = heapq.nlargest(show, heap)
+            threshold, exact = sketch.quantile(1 - fraction), False
+        return {"score": score, "fraction": fraction, "top_rows": m, "threshold": threshold,
+                "at_or_above": at_or_above, "exact": exact, "rows": best[:show]}
+
+    def threshold(self, score=DEFAULT_SCORE, q=0.99):
+        """Quantile q of the score (sketch, SKETCH_ALPHA relative error)."""
+        self._check(score)
+        return self.sketches[score].quantile(q)
+
+    # ---- persistence ----
+
+    def to_dict(self):
+        return {
+            "scores": self.scores, "k": self.k, "stratum_k": self.stratum_k, "area_k": self.area_k,
+            "time_bucket_s": self.time_bucket_s, "cell_deg": self.cell_deg,
+            "fine_bucket_s": self.fine_bucket_s, "rows": self.rows,
+            "top": self.top,
+            "strata": {name: [[*key, heap] for key, heap in heaps.items()] for name, heaps in self.strata.items()},
+            "minutes": {name: [[*key, heap] for key, heap in heaps.items()] for name, heaps in self.minutes.items()},
+            "areas": {name: [[*key, heap] for key, heap in heaps.items()] for name, heaps in self.areas.items()},
+            "sketches": {name: s.to_dict() for name, s in self.sketches.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        # files written before the minute heaps existed have none: cut hours stay cut
+        index = cls(state["scores"], state["k"], state["stratum_k"], state["area_k"],
+                    state["time_bucket_s"], state["cell_deg"], state.get("fine_bucket_s"))
+        index.rows = state["rows"]
+        index.top = {name: [tuple(e) for e in heap] for name, heap in state["top"].items()}
+        for name, items in state["strata"].items():
+            for hour, ilat, ilon, heap in items:
+                index.strata[name][(hour, ilat, ilon)] = [tuple(e) for e in heap]
+                index.cells.setdefault(hour, set()).add((ilat, ilon))
+        for name, items in state.get("minutes", {}).items():
+            for minute, ilat, ilon, heap in items:
+                index.minutes[name][(minute, ilat, ilon)] = [tuple(e) for e in heap]
+        for name, items in state["areas"].items():
+            for ilat, ilon, heap in items:
+                index.areas[name][(ilat, ilon)] = [tuple(e) for e in heap]
+        index.hours = sorted(index.cells)
+        index.sketches = {name: LogSketch.from_dict(s) for name, s in state["sketches"].items()}
+        return index
+
+    def save(self, path=EXTREMES_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path=EXTREMES_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+
+def exact_top_n(df, expr, n, window):
+    """The same ranking computed on the dataframe (fallback and reference)."""
+    values = np.asarray(df.eval(expr), dtype=np.float64).reshape(-1)
+    ts = pd.to_datetime(df["timestamp"]).to_numpy("datetime64[s]").astype(np.int64)
+    lat, lon = df["latitude"].to_numpy(np.float64), df["longitude"].to_numpy(np.float64)
+    idx = np.flatnonzero(window.mask(ts, lat, lon) & np.isfinite(values))
+    idx = idx[np.lexsort((idx, -values[idx]))][:n]
+    stamps = df["timestamp"].astype(str).to_numpy()
+    return [(float(values[i]), -int(i), int(ts[i]), float(lat[i]), float(lon[i]), str(stamps[i])) for i in idx]
+
+
+def rows_table(entries, score):
+    if not entries:
+        return "No rows."
+    table = pd.DataFrame({"timestamp": [e[STAMP] for e in entries], score: [e[SCORE] for e in entries],
+                          "latitude": [e[LAT] for e in entries], "longitude": [e[LON] for e in entries]})
+    return table.to_string(index=False)
+
+
+class ExtremeToolkit:
+    """extreme_events tool over an ExtremeIndex; uncertified windowed answers are recomputed on df."""
+
+    def __init__(self, index, df=None):
+        self.index, self.df = index, df
+        self._landmarks = None
+
+    def _place(self, name):
+        from gazetteer import load_landmarks
+        if self._landmarks is None:
+            self._landmarks = load_landmarks()
+        hits = self._landmarks[self._landmarks["name"].str.contains(name, case=False, regex=False)]
+        if hits.empty:
+            raise KeyError(f"Unknown place '{name}'")
+        return float(hits["latitude"].iloc[0]), float(hits["longitude"].iloc[0])
+
+    def query(self, text=""):
+        from kernels import _parse_tool_input
+        args = _parse_tool_input(text)
+        score = args.get("score", DEFAULT_SCORE)
+        t0 = time.perf_counter()
+        if "top" in args:
+            percent = float(args["top"])   # always a percent: top=0.5 is the top 0.5%
+            if not 0 < percent <= 100:
+                raise ValueError(f"top is a percent in (0, 100], got {args['top']}")
+            r = self.index.tail(score, percent / 100, int(args.get("n", MAX_ROWS_SHOWN)))
+            at_or_above = r["at_or_above"]
+            if at_or_above is None and r["exact"] and self.df is not None:
+                values = np.asarray(self.df.eval(self.index.scores[score]), dtype=np.float64)
+                at_or_above = int(np.sum(values >= r["threshold"]))
+            how = "exact" if r["exact"] else f"threshold from the quantile sketch (±{SKETCH_ALPHA:.1%})"
+            head = (f"Top {percent:g}% by {score}: the {r['top_rows']:,} highest row(s), "
+                    f"{score} >= {r['threshold']} ({how})")
+            if at_or_above is not None and at_or_above != r["top_rows"]:
+                head += f"; {at_or_above:,} row(s) are at or above that value (ties included)"
+            head += f". Highest {len(r['rows'])}:"
+            return f"{head}\n{rows_table(r['rows'], score)} [{(time.perf_counter() - t0) * 1e6:.0f}µs]"
+
+        lat, lon = args.get("lat"), args.get("lon")
+        if args.get("place"):
+            lat, lon = self._place(str(args["place"]))
+        n = int(args.get("n", 1))
+        r = self.index.top_n(score, n, args.get("start"), args.get("end"), lat, lon, args.get("radius_m"))
+        rows, note = r["rows"], "index"
+        if not r["exact"] and self.df is not None:
+            window = Window(args.get("start"), args.get("end"), lat, lon, args.get("radius_m"))
+            rows, note = exact_top_n(self.df, self.index.scores[score], n, window), "recomputed on the data"
+        elif not r["exact"]:
+            note = "index, may miss rows of partially covered strata"
+        if n == 1 and rows:
+            body = f"Max {score} = {rows[0][SCORE]} at {rows[0][STAMP]} ({rows[0][LAT]}, {rows[0][LON]})"
+        else:
+            body = f"Top {n} by {score}:\n{rows_table(rows, score)}"
+        return f"{body}\n[{note}, {(time.perf_counter() - t0) * 1e6:.0f}µs]"
+
+    def as_tools(self):
+        from langchain_core.tools import Tool
+
+        def call(text):
+            try:
+                return self.query(text)
+            except (ValueError, KeyError, TypeError) as e:
+                return f"Error: {e}"
+
+        return [
+            Tool(name="extreme_events", func=call, description=(
+                "Precomputed extremes (top-k heaps + quantile thresholds), instant on any data size. "
+                f"Scores: {', '.join(self.index.scores)} (magnitude = norm of the x/y/z p99s, "
+                "combined = their sum, instability = accel_variance). "
+                "Input: 'score=<name>, n=<rows>' (n=1: max and its timestamp); optional "
+                "start=<YYYY-MM-DD[ HH:MM:SS]>, end=..., place=<landmark> or lat=<>, lon=<>, radius_m=<>. "
+                "'score=<name>, top=<percent>' returns the top p% (top=1 is the top 1%, "
+                "top=0.5 the top 0.5%).")),
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Top-k extreme-event index.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    parser.add_argument("--score", action="append", default=[],
+                        help="Extra score as name=<pandas expression> (repeatable).")
+    parser.add_argument("--load", action="store_true", help=f"Query the saved index ({EXTREMES_PATH}).")
+    parser.add_argument("--save", action="store_true", help=f"Write the built index to {EXTREMES_PATH}.")
+    parser.add_argument("--query", type=str, default=None, help="extreme_events tool input.")
+    args = parser.parse_args()
+
+    if args.load:
+        print(ExtremeToolkit(ExtremeIndex.load()).query(args.query or ""))
+        raise SystemExit
+
+    scores = {**SCORES, **dict(s.split("=", 1) for s in args.score)}
+    df = pd.read_csv(args.csv)
+    t0 = time.perf_counter()
+    index = ExtremeIndex.from_frame(df, scores=scores)
+    print(f"Indexed {len(df):,} rows x {len(scores)} score(s) in {time.perf_counter() - t0:.2f}s")
+    if args.save:
+        print(f"Saved → {index.save()}")
+    toolkit = ExtremeToolkit(index, df)
+    if args.query:
+        print(toolkit.query(args.query))
+        raise SystemExit
+
+    day = str(df["timestamp"].min())[:10]
+    for query in ["score=x_p99, n=1", "score=combined, top=1, n=5", f"score=magnitude, n=5, start={day}, end={day}",
+                  "score=instability, n=3, lat=33.7756, lon=-84.3963, radius_m=300"]:
+        print(f"\n{query}\n{toolkit.query(query)}")
+
+    # the same answers by full sort
+    t0 = time.perf_counter()
+    full = exact_top_n(df, scores["x_p99"], 1, Window())
+    print(f"\nFull-sort max x_p99: {full[0][SCORE]} at {full[0][STAMP]} in {(time.perf_counter() - t0) * 1e3:.1f}ms")
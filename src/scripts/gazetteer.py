@@ -0,0 +1,199 @@
+"""
+gazetteer.py
+------------
+Offline reverse geocoding: coordinate -> nearest campus landmark.
+
+Replaces the "LLM extracts 'lat, lon' from the insight, then a Tavily web
+search names the place" step. Landmarks come from a local CSV
+(data/reference/gt_campus_landmarks.csv), are bucketed into a uniform grid of
+CELL_DEG cells, and a lookup only measures the haversine distance to the
+landmarks in the block of cells that can hold one within MAX_MATCH_M.
+Lookups are memoized on coordinates rounded to MEMO_DECIMALS (~1 m), so
+repeated fixes cost a dict hit.
+
+Coordinates are read straight from the result, no LLM call. Structured
+results (the DataFrame / Series the agent's REPL returned) are preferred:
+their latitude/longitude columns are the coordinates. Text is a fallback and
+is read conservatively: "latitude ... longitude ..." labels, or a bare
+"lat, lon" pair only when it falls inside the landmarks' bounding box (any
+two 3-decimal numbers — a threshold and a variance — are not a coordinate).
+Only coordinates that match a landmark are reported; no match, no context.
+
+Usage:
+    # Name the nearest landmark for a coordinate:
+    python gazetteer.py 33.7772 -84.3962
+
+    # Annotate every fix in the dataset and time the lookups:
+    python gazetteer.py --csv ../../data/raw/bus_data.csv
+"""
+
+import os
+import re
+import time
+import argparse
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from geo import haversine_m
+
+# --- Configuration ---
+BASE_DIR       = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT    = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+LANDMARKS_PATH = os.path.join(BASE_DIR, "data", "reference", "gt_campus_landmarks.csv")
+
+CELL_DEG       = 0.002   # ~220 m north-south; grid cell edge
+MAX_MATCH_M    = 400.0   # farther than this there is no meaningful "near"
+MEMO_DECIMALS  = 5       # ~1 m; coordinates rounded to this key the memo
+MEMO_SIZE      = 65_536
+MAX_PLACES     = 5       # distinct coordinates annotated per result
+
+# "33.7772, -84.3962" (only trusted inside the landmark bounding box) and
+# "latitude 33.77 ... longitude -84.39"
+COORD_PAIR = re.compile(r"(?<![\d.])(-?\d{1,2}\.\d{3,})\s*[,/ ]\s*(-?\d{1,3}\.\d{3,})(?![\d.])")
+LAT_LABEL  = re.compile(r"\blat(?:itude)?\b[^\d\-\n]{0,20}(-?\d{1,2}\.\d+)", re.IGNORECASE)
+LON_LABEL  = re.compile(r"\b(?:lon|lng|longitude)\b[^\d\-\n]{0,20}(-?\d{1,3}\.\d+)", re.IGNORECASE)
+
+
+def load_landmarks(path=LANDMARKS_PATH):
+    return pd.read_csv(path, comment="#")
+
+
+class Gazetteer:
+    """Grid-indexed nearest-landmark lookup with a rounded-coordinate memo."""
+
+    def __init__(self, landmarks=None, cell_deg=CELL_DEG, max_distance_m=MAX_MATCH_M):
+        landmarks = load_landmarks() if landmarks is None else landmarks
+        self.names = landmarks["name"].tolist()
+        self.categories = landmarks["category"].tolist()
+        self.lat = landmarks["latitude"].to_numpy(np.float64)
+        self.lon = landmarks["longitude"].to_numpy(np.float64)
+        self.cell_deg = cell_deg
+        self.max_distance_m = max_distance_m
+        # unlabelled text pairs are only believed inside this box (landmarks + reach)
+        pad_lat = max_distance_m / 111_320
+        pad_lon = pad_lat / max(np.cos(np.radians(self.lat.mean())), 1e-6) if len(self.lat) else pad_lat
+        self.bounds = ((self.lat.min() - pad_lat, self.lat.max() + pad_lat,
+                        self.lon.min() - pad_lon, self.lon.max() + pad_lon)
+                       if len(self.lat) else None)
+
+        # cells to search either side so every landmark within max_distance_m is seen
+        # (a degree of longitude shrinks with cos(latitude))
+        mid_lat = np.radians(self.lat.mean()) if len(self.lat) else 0.0
+        self.ring_lat = int(np.ceil(max_distance_m / (cell_deg * 111_320)))
+        self.ring_lon = int(np.ceil(max_distance_m / (cell_deg * 111_320 * np.cos(mid_lat))))
+
+        self.grid = {}
+        for i, cell in enumerate(zip(*self._cells(self.lat, self.lon))):
+            self.grid.setdefault(cell, []).append(i)
+        self._lookup = lru_cache(maxsize=MEMO_SIZE)(self._nearest)
+
+    def _cells(self, lat, lon):
+        return (np.floor(np.asarray(lat) / self.cell_deg).astype(int),
+                np.floor(np.asarray(lon) / self.cell_deg).astype(int))
+
+    def _candidates(self, lat, lon):
+        ci, cj = (int(c) for c in self._cells(lat, lon))
+        return [i for di in range(-self.ring_lat, self.ring_lat + 1)
+                for dj in range(-self.ring_lon, self.ring_lon + 1)
+                for i in self.grid.get((ci + di, cj + dj), ())]
+
+    def _nearest(self, lat, lon):
+        idx = self._candidates(lat, lon)
+        if not idx:
+            return None
+        idx = np.asarray(idx)
+        dist = haversine_m(lat, lon, self.lat[idx], self.lon[idx])
+        best = int(np.argmin(dist))
+        if dist[best] > self.max_distance_m:
+            return None
+        i = int(idx[best])
+        return {"name": self.names[i], "category": self.categories[i],
+                "distance_m": round(float(dist[best]), 1)}
+
+    def nearest(self, lat, lon):
+        """Nearest landmark within max_distance_m as {name, category, distance_m}, or None."""
+        return self._lookup(round(float(lat), MEMO_DECIMALS), round(float(lon), MEMO_DECIMALS))
+
+    def describe(self, lat, lon):
+        hit = self.nearest(lat, lon)
+        if hit is None:
+            return f"({lat:.5f}, {lon:.5f}) is not near a known campus landmark"
+        return f"({lat:.5f}, {lon:.5f}) is {hit['distance_m']:.0f} m from {hit['name']}"
+
+    def annotate(self, result):
+        """
+        Location context for a raw result (DataFrame, Series or text), or "" when
+        none of its coordinates is near a landmark.
+        """
+        places = [self.describe(lat, lon) for lat, lon in extract_coordinates(result, self.bounds)
+                  if self.nearest(lat, lon) is not None][:MAX_PLACES]
+        if not places:
+            return ""
+        return "Location context: " + "; ".join(places) + "."
+
+    def cache_info(self):
+        return self._lookup.cache_info()
+
+
+def _plausible(lat, lon):
+    return -90 <= lat <= 90 and -180 <= lon <= 180
+
+
+def _inside(bounds, lat, lon):
+    return bounds is not None and bounds[0] <= lat <= bounds[1] and bounds[2] <= lon <= bounds[3]
+
+
+def extract_coordinates(result, bounds=None):
+    """
+    Distinct (lat, lon) pairs in a DataFrame / Series / text result, in order of
+    appearance. Text: labelled latitude/longitude values; unlabelled pairs only
+    inside bounds (lat_min, lat_max, lon_min, lon_max), never without them.
+    """
+    if isinstance(result, pd.DataFrame):
+        if not {"latitude", "longitude"} <= set(result.columns):
+            return []
+        pairs = zip(result["latitude"], result["longitude"])
+    elif isinstance(result, pd.Series):
+        if not {"latitude", "longitude"} <= set(result.index):
+            return []
+        pairs = [(result["latitude"], result["longitude"])]
+    else:
+        text = str(result)
+        lats, lons = LAT_LABEL.findall(text), LON_LABEL.findall(text)
+        pairs = [(float(a), float(b)) for a, b in zip(lats, lons)]
+        if not pairs:
+            pairs = [(float(a), float(b)) for a, b in COORD_PAIR.findall(text)
+                     if _inside(bounds, float(a), float(b))]
+
+    seen, coords = set(), []
+    for lat, lon in pairs:
+        lat, lon = float(lat), float(lon)
+        key = (round(lat, MEMO_DECIMALS), round(lon, MEMO_DECIMALS))
+        if _plausible(lat, lon) and key not in seen:
+            seen.add(key)
+            coords.append((lat, lon))
+    return coords
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline nearest-landmark lookup.")
+    parser.add_argument("lat", type=float, nargs="?")
+    parser.add_argument("lon", type=float, nargs="?")
+    parser.add_argument("--csv", type=str, default=None,
+                        help="Annotate every fix of a dataset and report lookup cost.")
+    args = parser.parse_args()
+
+    gazetteer = Gazetteer()
+    if args.lat is not None and args.lon is not None:
+        print(gazetteer.describe(args.lat, args.lon))
+    else:
+        df = pd.read_csv(args.csv or CSV_DEFAULT, usecols=["latitude", "longitude"])
+        t0 = time.perf_counter()
+        hits = [gazetteer.nearest(lat, lon) for lat, lon in zip(df["latitude"], df["longitude"])]
+        elapsed = time.perf_counter() - t0
+        names = pd.Series([h["name"] if h else "(none)" for h in hits]).value_counts()
+        print(f"{len(df):,} lookups in {elapsed * 1000:.1f}ms "
+              f"({elapsed / len(df) * 1e6:.1f}us each); {gazetteer.cache_info()}")
+        print(names.head(10).to_string())
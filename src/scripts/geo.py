@@ -0,0 +1,31 @@
+"""
+geo.py
+------
+Small vectorized geodesy helpers shared by the dwell detector and route index.
+"""
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_M = 6_371_000.0
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in metres; works element-wise on NumPy arrays."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def time_ordered_fixes(df):
+    """
+    (ts_seconds, lat, lon) as float/int64 arrays sorted oldest-first.
+    bus_data.csv is stored newest-first, so nothing downstream may assume order.
+    """
+    ts = pd.to_datetime(df["timestamp"]).to_numpy("datetime64[s]").astype(np.int64)
+    lat, lon = df["latitude"].to_numpy(np.float64), df["longitude"].to_numpy(np.float64)
+    if len(ts) and (np.diff(ts) >= 0).all():
+        return ts, lat, lon   # already oldest-first (attached shm frame)
+    order = np.argsort(ts, kind="stable")
+    return ts[order], lat[order], lon[order]
@@ -0,0 +1,416 @@
+"""
+gt_executor.py
+--------------
+Fused, out-of-core executor for GROUND_TRUTH_FNS in queries.py.
+
+Each ground-truth function is re-expressed as a mergeable aggregate:
+
+    partial(chunk) -> state      (vectorized over one chunk)
+    merge(a, b)    -> state      (associative; chunk order preserved for ties)
+    finalize(s)    -> str        (byte-identical to the in-memory gt_* output)
+
+All of them are evaluated in ONE streaming pass over CSV or Parquet chunks,
+reading only the columns they need (a partitioned directory is read part file
+by part file). With --workers N the file is cut into
+byte blocks (CSV) or row groups (Parquet) handled by a process pool, and
+partial states are merged in file order. Memory is bounded by the chunk/block
+size plus the distinct (latitude, longitude) count map; --sketch swaps that map
+for a HyperLogLog + Misra-Gries summary so memory is bounded outright (the
+location answers then become estimates).
+
+Usage:
+    # Ground truth for the enlarged dataset in one pass:
+    python gt_executor.py --csv ../../data/raw/bus_data_enlarged.csv
+
+    # Across 4 processes, bounded-memory sketches:
+    python gt_executor.py --csv big.csv --workers 4 --sketch
+
+    # Check fused results against the in-memory functions (small files):
+    python gt_executor.py --check
+"""
+
+import os
+import io
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from stats_state import MomentState
+
+# --- Configuration ---
+BASE_DIR    = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+
+CHUNK_ROWS  = 200_000          # rows per chunk in the streaming pass
+BLOCK_BYTES = 64 * 1024 ** 2   # CSV bytes per process-pool task
+HLL_P       = 14               # 2^14 registers, ~0.8% standard error
+MG_CAPACITY = 10_000           # Misra-Gries counters kept for top-k in sketch mode
+
+LOCATION = ["latitude", "longitude"]
+
+
+# ====================================================
+# Mergeable aggregates
+# ====================================================
+
+class CountWhere:
+    def __init__(self, columns, predicate):
+        self.columns, self.predicate = columns, predicate
+
+    def partial(self, chunk):
+        return int(self.predicate(chunk).sum())
+
+    def merge(self, a, b):
+        return a + b
+
+    def finalize(self, s):
+        return str(s)
+
+
+class ArgMax:
+    """Max of `column` plus `payload` from its first occurrence (idxmax semantics)."""
+
+    def __init__(self, column, payload):
+        self.columns, self.column, self.payload = [column, payload], column, payload
+
+    def partial(self, chunk):
+        if chunk.empty:
+            return None
+        i = chunk[self.column].to_numpy().argmax()
+        return chunk[self.column].iat[i], chunk[self.payload].iat[i]
+
+    def merge(self, a, b):
+        if a is None or (b is not None and b[0] > a[0]):
+            return b
+        return a   # ties keep the earlier chunk
+
+    def finalize(self, s):
+        return f"{s[0]} at {s[1]}"
+
+
+class ArgMin(ArgMax):
+    """Min of `column` plus `payload` from its first occurrence."""
+
+    def partial(self, chunk):
+        if chunk.empty:
+            return None
+        i = chunk[self.column].to_numpy().argmin()
+        return chunk[self.column].iat[i], chunk[self.payload].iat[i]
+
+    def merge(self, a, b):
+        if a is None or (b is not None and b[0] < a[0]):
+            return b
+        return a
+
+    def finalize(self, s):
+        return f"{self.column}={s[0]}, {self.payload}={s[1]}"
+
+
+class Mean:
+    def __init__(self, column, fmt):
+        self.columns, self.column, self.fmt = [column], column, fmt
+
+    def partial(self, chunk):
+        values = chunk[self.column].dropna()
+        return len(values), float(values.sum())
+
+    def merge(self, a, b):
+        return a[0] + b[0], a[1] + b[1]
+
+    def finalize(self, s):
+        return format(s[1] / s[0], self.fmt)
+
+
+class Std:
+    """Sample std through the same pairwise merge MomentState uses."""
+
+    def __init__(self, column, fmt):
+        self.columns, self.column, self.fmt = [column], column, fmt
+
+    def partial(self, chunk):
+        return MomentState.from_frame(chunk, [self.column])
+
+    def merge(self, a, b):
+        return a.merge_in(b)
+
+    def finalize(self, s):
+        return format(float(s.std()[0]), self.fmt)
+
+
+class GroupCounts:
+    """
+    Exact (latitude, longitude) -> count map shared by the distinct-count and
+    top-k answers. Per-chunk counts are concatenated and compacted lazily.
+    """
+
+    def __init__(self, keys=LOCATION):
+        self.columns, self.keys = list(keys), list(keys)
+
+    def partial(self, chunk):
+        return [chunk.groupby(self.keys).size()]
+
+    def merge(self, a, b):
+        parts = a + b
+        if sum(len(p) for p in parts) > 4 * CHUNK_ROWS:
+            parts = [self.compact(parts)]
+        return parts
+
+    @staticmethod
+    def compact(parts):
+        return pd.concat(parts).groupby(level=[0, 1]).sum()
+
+    def counts(self, s):
+        return self.compact(s).sort_index()
+
+
+class HyperLogLog:
+    """Distinct (latitude, longitude) estimate in 2^p bytes; merge = register max."""
+
+    def __init__(self, keys=LOCATION, p=HLL_P):
+        self.columns, self.keys, self.p = list(keys), list(keys), p
+
+    def partial(self, chunk):
+        registers = np.zeros(1 << self.p, dtype=np.uint8)
+        h = pd.util.hash_pandas_object(chunk[self.keys], index=False).to_numpy(np.uint64)
+        idx = (h >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = h & np.uint64((1 << (64 - self.p)) - 1)
+        bit_length = np.frexp(rest.astype(np.float64))[1]
+        rank = (64 - self.p - bit_length + 1).astype(np.uint8)
+        np.maximum.at(registers, idx, rank)
+        return registers
+
+    def merge(self, a, b):
+        return np.maximum(a, b)
+
+    def estimate(self, registers):
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        e = alpha * m * m / np.sum(2.0 ** -registers.astype(np.float64))
+        zeros = int((registers == 0).sum())
+        if e <= 2.5 * m and zeros:
+            e = m * np.log(m / zeros)   # linear counting for small cardinalities
+        return int(round(e))
+
+
+class MisraGries:
+    """Mergeable heavy-hitter summary (counts are lower bounds)."""
+
+    def __init__(self, keys=LOCATION, capacity=MG_CAPACITY):
+        self.columns, self.keys, self.capacity = list(keys), list(keys), capacity
+
+    def _prune(self, counts):
+        if len(counts) <= self.capacity:
+            return counts
+        cut = counts.nlargest(self.capacity + 1).iloc[-1]
+        counts = counts - cut
+        return counts[counts > 0]
+
+    def partial(self, chunk):
+        return self._prune(chunk.groupby(self.keys).size())
+
+    def merge(self, a, b):
+        return self._prune(pd.concat([a, b]).groupby(level=[0, 1]).sum())
+
+
+# ====================================================
+# Ground-truth plan (same order as GROUND_TRUTH_FNS)
+# ====================================================
+
+def _top5_string(counts):
+    top5 = counts.sort_index().nlargest(5).reset_index(name="count")
+    return top5.to_string(index=False)
+
+
+def build_plan(sketch=False):
+    """
+    List of (name, aggregate, finalize) — finalize receives the merged state.
+    Location aggregates are shared so the count map is built once.
+    """
+    if sketch:
+        distinct, heavy = HyperLogLog(), MisraGries()
+        location_aggs = {"distinct": distinct, "heavy": heavy}
+        unique_fin = lambda st: f"~{distinct.estimate(st['distinct'])}"
+        top5_fin = lambda st: _top5_string(st["heavy"]) + "\n(approximate: Misra-Gries lower bounds)"
+    else:
+        groups = GroupCounts()
+        location_aggs = {"groups": groups}
+        unique_fin = lambda st: str(len(groups.counts(st["groups"])))
+        top5_fin = lambda st: _top5_string(groups.counts(st["groups"]))
+
+    scalar = {
+        "gt_accel_mean_exact": CountWhere(["accel_mean"], lambda c: c["accel_mean"] == 9.344),
+        "gt_variance_above": CountWhere(["accel_variance"], lambda c: c["accel_variance"] > 0.15),
+        "gt_z_p99_above": CountWhere(["accel_stats_z_p99"], lambda c: c["accel_stats_z_p99"] > 11.0),
+        "gt_max_x_p99": ArgMax("accel_stats_x_p99", "timestamp"),
+        "gt_avg_y_p90": Mean("accel_stats_y_p90", ".4f"),
+        "gt_std_accel_mean": Std("accel_mean", ".6f"),
+        "gt_earliest_timestamp": ArgMin("timestamp", "accel_mean"),
+        "gt_lon_range": CountWhere(["longitude"], lambda c: c["longitude"].between(-84.39, -84.38)),
+    }
+    aggs = {**scalar, **location_aggs}
+    finalizers = {name: (lambda st, n=name, a=agg: a.finalize(st[n])) for name, agg in scalar.items()}
+    finalizers["gt_unique_locations"] = unique_fin
+    finalizers["gt_top5_locations"] = top5_fin
+
+    order = ["gt_accel_mean_exact", "gt_variance_above", "gt_z_p99_above", "gt_max_x_p99",
+             "gt_avg_y_p90", "gt_std_accel_mean", "gt_unique_locations", "gt_top5_locations",
+             "gt_earliest_timestamp", "gt_lon_range"]
+    return aggs, [(name, finalizers[name]) for name in order]
+
+
+def _partials(aggs, chunk):
+    return {name: agg.partial(chunk) for name, agg in aggs.items()}
+
+
+def _merge(aggs, a, b):
+    if a is None:
+        return b
+    return {name: agg.merge(a[name], b[name]) for name, agg in aggs.items()}
+
+
+def _columns(aggs):
+    return sorted({col for agg in aggs.values() for col in agg.columns})
+
+
+# ====================================================
+# Chunk sources
+# ====================================================
+
+def _csv_blocks(path, block_bytes):
+    """(start, end) byte ranges aligned to line boundaries, header excluded."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        header = f.readline()
+        offsets = [len(header)]
+        while offsets[-1] < size:
+            f.seek(min(offsets[-1] + block_bytes, size))
+            f.readline()   # finish the partial line
+            offsets.append(min(f.tell(), size))
+    return header, list(zip(offsets[:-1], offsets[1:]))
+
+
+def _csv_block_task(args):
+    path, header, start, end, sketch = args
+    aggs, _ = build_plan(sketch)
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = header + f.read(end - start)
+    state = None
+    for chunk in pd.read_csv(io.BytesIO(data), usecols=_columns(aggs), chunksize=CHUNK_ROWS):
+        state = _merge(aggs, state, _partials(aggs, chunk))
+    return state
+
+
+def _parquet_task(args):
+    path, row_group, sketch = args
+    import pyarrow.parquet as pq
+
+    aggs, _ = build_plan(sketch)
+    table = pq.ParquetFile(path).read_row_group(row_group, columns=_columns(aggs))
+    return _partials(aggs, table.to_pandas())
+
+
+def _iter_chunks(path, columns, chunksize, partition_filter=None):
+    if os.path.isdir(path):
+        # date=/vehicle= layout (partitions.py): one chunk per selected part file
+        from partitions import iter_partitions
+
+        yield from iter_partitions(path, columns, **(partition_filter or {}))
+    elif path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+
+# ====================================================
+# Executor
+# ====================================================
+
+def compute_ground_truth(path, chunksize=CHUNK_ROWS, workers=1, sketch=False,
+                         block_bytes=BLOCK_BYTES, partition_filter=None, frame=None):
+    """
+    All ground-truth answers for `path` in one streaming pass (list, GT order).
+    partition_filter (partitions.parse_filter) prunes a partitioned directory.
+    frame is an already-loaded frame to answer on instead of reading path
+    (eval.py --exclude_bad_rows: the same rows the agent sees).
+    """
+    aggs, plan = build_plan(sketch)
+    state = None
+
+    if frame is not None:
+        state = _merge(aggs, state, _partials(aggs, frame[_columns(aggs)]))
+    elif workers > 1 and not os.path.isdir(path):
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+
+            n_groups = pq.ParquetFile(path).num_row_groups
+            tasks, task_fn = [(path, g, sketch) for g in range(n_groups)], _parquet_task
+        else:
+            header, blocks = _csv_blocks(path, block_bytes)
+            tasks = [(path, header, s, e, sketch) for s, e in blocks]
+            task_fn = _csv_block_task
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() yields in submission order, so tie-breaking stays file-ordered
+            for partial in pool.map(task_fn, tasks):
+                state = _merge(aggs, state, partial)
+    else:
+        for chunk in _iter_chunks(path, _columns(aggs), chunksize, partition_filter):
+            state = _merge(aggs, state, _partials(aggs, chunk))
+
+    return [finalize(state) for _, finalize in plan]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fused single-pass ground truth.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT,
+                        help="CSV, .parquet, or a partitioned directory (partitions.py).")
+    parser.add_argument("--dates", type=str, default=None,
+                        help="Partitioned directory only: START[:END] days to read.")
+    parser.add_argument("--vehicles", type=str, default=None,
+                        help="Partitioned directory only: comma-separated vehicle ids.")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--sketch", action="store_true",
+                        help="HyperLogLog + Misra-Gries for the location answers.")
+    parser.add_argument("--check", action="store_true",
+                        help="Compare against the in-memory GROUND_TRUTH_FNS.")
+    args = parser.parse_args()
+
+    partition_filter = None
+    if args.dates or args.vehicles:
+        from partitions import parse_filter
+
+        if not os.path.isdir(args.csv):
+            parser.error("--dates / --vehicles need a partitioned directory")
+        try:
+            partition_filter = parse_filter(args.dates, args.vehicles)
+        except ValueError as e:
+            parser.error(str(e))
+
+    t0 = time.perf_counter()
+    answers = compute_ground_truth(args.csv, args.chunksize, args.workers, args.sketch,
+                                   partition_filter=partition_filter)
+    elapsed = time.perf_counter() - t0
+    size_mb = (sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(args.csv) for f in fs)
+               if os.path.isdir(args.csv) else os.path.getsize(args.csv)) / 1024 ** 2
+    print(f"Fused pass over {size_mb:.1f} MB in {elapsed:.2f}s ({size_mb / elapsed:.1f} MB/s)")
+
+    expected = None
+    if args.check:
+        from queries import GROUND_TRUTH_FNS
+        from shm_frame import load_dataframe
+
+        df = load_dataframe(args.csv, partition_filter=partition_filter)
+        expected = [fn(df) for fn in GROUND_TRUTH_FNS]
+
+    for i, answer in enumerate(answers):
+        status = "" if expected is None else (" [match]" if answer == expected[i] else " [DIFF]")
+        print(f"\nQ{i + 1}{status}:\n{answer}")
+        if expected is not None and answer != expected[i]:
+            print(f"expected:\n{expected[i]}")
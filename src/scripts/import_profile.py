@@ -0,0 +1,103 @@
+"""
+import_profile.py
+-----------------
+Cold-start cost of the entry points, from CPython's `-X importtime` trace.
+
+Each target runs in a fresh interpreter (`python -X importtime -c "import eval"`),
+so nothing is warm. The trace on stderr is reduced to the wall time, the total
+import time, and the packages that dominate it (self time summed per top-level
+package, so every pandas.* module counts towards "pandas").
+
+Usage:
+    # Default entry points (eval, eval's ground-truth path, rag_retrieve, service):
+    python import_profile.py
+
+    # Any statement, more rows:
+    python import_profile.py --stmt "import eval; eval.build_llm" --top 20
+
+eval.py --profile_imports appends the same report to its benchmark output.
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+# --- Configuration ---
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+TOP_N = 10
+
+ENTRY_POINTS = {
+    "eval (import)": "import eval",
+    "eval --ground_truth_only": "import eval, gt_executor",
+    "eval (LLM stages)": "import eval; eval.build_llm(); eval.new_thinking_handler()",
+    "rag_retrieve (import)": "import rag_retrieve",
+    "service (import)": "import service",
+}
+
+# "import time:  self [us] | cumulative | imported package" — nesting is indentation
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)")
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] in trace order."""
+    rows = []
+    for line in stderr.splitlines():
+        m = IMPORTTIME_LINE.match(line)
+        if m:
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), (len(m.group(3)) - 1) // 2))
+    return rows
+
+
+def profile_imports(statement, top=TOP_N, cwd=SCRIPTS_DIR):
+    """Wall time, total import time and the costliest packages of one statement."""
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                          cwd=cwd, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    rows = parse_importtime(proc.stderr)
+    packages = {}
+    for name, self_us, _, _ in rows:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0) + self_us
+    costliest = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    errors = [l for l in proc.stderr.splitlines() if l and not l.startswith("import time:")]
+    return {
+        "statement": statement,
+        "ok": proc.returncode == 0,
+        "error": errors[-1] if proc.returncode and errors else None,
+        "wall_ms": round(wall * 1000, 1),
+        "import_ms": round(sum(r[1] for r in rows) / 1000, 1),
+        "modules": len(rows),
+        "top": [(name, round(us / 1000, 1)) for name, us in costliest],
+    }
+
+
+def profile_entry_points(entry_points=ENTRY_POINTS, top=TOP_N):
+    return {label: profile_imports(stmt, top) for label, stmt in entry_points.items()}
+
+
+def format_profiles(profiles):
+    lines = ["Import-time profile (-X importtime, fresh interpreter per entry point)"]
+    for label, p in profiles.items():
+        status = "" if p["ok"] else f"  [failed: {p['error']}]"
+        lines.append(f"\n{label}: wall={p['wall_ms']:.0f}ms, imports={p['import_ms']:.0f}ms "
+                     f"across {p['modules']} modules{status}")
+        for name, ms in p["top"]:
+            lines.append(f"    {ms:>9.1f}ms  {name}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize -X importtime for the entry points.")
+    parser.add_argument("--stmt", type=str, default=None, help="Profile one statement instead.")
+    parser.add_argument("--top", type=int, default=TOP_N)
+    args = parser.parse_args()
+
+    if args.stmt:
+        profiles = {args.stmt: profile_imports(args.stmt, args.top)}
+    else:
+        profiles = profile_entry_points(top=args.top)
+    print(format_profiles(profiles))
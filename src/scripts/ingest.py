@@ -0,0 +1,794 @@
+"""
+ingest.py
+---------
+Append-only ingestion of new sensor rows with incremental upkeep of every
+derived artifact.
+
+Rows arrive in batches from a tailing CSV (the device log being appended to) or
+from a local TCP socket standing in for the device feed (one JSON object or one
+CSV line per row). Each batch is validated (schema, parseable timestamp,
+finite numbers, plausible coordinates; bad rows go to ingest_rejects.csv) and
+appended to a columnar store: one raw little-endian file per column under
+data/processed/store/, so an append is one write per column and reading rows
+[a, b) is a memmap slice.
+
+Every artifact keeps a watermark = number of store rows already folded in, and
+only ever reads rows past it:
+
+    geojson   data/processed/bus_route.geojson; features are spliced in before
+              the closing bracket (same properties as convert_to_geojson.py)
+    bins      sparse fixed-width histogram of accel_mean; the quantile thresholds
+              and getColor() of analyze_bins.py are read off its cumulative counts
+    metadata  per-column count / min / max / mean and a k-minimum-values distinct
+              count sketch (column_metadata.json)
+    moments   stats_state.MomentState folded in batch by batch
+    dwell     dwell.DwellDetector (its own timestamp watermark and files)
+    clusters  mini-batch k-means over projected coordinates; new rows are
+              assigned on arrival and appended to clusters.csv
+    sample    approx.StratifiedSample reservoirs (approx_sample.csv) for the
+              approximate query mode
+    extremes  extremes.ExtremeIndex top-k heaps and quantile sketches
+              (extremes.json, checkpointed every CHECKPOINT_S and on exit);
+              store row numbers rank ties
+    partitions   (with --partitioned) date=/vehicle= Parquet part files under
+              data/processed/partitions (partitions.py); enabling it later
+              folds the whole store in from watermark 0
+
+Watermarks, sketch and histogram state live in ingest_state.json, written after
+the artifacts; files that are appended to (GeoJSON, clusters.csv) record their
+committed size and are truncated back to it after a crash, so a restart simply
+catches up from the watermarks. Artifacts that persist their own files cannot
+rely on that ordering, so they never fold a row twice: sample and extremes
+record in their own files the store rows they hold (committed(), which
+overrides the watermark on restart and lets extremes checkpoint rather than
+rewrite a large file per batch), and dwell skips rows up to its own timestamp
+watermark. A batch is visible in every artifact within milliseconds of
+arriving instead of at the next manual rebuild.
+
+Usage:
+    # Seed the store from the existing CSV (one-off full build of the artifacts):
+    python ingest.py init --csv ../../data/raw/bus_data.csv
+
+    # Follow a CSV that a logger keeps appending to:
+    python ingest.py tail --csv path/to/live.csv
+
+    # Listen for the device feed, and replay a CSV into it for testing:
+    python ingest.py listen --port 8901
+    python ingest.py replay --csv ../../data/raw/bus_data.csv --port 8901 --rate 20
+
+    # Also keep the date=/vehicle= Parquet layout current (needs pyarrow):
+    python ingest.py --partitioned tail --csv path/to/live.csv
+
+    # Watermarks and row counts:
+    python ingest.py status
+"""
+
+import io
+import os
+import csv
+import json
+import time
+import socket
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from dwell import DwellDetector
+from stats_state import MomentState
+from approx import StratifiedSample, LAYOUT as SAMPLE_LAYOUT, SAMPLE_PATH
+from extremes import ExtremeIndex, EXTREMES_PATH
+from partitions import PARTITION_ROOT, write_partitions
+
+# --- Configuration ---
+BASE_DIR      = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT   = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
+STORE_DIR     = os.path.join(PROCESSED_DIR, "store")
+STATE_PATH    = os.path.join(PROCESSED_DIR, "ingest_state.json")
+REJECTS_PATH  = os.path.join(PROCESSED_DIR, "ingest_rejects.csv")
+GEOJSON_PATH  = os.path.join(PROCESSED_DIR, "bus_route.geojson")
+BINS_PATH     = os.path.join(PROCESSED_DIR, "bin_thresholds.json")
+METADATA_PATH = os.path.join(PROCESSED_DIR, "column_metadata.json")
+CLUSTERS_PATH = os.path.join(PROCESSED_DIR, "clusters.csv")
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIMESTAMP_COLUMN = "timestamp"
+# bus_data.csv's header: the schema a socket feed creates on an empty store,
+# and the order of its CSV lines
+FEED_COLUMNS = [
+    TIMESTAMP_COLUMN, "latitude", "longitude", "accel_mean", "accel_variance",
+    *(f"accel_stats_{axis}_p{p}" for axis in "xyz" for p in (1, 10, 90, 99)),
+]
+
+BIN_COLUMN  = "accel_mean"
+BIN_WIDTH   = 0.001          # sensor reports 3 decimals -> histogram quantiles are exact
+NUM_BINS    = 5
+BIN_COLORS  = ["#d73027", "#fc8d59", "#fee08b", "#d9ef8b", "#91cf60"]
+KMV_K       = 1024           # distinct-count sketch size (exact below K distinct values)
+CLUSTER_K   = 8
+CLUSTER_SEED = 0
+M_PER_DEG_LAT = 110_540.0
+M_PER_DEG_LON = 111_320.0
+
+CHECKPOINT_S = 30.0          # large artifact files are rewritten at most this often
+TAIL_POLL_S  = 1.0
+SOCKET_PORT  = 8901
+BATCH_ROWS   = 50            # socket feed: flush after this many rows ...
+BATCH_FLUSH_S = 1.0          # ... or this long after the first buffered row
+
+GEOJSON_HEAD = '{\n  "type": "FeatureCollection",\n  "features": ['
+GEOJSON_FOOT = "\n  ]\n}"
+
+
+# ====================================================
+# Validation
+# ====================================================
+
+def validate(batch, columns):
+    """
+    (clean rows, rejected rows with a `reason` column). Clean rows have a
+    datetime64 timestamp and float64 everything else, in store column order.
+    """
+    batch = batch.reset_index(drop=True)
+    missing = [c for c in columns if c not in batch.columns]
+    reason = pd.Series("", index=batch.index, dtype=object)
+    if missing:
+        reason[:] = f"missing columns: {', '.join(missing)}"
+        return batch.iloc[0:0], batch.assign(reason=reason)
+
+    clean = pd.DataFrame(index=batch.index)
+    clean[TIMESTAMP_COLUMN] = pd.to_datetime(batch[TIMESTAMP_COLUMN], format=TS_FORMAT, errors="coerce")
+    for col in columns:
+        if col != TIMESTAMP_COLUMN:
+            clean[col] = pd.to_numeric(batch[col], errors="coerce").astype(np.float64)
+    clean = clean[columns]
+
+    values = clean.drop(columns=TIMESTAMP_COLUMN).to_numpy()
+    checks = [
+        (clean[TIMESTAMP_COLUMN].isna().to_numpy(), "unparseable timestamp"),
+        (~np.isfinite(values).all(axis=1), "non-numeric or missing value"),
+        (~clean["latitude"].between(-90, 90).to_numpy(), "latitude out of range"),
+        (~clean["longitude"].between(-180, 180).to_numpy(), "longitude out of range"),
+        (clean.duplicated().to_numpy(), "duplicate row in batch"),
+    ]
+    bad = np.zeros(len(clean), dtype=bool)
+    for mask, why in checks:
+        reason[mask & ~bad] = why
+        bad |= mask
+    return clean[~bad].reset_index(drop=True), batch[bad].assign(reason=reason[bad])
+
+
+def _log_rejects(rejected, path=REJECTS_PATH):
+    if rejected.empty:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        header = pd.read_csv(path, nrows=0).columns.tolist()
+        if set(rejected.columns) - set(header):
+            # new columns (e.g. `raw` of an unparsable line): rewrite under the union header
+            merged = pd.concat([pd.read_csv(path, dtype=str), rejected], ignore_index=True)
+            merged.to_csv(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+            return
+        rejected = rejected.reindex(columns=header)
+    rejected.to_csv(path, mode="a", header=not os.path.exists(path), index=False)
+
+
+# ====================================================
+# Columnar store
+# ====================================================
+
+class ColumnStore:
+    """
+    One append-only file per column: timestamp as int64 epoch seconds, the rest
+    as float64. schema.json holds the committed row count; bytes past it (an
+    interrupted append) are cut off on open.
+    """
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        self.schema_path = os.path.join(path, "schema.json")
+        self.columns, self.rows = [], 0
+        if os.path.exists(self.schema_path):
+            with open(self.schema_path, encoding="utf-8") as f:
+                schema = json.load(f)
+            self.columns, self.rows = schema["columns"], schema["rows"]
+            for col in self.columns:
+                with open(self._file(col), "r+b") as f:
+                    f.truncate(self.rows * 8)
+
+    def _file(self, col):
+        return os.path.join(self.path, f"{col}.bin")
+
+    def _dtype(self, col):
+        return np.dtype("<i8") if col == TIMESTAMP_COLUMN else np.dtype("<f8")
+
+    def create(self, columns):
+        os.makedirs(self.path, exist_ok=True)
+        self.columns, self.rows = list(columns), 0
+        for col in self.columns:
+            open(self._file(col), "wb").close()
+        self._commit()
+
+    def _commit(self):
+        tmp = self.schema_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"columns": self.columns, "rows": self.rows}, f)
+        os.replace(tmp, self.schema_path)
+
+    def append(self, clean):
+        """Append validated rows; returns the new row count."""
+        if clean.empty:
+            return self.rows
+        for col in self.columns:
+            if col == TIMESTAMP_COLUMN:
+                values = clean[col].to_numpy("datetime64[s]").astype(np.int64)
+            else:
+                values = clean[col].to_numpy(np.float64)
+            with open(self._file(col), "ab") as f:
+                f.write(values.astype(self._dtype(col)).tobytes())
+        self.rows += len(clean)
+        self._commit()
+        return self.rows
+
+    def read(self, start=0, stop=None):
+        """Rows [start, stop) as a DataFrame shaped like bus_data.csv (timestamp as text)."""
+        stop = self.rows if stop is None else min(stop, self.rows)
+        data = {}
+        for col in self.columns:
+            if stop <= start:
+                values = np.empty(0, self._dtype(col))
+            else:
+                values = np.array(np.memmap(self._file(col), dtype=self._dtype(col), mode="r",
+                                            offset=start * 8, shape=(stop - start,)))
+            if col == TIMESTAMP_COLUMN:
+                values = pd.to_datetime(values, unit="s").strftime(TS_FORMAT)
+            data[col] = values
+        return pd.DataFrame(data, columns=self.columns)
+
+
+def load_store(path=STORE_DIR):
+    """The whole store as a DataFrame (drop-in for pd.read_csv(bus_data.csv))."""
+    return ColumnStore(path).read()
+
+
+# ====================================================
+# Artifacts — each folds in store rows past its watermark
+# ====================================================
+
+def _append_at(path, committed_bytes, payload):
+    """Write payload at committed_bytes (dropping anything after it); returns the new size."""
+    mode = "r+b" if os.path.exists(path) else "w+b"
+    with open(path, mode) as f:
+        f.seek(committed_bytes)
+        f.write(payload.encode("utf-8"))
+        f.truncate()
+        return f.tell()
+
+
+class GeoJsonArtifact:
+    name = "geojson"
+
+    def __init__(self, state, path=GEOJSON_PATH):
+        self.path = path
+        self.bytes = state.get("bytes", 0)
+        self.features = state.get("features", 0)
+
+    def update(self, rows):
+        records = rows.to_dict(orient="records")
+        features = []
+        for row in records:
+            lon, lat = row.pop("longitude"), row.pop("latitude")
+            features.append(json.dumps({
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                "properties": row,
+            }))
+        body = ",\n    ".join(features)
+        if self.features == 0:
+            self.bytes = _append_at(self.path, 0, f"{GEOJSON_HEAD}\n    {body}{GEOJSON_FOOT}")
+        else:
+            # splice in before the closing "]}" of the committed file
+            start = self.bytes - len(GEOJSON_FOOT)
+            self.bytes = _append_at(self.path, start, f",\n    {body}{GEOJSON_FOOT}")
+        self.features += len(features)
+
+    def state(self):
+        return {"bytes": self.bytes, "features": self.features}
+
+
+class BinsArtifact:
+    """analyze_bins.py's quantile thresholds from an incrementally kept histogram."""
+    name = "bins"
+
+    def __init__(self, state, column=BIN_COLUMN, width=BIN_WIDTH, path=BINS_PATH):
+        self.column, self.width, self.path = column, width, path
+        self.counts = {int(k): v for k, v in state.get("counts", {}).items()}
+
+    def update(self, rows):
+        keys, counts = np.unique(np.round(rows[self.column].to_numpy() / self.width).astype(np.int64),
+                                 return_counts=True)
+        for k, n in zip(keys.tolist(), counts.tolist()):
+            self.counts[k] = self.counts.get(k, 0) + n
+        self._write()
+
+    def thresholds(self, num_bins=NUM_BINS):
+        keys = np.array(sorted(self.counts))
+        cum = np.cumsum([self.counts[k] for k in keys])
+        cuts = [keys[np.searchsorted(cum, cum[-1] * q / num_bins)] * self.width
+                for q in range(1, num_bins)]
+        return sorted(set(round(float(c), 6) for c in cuts))
+
+    def _write(self):
+        cuts = self.thresholds()
+        colors = BIN_COLORS[:len(cuts) + 1]
+        js = "function getColor(accel) {\n"
+        js += "".join(f"    return accel <= {t:.4f} ? '{c}' :\n" for t, c in zip(cuts, colors))
+        js += f"           '{colors[-1]}'; // Default for highest values\n}}"
+        payload = {"column": self.column, "rows": int(sum(self.counts.values())),
+                   "thresholds": cuts, "colors": colors, "getColor": js}
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+
+    def state(self):
+        return {"counts": {str(k): v for k, v in self.counts.items()}}
+
+
+class DistinctSketch:
+    """k-minimum-values distinct count: exact below k distinct values, ~3% error above."""
+
+    def __init__(self, hashes=(), k=KMV_K):
+        self.k = k
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+
+    def update(self, values):
+        h = pd.util.hash_array(np.asarray(values))
+        self.hashes = np.unique(np.concatenate((self.hashes, h)))[:self.k]
+
+    def estimate(self):
+        if len(self.hashes) < self.k:
+            return len(self.hashes)
+        return int((self.k - 1) / (float(self.hashes[-1]) / 2.0**64))
+
+
+class MetadataArtifact:
+    """Column metadata in eval.build_column_metadata's shape, kept from running aggregates."""
+    name = "metadata"
+
+    def __init__(self, state, path=METADATA_PATH):
+        self.path = path
+        self.columns = state.get("columns", {})
+        self.sketches = {col: DistinctSketch(entry.pop("kmv", ())) for col, entry in self.columns.items()}
+
+    def update(self, rows):
+        for col in rows.columns:
+            entry = self.columns.setdefault(col, {"count": 0})
+            sketch = self.sketches.setdefault(col, DistinctSketch())
+            values = rows[col]
+            sketch.update(values.to_numpy())
+            entry["count"] += len(values)
+            lo, hi = values.min(), values.max()
+            entry["min"] = lo if "min" not in entry else min(entry["min"], lo)
+            entry["max"] = hi if "max" not in entry else max(entry["max"], hi)
+            if col != TIMESTAMP_COLUMN:
+                entry["sum"] = entry.get("sum", 0.0) + float(values.sum())
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.metadata(), f, indent=2, default=float)
+
+    def metadata(self):
+        meta = {}
+        for col, entry in self.columns.items():
+            info = {"dtype": "object" if col == TIMESTAMP_COLUMN else "float64",
+                    "n_unique": self.sketches[col].estimate(),
+                    "min": entry["min"], "max": entry["max"]}
+            if "sum" in entry:
+                info["mean"] = round(entry["sum"] / entry["count"], 4)
+            meta[col] = info
+        return meta
+
+    def state(self):
+        return {"columns": {col: {**entry, "kmv": self.sketches[col].hashes.tolist()}
+                            for col, entry in self.columns.items()}}
+
+
+class MomentsArtifact:
+    name = "moments"
+
+    def __init__(self, state):
+        self.moments = MomentState.from_dict(state) if state else MomentState()
+
+    def update(self, rows):
+        self.moments.update(rows)
+
+    def state(self):
+        return self.moments.to_dict()
+
+
+class DwellArtifact:
+    """
+    DwellDetector keeps its own timestamp watermark and files (dwell_events.csv).
+    Rows at or before that watermark are skipped, so re-folding a batch after a
+    crash is a no-op.
+    """
+    name = "dwell"
+
+    def __init__(self, state):
+        self.detector = DwellDetector.load() if state.get("saved") else DwellDetector()
+
+    def update(self, rows):
+        self.detector.update(rows)
+        self.detector.save()
+
+    def state(self):
+        return {"saved": True, "events": len(self.detector.closed)}
+
+
+class SampleArtifact:
+    """
+    Stratified reservoirs; each batch is merged per stratum, then rewritten.
+    The saved population counts are the store rows the files hold (committed()).
+    """
+    name = "sample"
+    layout = SAMPLE_LAYOUT
+
+    def __init__(self, state, path=SAMPLE_PATH):
+        self.path = path
+        # a fresh seed per batch so draws after a restart don't repeat earlier ones
+        self.batches = state.get("batches", 0)
+        self.sample = None
+        if state.get("saved"):
+            try:
+                self.sample = StratifiedSample.load(path, seed=self.batches)
+            except (OSError, ValueError, KeyError):
+                pass   # missing or half-written files: rebuild from store row 0
+        self.sample = self.sample or StratifiedSample(seed=self.batches)
+
+    def committed(self):
+        return self.sample.n_population
+
+    def update(self, rows):
+        self.sample.update(rows)
+        self.sample.save(self.path)
+        self.batches += 1
+
+    def state(self):
+        return {"saved": True, "batches": self.batches, "rows": len(self.sample)}
+
+
+class ExtremesArtifact:
+    """
+    Top-k heaps per extreme score; a batch costs O(log k) per row that makes a
+    heap. The index file is large, so it is checkpointed (CHECKPOINT_S) rather
+    than rewritten per batch; it holds index.rows, the store rows it covers.
+    """
+    name = "extremes"
+
+    def __init__(self, state, path=EXTREMES_PATH, checkpoint_s=CHECKPOINT_S):
+        self.path, self.checkpoint_s = path, checkpoint_s
+        saved = state.get("saved") and os.path.exists(path)
+        self.index = ExtremeIndex.load(path) if saved else ExtremeIndex()
+        self.saved_rows = self.index.rows if saved else None
+        self.saved_at = time.monotonic()
+
+    def committed(self):
+        """Store rows covered by the file on disk (0 before the first checkpoint)."""
+        return self.saved_rows or 0
+
+    def update(self, rows):
+        self.index.update(rows)
+        if time.monotonic() - self.saved_at >= self.checkpoint_s:
+            self.flush()
+
+    def flush(self):
+        if self.saved_rows != self.index.rows:
+            self.index.save(self.path)
+            self.saved_rows = self.index.rows
+        self.saved_at = time.monotonic()
+
+    def state(self):
+        return {"saved": self.saved_rows is not None, "rows": self.index.rows}
+
+
+class ClusterArtifact:
+    """
+    Mini-batch k-means (Sculley 2010) over coordinates projected to metres around
+    the first batch: each batch moves a centre by its assigned points' mean with
+    step n_batch / n_total. New rows are labelled on arrival; earlier labels stay.
+    """
+    name = "clusters"
+
+    def __init__(self, state, k=CLUSTER_K, path=CLUSTERS_PATH):
+        self.k, self.path = k, path
+        self.origin = state.get("origin")
+        self.centers = np.asarray(state.get("centers", []), dtype=np.float64).reshape(-1, 2)
+        self.counts = np.asarray(state.get("counts", []), dtype=np.float64)
+        self.bytes = state.get("bytes", 0)
+
+    def _project(self, rows):
+        lat0, lon0 = self.origin
+        return np.column_stack((
+            (rows["longitude"].to_numpy() - lon0) * M_PER_DEG_LON * np.cos(np.radians(lat0)),
+            (rows["latitude"].to_numpy() - lat0) * M_PER_DEG_LAT,
+        ))
+
+    def update(self, rows):
+        if self.origin is None:
+            self.origin = [float(rows["latitude"].mean()), float(rows["longitude"].mean())]
+        x = self._project(rows)
+        if not len(self.centers):
+            rng = np.random.default_rng(CLUSTER_SEED)
+            self.centers = x[rng.choice(len(x), self.k, replace=len(x) < self.k)].copy()
+            self.counts = np.zeros(self.k)
+
+        labels = np.argmin(((x[:, None, :] - self.centers[None, :, :]) ** 2).sum(axis=2), axis=1)
+        n = np.bincount(labels, minlength=self.k).astype(np.float64)
+        sums = np.column_stack([np.bincount(labels, weights=x[:, d], minlength=self.k) for d in (0, 1)])
+        hit = n > 0
+        self.counts += n
+        eta = np.zeros(self.k)
+        eta[hit] = n[hit] / self.counts[hit]
+        self.centers[hit] += eta[hit, None] * (sums[hit] / n[hit, None] - self.centers[hit])
+
+        out = rows[[TIMESTAMP_COLUMN, "latitude", "longitude"]].assign(cluster=labels)
+        header = self.bytes == 0
+        self.bytes = _append_at(self.path, self.bytes, out.to_csv(index=False, header=header))
+
+    def state(self):
+        return {"origin": self.origin, "centers": self.centers.tolist(),
+                "counts": self.counts.tolist(), "bytes": self.bytes}
+
+
+class PartitionArtifact:
+    """One part file per (date, vehicle) and batch; ids hash the rows, so a re-fold overwrites."""
+    name = "partitions"
+
+    def __init__(self, state, root=PARTITION_ROOT):
+        self.root = root
+        self.files = state.get("files", 0)
+
+    def update(self, rows):
+        self.files += len(write_partitions(rows, self.root))
+
+    def state(self):
+        return {"files": self.files}
+
+
+ARTIFACTS = [GeoJsonArtifact, BinsArtifact, MetadataArtifact, MomentsArtifact,
+             DwellArtifact, SampleArtifact, ExtremesArtifact, ClusterArtifact]
+
+
+# ====================================================
+# Ingestor
+# ====================================================
+
+class Ingestor:
+    """Validates batches into the store and brings every artifact up to its end."""
+
+    def __init__(self, store_dir=STORE_DIR, state_path=STATE_PATH, artifacts=ARTIFACTS):
+        self.store = ColumnStore(store_dir)
+        self.state_path = state_path
+        state = {}
+        if os.path.exists(state_path):
+            with open(state_path, encoding="utf-8") as f:
+                state = json.load(f)
+        saved = state.get("artifacts", {})
+        # an artifact whose file layout changed since it was saved is rebuilt from row 0
+        layouts = {cls.name: getattr(cls, "layout", None) for cls in artifacts}
+        saved = {name: entry for name, entry in saved.items()
+                 if name not in layouts or entry.get("layout") == layouts[name]}
+        self.watermarks = {cls.name: saved.get(cls.name, {}).get("watermark", 0) for cls in artifacts}
+        self.artifacts = [cls(saved.get(cls.name, {}).get("state", {})) for cls in artifacts]
+        for artifact in self.artifacts:
+            if hasattr(artifact, "committed"):
+                # its own file, not ingest_state.json, says which rows it holds
+                self.watermarks[artifact.name] = artifact.committed()
+        # artifacts not enabled in this run keep their watermark for the next one
+        self.inactive = {name: entry for name, entry in saved.items() if name not in self.watermarks}
+        self.sources = state.get("sources", {})
+        self.last_freshness_s = state.get("last_freshness_s")
+
+    def ingest(self, batch, received_at=None, schema=None):
+        """
+        Validate + append one batch, then update the artifacts. Returns a report
+        dict. An empty store takes `schema` as its columns (default: the batch's).
+        """
+        received_at = received_at or time.time()
+        if not self.store.columns:
+            self.store.create(list(schema) if schema else
+                              [TIMESTAMP_COLUMN] + [c for c in batch.columns if c != TIMESTAMP_COLUMN])
+        clean, rejected = validate(batch, self.store.columns)
+        _log_rejects(rejected)
+        self.store.append(clean)
+        updated = self.catch_up()
+        self.last_freshness_s = round(time.time() - received_at, 4)
+        self.save()
+        return {"accepted": len(clean), "rejected": len(rejected), "rows": self.store.rows,
+                "updated": updated, "freshness_s": self.last_freshness_s}
+
+    def catch_up(self):
+        """Fold store rows past each artifact's watermark into it (no-op when current)."""
+        lowest = min(self.watermarks.values()) if self.watermarks else self.store.rows
+        if lowest >= self.store.rows:
+            return []
+        pending = self.store.read(lowest)
+        updated = []
+        for artifact in self.artifacts:
+            start = self.watermarks[artifact.name]
+            if start < self.store.rows:
+                artifact.update(pending.iloc[start - lowest:].reset_index(drop=True))
+                self.watermarks[artifact.name] = self.store.rows
+                updated.append(artifact.name)
+        return updated
+
+    def save(self):
+        state = {
+            "rows": self.store.rows,
+            "artifacts": {**self.inactive,
+                          **{a.name: {"watermark": self.watermarks[a.name], "state": a.state(),
+                                      **({"layout": a.layout} if getattr(a, "layout", None) else {})}
+                             for a in self.artifacts}},
+            "sources": self.sources,
+            "last_freshness_s": self.last_freshness_s,
+        }
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, default=float)
+        os.replace(tmp, self.state_path)
+
+    def close(self):
+        """Write checkpointed artifacts out (a crash instead just re-folds past their checkpoint)."""
+        for artifact in self.artifacts:
+            if hasattr(artifact, "flush"):
+                artifact.flush()
+        self.save()
+
+    def status(self):
+        watermarks = {**{name: e.get("watermark", 0) for name, e in self.inactive.items()},
+                      **self.watermarks}
+        return {"rows": self.store.rows, "watermarks": watermarks,
+                "last_freshness_s": self.last_freshness_s, "sources": self.sources}
+
+
+def _report(report):
+    print(f"+{report['accepted']} rows ({report['rejected']} rejected) -> store {report['rows']:,} rows; "
+          f"{', '.join(report['updated']) or 'nothing'} updated, fresh in {report['freshness_s'] * 1000:.1f}ms")
+
+
+# ====================================================
+# Sources
+# ====================================================
+
+def tail_csv(path, offset=None, poll_s=TAIL_POLL_S):
+    """
+    Yields (DataFrame of newly appended complete lines, new byte offset) as a
+    CSV file grows. offset=None starts after the header; partial last lines
+    wait for the next poll.
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        offset = f.tell() if offset is None else offset
+        while True:
+            f.seek(offset)
+            chunk = f.read()
+            end = chunk.rfind(b"\n") + 1
+            if end:
+                offset += end
+                yield pd.read_csv(io.BytesIO(header + chunk[:end]), dtype=str), offset
+            else:
+                time.sleep(poll_s)
+
+
+def _parse_line(line, columns):
+    line = line.strip()
+    if line.startswith("{"):
+        row = json.loads(line)
+        if not isinstance(row, dict):
+            raise ValueError("not a JSON object")
+        return row
+    fields = next(csv.reader([line]))
+    if len(fields) != len(columns):
+        raise ValueError(f"{len(fields)} fields, expected {len(columns)}")
+    return dict(zip(columns, fields))
+
+
+def socket_batches(host="127.0.0.1", port=SOCKET_PORT, columns=FEED_COLUMNS,
+                   batch_rows=BATCH_ROWS, flush_s=BATCH_FLUSH_S):
+    """
+    Yields DataFrames from newline-delimited rows sent to a local TCP socket
+    (JSON objects, or CSV lines in `columns` order). A batch is flushed at
+    batch_rows rows or flush_s seconds after its first row. Lines that do not
+    parse go straight to ingest_rejects.csv, never into a batch.
+    """
+    with socket.create_server((host, port)) as server:
+        print(f"Listening on {host}:{port}")
+        while True:
+            conn, peer = server.accept()
+            print(f"Feed connected from {peer[0]}:{peer[1]}")
+            conn.settimeout(flush_s)
+            buffer, rows, first = b"", [], None
+            with conn:
+                while True:
+                    try:
+                        data = conn.recv(65536)
+                        if not data:
+                            break
+                        buffer += data
+                        *lines, buffer = buffer.split(b"\n")
+                        for line in lines:
+                            if line.strip():
+                                try:
+                                    rows.append(_parse_line(line.decode("utf-8"), columns))
+                                except (ValueError, StopIteration) as e:
+                                    _log_rejects(pd.DataFrame({"raw": [line.decode("utf-8", "replace")],
+                                                               "reason": [f"unparsable line: {e}"]}))
+                        first = first or (time.time() if rows else None)
+                    except socket.timeout:
+                        pass
+                    if rows and (len(rows) >= batch_rows or time.time() - first >= flush_s):
+                        yield pd.DataFrame(rows)
+                        rows, first = [], None
+            if rows:
+                yield pd.DataFrame(rows)
+
+
+def replay(csv_path, host="127.0.0.1", port=SOCKET_PORT, rate=20.0):
+    """Send a CSV's rows oldest-first as JSON lines at `rate` rows per second."""
+    df = pd.read_csv(csv_path, dtype=str)
+    df = df.iloc[np.argsort(pd.to_datetime(df[TIMESTAMP_COLUMN]).to_numpy(), kind="stable")]
+    with socket.create_connection((host, port)) as conn:
+        for i, row in enumerate(df.to_dict(orient="records"), 1):
+            conn.sendall((json.dumps(row) + "\n").encode("utf-8"))
+            time.sleep(1.0 / rate)
+            if i % 100 == 0:
+                print(f"sent {i:,}/{len(df):,}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append-only ingestion with incremental artifacts.")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="Also append every batch to the date=/vehicle= Parquet layout.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    init = sub.add_parser("init", help="Seed the store from an existing CSV.")
+    init.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    tail = sub.add_parser("tail", help="Ingest lines appended to a CSV file.")
+    tail.add_argument("--csv", type=str, required=True)
+    tail.add_argument("--poll", type=float, default=TAIL_POLL_S)
+    listen = sub.add_parser("listen", help="Ingest rows sent to a local socket.")
+    listen.add_argument("--host", type=str, default="127.0.0.1")
+    listen.add_argument("--port", type=int, default=SOCKET_PORT)
+    send = sub.add_parser("replay", help="Replay a CSV into a listening socket.")
+    send.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    send.add_argument("--host", type=str, default="127.0.0.1")
+    send.add_argument("--port", type=int, default=SOCKET_PORT)
+    send.add_argument("--rate", type=float, default=20.0, help="Rows per second.")
+    sub.add_parser("status", help="Print watermarks and row counts.")
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        replay(args.csv, args.host, args.port, args.rate)
+    elif args.command == "status":
+        print(json.dumps(Ingestor().status(), indent=2))
+    else:
+        ingestor = Ingestor(artifacts=ARTIFACTS + [PartitionArtifact] if args.partitioned else ARTIFACTS)
+        ingestor.catch_up()   # finish whatever a previous run left behind
+        try:
+            if args.command == "init":
+                if ingestor.store.rows:
+                    print(f"Store already holds {ingestor.store.rows:,} rows; use tail/listen to append.")
+                else:
+                    t0 = time.perf_counter()
+                    _report(ingestor.ingest(pd.read_csv(args.csv, dtype=str)))
+                    print(f"Initial build in {time.perf_counter() - t0:.2f}s")
+            elif args.command == "tail":
+                path = os.path.abspath(args.csv)
+                for batch, offset in tail_csv(path, ingestor.sources.get(path), args.poll):
+                    ingestor.sources[path] = offset
+                    _report(ingestor.ingest(batch))
+            else:
+                for batch in socket_batches(args.host, args.port, ingestor.store.columns or FEED_COLUMNS):
+                    _report(ingestor.ingest(batch, schema=FEED_COLUMNS))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            ingestor.close()
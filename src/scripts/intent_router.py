@@ -0,0 +1,326 @@
+"""
+intent_router.py
+----------------
+Python port of the archived JS intent layer (intentParser.js), fallback router
+(fallbackRouter.js) and prompt builder (promptBuilder.js), placed in front of
+ask_agent in eval.py.
+
+Broad questions whose intent has a precomputed summary artifact are answered by
+filling the matching prompt_templates.yml template straight from that artifact
+and making ONE LLM call — no rewriter, guardrail, ReAct loop or contextualizer.
+Everything else falls through to the full agent pipeline.
+
+Routing actions (from fallback_policies.yml):
+    reject     -> out-of-scope; return the policy message, no LLM call
+    raw_query  -> intent has no summary artifact; run the full agent on raw data
+    classify   -> ambiguous scope; run the full agent (guardrail escalation)
+    summary    -> render the intent template from artifacts; one LLM call
+
+Usage:
+    # Show routing decisions for the eval suites (no API calls):
+    python intent_router.py
+"""
+
+import os
+import re
+import time
+import argparse
+
+import yaml
+import pandas as pd
+
+from dwell import dwell_summary
+from route_index import efficiency_summary
+from scope_classifier import load_intent_catalog, keyword_hits, OUT_OF_SCOPE_LABEL, AMBIGUOUS
+
+# --- Configuration ---
+BASE_DIR      = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CONFIG_DIR    = os.path.join(BASE_DIR, "src", "archive", "config")
+TEMPLATE_PATH = os.path.join(CONFIG_DIR, "prompt_templates.yml")
+POLICY_PATH   = os.path.join(CONFIG_DIR, "fallback_policies.yml")
+CSV_DEFAULT   = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+
+HOTSPOT_GRID_DECIMALS = 3   # ~100 m cells for aggressive-driving hotspots
+HOTSPOT_MIN_READINGS  = 3
+TOP_N = 5
+
+# A precise filter/threshold means the user wants a computed number, not a summary.
+CONSTRAINT_PATTERN = re.compile(
+    r"\b(above|below|greater|higher|less|lower|exceed\w*|between|exactly|equal\w*|over|under)\b"
+    r"[^\d-]{0,12}-?\d"
+)
+
+
+# ====================================================
+# Intent parsing (port of intentParser.js)
+# ====================================================
+
+def score_intent(query, catalog):
+    # whole-word keyword_hits rather than the JS substring match, which
+    # scored "ratio" inside every "acceleration"
+    text = (query or "").lower()
+    return {
+        intent["id"]: len(keyword_hits(text, [kw.lower() for kw in intent["keywords"]]))
+        for intent in catalog["intents"]
+    }
+
+
+def pick_intent(scores, catalog):
+    best_intent, best_score = catalog["defaultIntent"], 0
+    for intent_id, score in scores.items():
+        if score > best_score:
+            best_intent, best_score = intent_id, score
+
+    total = sum(scores.values()) or 1
+    confidence = best_score / total
+    oos_threshold = catalog.get("oosThreshold", 0.15)
+    is_out_of_scope = confidence < oos_threshold
+
+    return {
+        "intent_id": best_intent,
+        "confidence": confidence,
+        "best_score": best_score,
+        "is_out_of_scope": is_out_of_scope,
+        "rationale": (
+            f"Confidence {confidence:.2f} below threshold {oos_threshold}" if is_out_of_scope
+            else f"Matched intent {best_intent} with score {best_score}"
+        ),
+    }
+
+
+def parse_intent(query, catalog=None):
+    catalog = catalog or load_intent_catalog()
+    scores = score_intent(query, catalog)
+    return {"query": query, **pick_intent(scores, catalog), "scores": scores}
+
+
+# ====================================================
+# Fallback policies (port of fallbackRouter.js)
+# ====================================================
+
+def load_policies(policy_path=POLICY_PATH):
+    with open(policy_path, "r", encoding="utf-8") as f:
+        return (yaml.safe_load(f) or {}).get("policies", [])
+
+
+def detect_out_of_scope(intent_result, data_availability=None):
+    data_availability = data_availability or {}
+    reasons = []
+    if intent_result.get("is_out_of_scope"):
+        reasons.append("oos")
+    if data_availability.get("has_summary") is False:
+        reasons.append("missing-cluster-context")
+    if data_availability.get("is_ambiguous") is True:
+        reasons.append("ambiguous")
+    return {"is_oos": bool(reasons), "reasons": reasons}
+
+
+def apply_fallback(reasons, policies):
+    for policy in policies:
+        if policy["match"] in reasons:
+            return {
+                "policy_id": policy["id"],
+                "action": policy["action"],
+                "reason": policy["match"],
+                "message": policy.get("message") or policy.get("notes") or "Out of scope",
+            }
+    return None
+
+
+# ====================================================
+# Prompt templates (port of promptBuilder.js)
+# ====================================================
+
+def load_templates(template_path=TEMPLATE_PATH):
+    with open(template_path, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)["templates"]
+
+
+def choose_template(templates, intent_id, variant="summary"):
+    intent_templates = templates.get(intent_id) or templates.get("generalInfo") or {}
+    return (intent_templates.get(variant) or intent_templates.get("default")
+            or templates.get("fallback", {}).get("reject"))
+
+
+def render(template_str, variables):
+    for key, value in variables.items():
+        template_str = template_str.replace("{{" + key + "}}", "" if value is None else str(value))
+    return template_str
+
+
+def build_prompt(query, intent_id, variables, templates, variant="summary"):
+    chosen = choose_template(templates, intent_id, variant)
+    if not chosen:
+        return {"system": "", "user": "", "template_id": None, "error": "No template found"}
+    variables = {"query": query, **variables}
+    return {
+        "system": render(chosen.get("system") or "", variables).strip(),
+        "user": render(chosen["user"], variables).strip(),
+        "template_id": chosen["templateId"],
+        "variables_used": sorted(variables),
+        "intent_id": intent_id,
+        "variant": variant,
+    }
+
+
+# ====================================================
+# Precomputed summary artifacts
+# ====================================================
+
+def _general_summary(df):
+    ts = pd.to_datetime(df["timestamp"])
+    num = df.select_dtypes("number").drop(columns=["latitude", "longitude"], errors="ignore")
+    desc = num.describe().T[["mean", "std", "min", "max"]].round(4)
+    summary = (
+        f"Rows: {len(df):,}. Time range: {ts.min()} to {ts.max()}.\n"
+        f"Latitude {df['latitude'].min():.5f} to {df['latitude'].max():.5f}, "
+        f"longitude {df['longitude'].min():.5f} to {df['longitude'].max():.5f}.\n"
+        f"{desc.to_string()}"
+    )
+    return {"summary": summary}
+
+
+def _aggressive_summary(df):
+    # same scoring the dashboard uses: instability = accel_variance,
+    # magnitude = norm of the per-axis p99s
+    magnitude = (df["accel_stats_x_p99"] ** 2 + df["accel_stats_y_p99"] ** 2
+                 + df["accel_stats_z_p99"] ** 2) ** 0.5
+    cells = pd.DataFrame({
+        "lat": df["latitude"].round(HOTSPOT_GRID_DECIMALS),
+        "lon": df["longitude"].round(HOTSPOT_GRID_DECIMALS),
+        "instability": df["accel_variance"],
+        "magnitude": magnitude,
+    })
+    hotspots = (
+        cells.groupby(["lat", "lon"])
+        .agg(readings=("instability", "size"),
+             avg_instability=("instability", "mean"),
+             max_magnitude=("magnitude", "max"))
+        .query("readings >= @HOTSPOT_MIN_READINGS")
+        .nlargest(TOP_N, "avg_instability")
+        .round(4)
+        .reset_index()
+    )
+    stats = (
+        f"accel_variance mean={df['accel_variance'].mean():.4f}, "
+        f"p90={df['accel_variance'].quantile(0.9):.4f}, max={df['accel_variance'].max():.4f}; "
+        f"extreme magnitude mean={magnitude.mean():.4f}, max={magnitude.max():.4f}"
+    )
+    return {"clusters": hotspots.to_string(index=False), "stats": stats}
+
+
+# intent id -> fn(df) returning the template variables for that intent
+SUMMARY_BUILDERS = {
+    "generalInfo": _general_summary,
+    "aggressivePatterns": _aggressive_summary,
+    "dwellTime": dwell_summary,
+    "routeEfficiency": efficiency_summary,
+}
+
+
+def build_summary_artifacts(df, builders=None):
+    """Compute every registered summary once at load time."""
+    builders = builders or SUMMARY_BUILDERS
+    return {intent_id: fn(df) for intent_id, fn in builders.items()}
+
+
+# ====================================================
+# Router
+# ====================================================
+
+class IntentRouter:
+    """Routes a user query to reject / summary / full agent before any LLM call."""
+
+    def __init__(self, df, llm=None, scope_classifier=None, catalog=None,
+                 templates=None, policies=None, guardrail=None):
+        self.llm = llm
+        self.scope_classifier = scope_classifier
+        # fn(query) -> None to proceed, else (rejection answer, trace); asked
+        # before a summary when there is no local scope verdict
+        self.guardrail = guardrail
+        self.catalog   = catalog or load_intent_catalog()
+        self.templates = templates or load_templates()
+        self.policies  = policies if policies is not None else load_policies()
+        self.columns   = [c.lower() for c in df.columns]
+        self.df = df
+        # intent id -> template variables, built the first time that intent is summarized
+        self.artifacts = {}
+
+    def _artifact(self, intent_id):
+        if intent_id not in self.artifacts:
+            self.artifacts[intent_id] = SUMMARY_BUILDERS[intent_id](self.df)
+        return self.artifacts[intent_id]
+
+    def _needs_agent(self, query):
+        """Explicit columns or numeric constraints need computation, not a summary."""
+        text = query.lower()
+        return any(col in text for col in self.columns) or bool(CONSTRAINT_PATTERN.search(text))
+
+    def route(self, query):
+        intent = parse_intent(query, self.catalog)
+        scope = self.scope_classifier.classify(query) if self.scope_classifier else None
+
+        # keyword confidence only picks the intent; scope comes from the local
+        # classifier (zero keyword hits is normal for analytical questions)
+        intent["is_out_of_scope"] = bool(scope and scope["label"] == OUT_OF_SCOPE_LABEL)
+        data_availability = {
+            "has_summary": intent["best_score"] > 0 and intent["intent_id"] in SUMMARY_BUILDERS,
+            "is_ambiguous": bool(scope and scope["label"] == AMBIGUOUS),
+        }
+
+        decision = {"intent": intent, "scope": scope}
+        fallback = apply_fallback(detect_out_of_scope(intent, data_availability)["reasons"],
+                                  self.policies)
+        if fallback and fallback["action"] == "reject":
+            return {**decision, **fallback}
+
+        if intent["best_score"] == 0 or self._needs_agent(query):
+            return {**decision, "action": "agent", "policy_id": None,
+                    "reason": "analytical query"}
+
+        # raw_query / classify both mean: run the full agent on the raw frame
+        if fallback:
+            return {**decision, **fallback}
+
+        # a keyword hit says nothing about scope ("wait at traffic lights" ->
+        # dwellTime): without the local classifier the guardrail must clear it
+        if scope is None:
+            if self.guardrail is None:
+                return {**decision, "action": "agent", "policy_id": None,
+                        "reason": "no scope verdict; the guardrail decides"}
+            rejection = self.guardrail(query)
+            if rejection:
+                answer, trace = rejection
+                return {**decision, "action": "reject", "policy_id": "guardrail",
+                        "reason": trace, "message": answer.removeprefix("[REJECTED]").strip()}
+
+        prompt = build_prompt(query, intent["intent_id"],
+                              self._artifact(intent["intent_id"]), self.templates)
+        return {**decision, "action": "summary", "policy_id": None,
+                "reason": intent["rationale"], "prompt": prompt}
+
+    def answer(self, decision):
+        """Single LLM call over the rendered template."""
+        prompt = decision["prompt"]
+        response = self.llm.invoke([("system", prompt["system"]), ("human", prompt["user"])])
+        return response.content.strip()
+
+
+if __name__ == "__main__":
+    from queries import TEST_QUERIES, QUERY_INTENT, OUT_OF_SCOPE
+
+    parser = argparse.ArgumentParser(description="Show intent router decisions.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    parser.add_argument("--query", type=str, default=None, help="Route a single query.")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    router = IntentRouter(pd.read_csv(args.csv))
+    print(f"Router ready in {time.perf_counter() - t0:.2f}s (artifacts build on first summary)")
+
+    queries = [args.query] if args.query else TEST_QUERIES + QUERY_INTENT + OUT_OF_SCOPE
+    for q in queries:
+        d = router.route(q)
+        print(f"  {d['action']:<10} {d['intent']['intent_id']:<18} {q}")
+        if args.query and d["action"] == "summary":
+            print(f"\n{d['prompt']['system']}\n\n{d['prompt']['user']}")
@@ -0,0 +1,305 @@
+"""
+kernels.py
+----------
+Vectorized event kernels over time-ordered sensor columns, registered as named
+tools on the pandas agent (next to python_repl_ast) so questions like
+
+    "z_p99 unusually high for N consecutive samples"
+    "x_p99 exceeds a threshold 3 times in a rolling window"
+    "transition points where z_p90 jumps"
+    "heavy braking or sharp turns"
+
+become ONE tool call instead of a hand-written pandas loop.
+
+Kernels:
+    consecutive_runs  -> maximal runs of True in a mask (diff on a padded mask)
+    rolling_count     -> hits per sliding window (strided view, no copy)
+    bursts            -> merged windows with >= min_count hits
+    jump_points       -> first-difference jumps vs. the previous window mean
+    pattern_mask      -> named multi-axis patterns (braking, turns, calm-vs-extreme)
+
+Usage:
+    # Run every kernel once on the dataset and print timings:
+    python kernels.py
+"""
+
+import os
+import time
+import inspect
+import argparse
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+# --- Configuration ---
+BASE_DIR    = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+
+MAX_ROWS_SHOWN = 10   # tool output is fed back into the LLM context
+
+
+# ====================================================
+# Kernels (pure NumPy; inputs are time-ordered 1-D arrays)
+# ====================================================
+
+def consecutive_runs(mask, min_len=1):
+    """Inclusive (starts, ends) of runs of True at least min_len long."""
+    edges = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1) - 1
+    keep = (ends - starts + 1) >= min_len
+    return starts[keep], ends[keep]
+
+
+def rolling_count(mask, window):
+    """Number of True values in each length-`window` window (len - window + 1 results)."""
+    mask = np.asarray(mask, dtype=np.int8)
+    if len(mask) < window:
+        return np.empty(0, np.int64)
+    return sliding_window_view(mask, window).sum(axis=1)
+
+
+def bursts(mask, window, min_count):
+    """
+    Windows holding >= min_count hits, merged where they overlap.
+    Returns inclusive (starts, ends) sample positions.
+    """
+    counts = rolling_count(mask, window)
+    win_starts, win_ends = consecutive_runs(counts >= min_count)
+    # a run of qualifying windows [s, e] covers samples s .. e + window - 1
+    return win_starts, win_ends + window - 1
+
+
+def jump_points(values, window=1, threshold=None, z=3.0):
+    """
+    Positions where a value departs from the mean of the previous `window`
+    samples by more than `threshold` (or by z standard deviations of all jumps).
+    Returns (positions, jump sizes).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) <= window:
+        return np.empty(0, np.int64), np.empty(0)
+    prev_mean = sliding_window_view(values[:-1], window).mean(axis=1)
+    jumps = values[window:] - prev_mean
+    if threshold is None:
+        threshold = z * jumps.std()
+    hit = np.flatnonzero(np.abs(jumps) > threshold)
+    return hit + window, jumps[hit]
+
+
+def _extreme(series, q):
+    return series >= series.quantile(q) if q >= 0.5 else series <= series.quantile(q)
+
+
+def _calm_vs_extreme(df, low_q=0.25, high_q=0.95):
+    calm    = {ax: _extreme(df[f"accel_stats_{ax}_p99"], low_q) for ax in "xyz"}
+    extreme = {ax: _extreme(df[f"accel_stats_{ax}_p99"], high_q) for ax in "xyz"}
+    mask = np.zeros(len(df), dtype=bool)
+    for a in "xyz":
+        for b in "xyz":
+            if a != b:
+                mask |= (calm[a] & extreme[b]).to_numpy()
+    return mask
+
+
+# Named multi-axis patterns. Quantile thresholds rather than absolute g values,
+# because the mounting tilt puts gravity partly on y and z.
+PATTERNS = {
+    "heavy_braking": lambda df, q=0.05: _extreme(df["accel_stats_x_p1"], q).to_numpy(),
+    "hard_acceleration": lambda df, q=0.95: _extreme(df["accel_stats_x_p99"], q).to_numpy(),
+    "sharp_turn": lambda df, q=0.95: _extreme(df["accel_stats_y_p99"] - df["accel_stats_y_p1"], q).to_numpy(),
+    "calm_vs_extreme": lambda df: _calm_vs_extreme(df),
+    "rough_vertical": lambda df, q=0.95: _extreme(df["accel_stats_z_p99"] - df["accel_stats_z_p1"], q).to_numpy(),
+}
+
+
+def pattern_mask(df, name, **params):
+    if name not in PATTERNS:
+        raise ValueError(f"Unknown pattern '{name}'. Available: {', '.join(PATTERNS)}")
+    accepted = list(inspect.signature(PATTERNS[name]).parameters)[1:]
+    unknown = sorted(set(params) - set(accepted))
+    if unknown:
+        raise ValueError(f"Pattern '{name}' takes {', '.join(accepted) or 'no parameters'}, "
+                         f"not {', '.join(unknown)}")
+    if "q" in params and not (isinstance(params["q"], (int, float)) and 0 < params["q"] < 1):
+        raise ValueError(f"q must be a quantile between 0 and 1, got {params['q']!r}")
+    return PATTERNS[name](df, **params)
+
+
+# ====================================================
+# Agent tools
+# ====================================================
+
+def _parse_tool_input(text):
+    """'column=accel_stats_z_p99, threshold=11, min_len=5' -> dict with numbers cast."""
+    args = {}
+    for part in str(text).strip().strip("'\"` ").split(","):
+        if "=" not in part:
+            continue
+        key, value = (p.strip().strip("'\"` ") for p in part.split("=", 1))
+        try:
+            value = int(value)
+        except ValueError:
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+        args[key] = value
+    return args
+
+
+def _spans_table(ordered, starts, ends, column=None):
+    """Count of spans plus the first MAX_ROWS_SHOWN as a small table."""
+    if not len(starts):
+        return "0 span(s) found."
+    shown_s, shown_e = starts[:MAX_ROWS_SHOWN], ends[:MAX_ROWS_SHOWN]
+    ts = ordered["timestamp"].to_numpy()
+    spans = pd.DataFrame({"start": ts[shown_s], "end": ts[shown_e], "samples": shown_e - shown_s + 1})
+    if column is not None:
+        values = ordered[column].to_numpy()
+        spans["peak"] = [values[s:e + 1].max() for s, e in zip(shown_s, shown_e)]
+    more = f"\n... {len(starts) - MAX_ROWS_SHOWN} more" if len(starts) > MAX_ROWS_SHOWN else ""
+    return f"{len(starts)} span(s) found.\n{spans.to_string(index=False)}{more}"
+
+
+class KernelToolkit:
+    """Binds the kernels to one (time-ordered) dataframe for tool calls."""
+
+    def __init__(self, df):
+        self._source, self._df = df, None
+
+    @property
+    def df(self):
+        # ordered on the first tool call, not when the agent is built
+        if self._df is None:
+            df = self._source
+            ts = pd.to_datetime(df["timestamp"])
+            # an attached shm frame is published oldest-first: share it, don't copy it
+            if ts.is_monotonic_increasing:
+                self._df = df
+            else:
+                order = np.argsort(ts.to_numpy(), kind="stable")
+                self._df = df.iloc[order].reset_index(drop=True)
+        return self._df
+
+    def _column(self, args):
+        col = args.get("column")
+        if col not in self.df.columns:
+            raise ValueError(f"Unknown column '{col}'")
+        return col
+
+    def _threshold_mask(self, args):
+        col = self._column(args)
+        values = self.df[col]
+        if "threshold" in args:
+            threshold = float(args["threshold"])
+        else:
+            threshold = values.quantile(float(args.get("quantile", 0.95)))
+        mask = values < threshold if args.get("direction") == "below" else values > threshold
+        return col, mask.to_numpy(), threshold
+
+    def consecutive_high(self, text):
+        args = _parse_tool_input(text)
+        col, mask, threshold = self._threshold_mask(args)
+        starts, ends = consecutive_runs(mask, int(args.get("min_len", 3)))
+        return f"{col} beyond {threshold:.4f}: " + _spans_table(self.df, starts, ends, col)
+
+    def rolling_bursts(self, text):
+        args = _parse_tool_input(text)
+        col, mask, threshold = self._threshold_mask(args)
+        starts, ends = bursts(mask, int(args.get("window", 10)), int(args.get("min_count", 3)))
+        return f"{col} beyond {threshold:.4f} bursts: " + _spans_table(self.df, starts, ends, col)
+
+    def transitions(self, text):
+        args = _parse_tool_input(text)
+        col = self._column(args)
+        pos, size = jump_points(self.df[col].to_numpy(), int(args.get("window", 1)),
+                                args.get("threshold"), float(args.get("z", 3.0)))
+        table = pd.DataFrame({"timestamp": self.df["timestamp"].to_numpy()[pos],
+                              "value": self.df[col].to_numpy()[pos], "jump": size.round(4)})
+        order = np.argsort(-np.abs(size))[:MAX_ROWS_SHOWN]
+        return (f"{len(pos)} transition point(s) in {col}. Largest:\n"
+                f"{table.iloc[order].to_string(index=False) if len(pos) else '(none)'}")
+
+    def patterns(self, text):
+        args = _parse_tool_input(text)
+        name = args.pop("pattern", None) or str(text).strip().strip("'\"` ")
+        mask = pattern_mask(self.df, name, **{k: v for k, v in args.items() if k == "q"})
+        starts, ends = consecutive_runs(mask, int(args.get("min_len", 1)))
+        return (f"{name}: {int(mask.sum())} matching sample(s) "
+                f"({mask.mean():.2%}); " + _spans_table(self.df, starts, ends))
+
+    def as_tools(self):
+        from langchain_core.tools import Tool
+
+        def safe(fn):
+            # bad column names / inputs go back to the agent as an observation
+            def call(text):
+                try:
+                    return fn(text)
+                except (ValueError, KeyError, TypeError) as e:
+                    return f"Error: {e}"
+            return call
+
+        return [
+            Tool(
+                name="consecutive_high",
+                func=safe(self.consecutive_high),
+                description=(
+                    "Find runs where a column stays beyond a threshold for N consecutive samples. "
+                    "Input: 'column=<col>, threshold=<value> (or quantile=0.95), min_len=<N>, "
+                    "direction=above|below'."
+                ),
+            ),
+            Tool(
+                name="rolling_bursts",
+                func=safe(self.rolling_bursts),
+                description=(
+                    "Find bursts where a column exceeds a threshold at least min_count times "
+                    "within a rolling window of samples. Input: 'column=<col>, threshold=<value>, "
+                    "window=<samples>, min_count=<k>'."
+                ),
+            ),
+            Tool(
+                name="transitions",
+                func=safe(self.transitions),
+                description=(
+                    "Find transition points where a column suddenly jumps relative to the previous "
+                    "window mean. Input: 'column=<col>, window=<samples>, threshold=<abs jump> "
+                    "(or z=<std devs>)'."
+                ),
+            ),
+            Tool(
+                name="patterns",
+                func=safe(self.patterns),
+                description=(
+                    "Mark samples matching a named driving pattern: "
+                    f"{', '.join(PATTERNS)}. Input: 'pattern=<name>' (optional q=<quantile>, "
+                    "except for calm_vs_extreme; min_len=<N>)."
+                ),
+            ),
+        ]
+
+
+def build_kernel_tools(df):
+    return KernelToolkit(df).as_tools()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time each event kernel on a dataset.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    args = parser.parse_args()
+
+    toolkit = KernelToolkit(pd.read_csv(args.csv))
+    calls = [
+        (toolkit.consecutive_high, "column=accel_stats_z_p99, threshold=11, min_len=5"),
+        (toolkit.rolling_bursts, "column=accel_stats_x_p99, threshold=2.5, window=10, min_count=3"),
+        (toolkit.transitions, "column=accel_stats_z_p90, window=5"),
+        (toolkit.patterns, "pattern=heavy_braking"),
+        (toolkit.patterns, "pattern=sharp_turn"),
+    ]
+    for fn, tool_input in calls:
+        t0 = time.perf_counter()
+        out = fn(tool_input)
+        print(f"\n[{fn.__name__}] {tool_input}  ({(time.perf_counter() - t0) * 1000:.2f}ms)\n{out}")
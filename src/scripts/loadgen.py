@@ -0,0 +1,189 @@
+"""
+loadgen.py
+----------
+Open- and closed-loop load generator for the eval pipeline (ask_agent).
+
+Open loop: requests arrive as a Poisson process at the target QPS regardless of
+how fast they complete, and wait for one of --concurrency workers. Queueing
+delay (arrival -> start) shows where the pipeline saturates.
+Closed loop: N clients each send the next query as soon as the previous one
+returns; throughput levels off at the pipeline's capacity.
+
+Threads never race inside one agent. With --pipelines 1 (default) they share one
+pipeline the way service.py workers do: eval runs its agent / REPL stage one
+request at a time (repl_turn) and overlaps the rest, so the numbers include
+queueing on that stage. --pipelines N builds N independent pipelines and each
+request checks one out (waiting for a free one counts as queueing delay).
+
+Meant to run against mock_llm.py so capacity planning never touches Groq:
+
+    python mock_llm.py --latency lognormal:0.3,0.4 &
+    GROQ_API_BASE=http://127.0.0.1:8900 GROQ_API_KEY=mock \\
+        python loadgen.py --mode open --qps 1,2,4,8 --duration 30
+    GROQ_API_BASE=http://127.0.0.1:8900 GROQ_API_KEY=mock \\
+        python loadgen.py --mode closed --clients 1,2,4,8 --duration 30
+
+Each level prints offered load, throughput, error count and p50/p95/p99 of
+queueing delay and response time; --save writes the table as JSON under output/.
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import argparse
+import threading
+import contextlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from queries import QUERY_INTENT, TEST_QUERIES
+
+# --- Configuration ---
+BASE_DIR    = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+OUTPUT_DIR  = os.path.join(os.path.dirname(__file__), "output")
+
+QUERIES = QUERY_INTENT + TEST_QUERIES
+
+
+class Pipelines:
+    """ask_agent instances for the worker threads: one shared, or one checked out per request."""
+
+    def __init__(self, agents):
+        self.shared = agents[0] if len(agents) == 1 else None
+        self.free = queue.Queue()
+        for ask_agent in agents:
+            self.free.put(ask_agent)
+
+    @contextlib.contextmanager
+    def checkout(self):
+        if self.shared is not None:
+            yield self.shared
+            return
+        ask_agent = self.free.get()
+        try:
+            yield ask_agent
+        finally:
+            self.free.put(ask_agent)
+
+
+def _record(pipelines, query, arrival, records, lock):
+    with pipelines.checkout() as ask_agent:
+        start = time.perf_counter()
+        try:
+            answer, _, _ = ask_agent(query)
+            error = answer.startswith("[ERROR]")
+        except Exception:
+            error = True
+        end = time.perf_counter()
+    with lock:
+        records.append({"arrival": arrival, "start": start, "end": end, "error": error})
+
+
+def open_loop(pipelines, qps, duration, concurrency, seed=None):
+    """Poisson arrivals at `qps` for `duration` seconds."""
+    rng = random.Random(seed)
+    records, lock = [], threading.Lock()
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        arrival, i = t0, 0
+        while True:
+            arrival += rng.expovariate(qps)
+            if arrival - t0 > duration:
+                break
+            time.sleep(max(0.0, arrival - time.perf_counter()))
+            pool.submit(_record, pipelines, QUERIES[i % len(QUERIES)], arrival, records, lock)
+            i += 1
+    return records, time.perf_counter() - t0
+
+
+def closed_loop(pipelines, clients, duration, think_s=0.0):
+    """`clients` workers back to back (plus optional think time) for `duration` seconds."""
+    records, lock = [], threading.Lock()
+    t0 = time.perf_counter()
+    deadline = t0 + duration
+
+    def client(k):
+        i = k
+        while time.perf_counter() < deadline:
+            _record(pipelines, QUERIES[i % len(QUERIES)], time.perf_counter(), records, lock)
+            i += clients
+            if think_s:
+                time.sleep(think_s)
+
+    threads = [threading.Thread(target=client, args=(k,)) for k in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return records, time.perf_counter() - t0
+
+
+def summarize(records, wall_s, **level):
+    if not records:
+        return {**level, "completed": 0}
+    df = pd.DataFrame(records)
+    queue = (df["start"] - df["arrival"]).to_numpy()
+    response = (df["end"] - df["arrival"]).to_numpy()
+    pct = lambda x, q: round(float(np.percentile(x, q)), 3)
+    return {
+        **level,
+        "completed": len(df),
+        "errors": int(df["error"].sum()),
+        "throughput_qps": round(len(df) / wall_s, 3),
+        "queue_p50": pct(queue, 50), "queue_p95": pct(queue, 95), "queue_p99": pct(queue, 99),
+        "resp_p50": pct(response, 50), "resp_p95": pct(response, 95), "resp_p99": pct(response, 99),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive ask_agent at target loads.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    parser.add_argument("--mode", choices=["open", "closed"], default="open")
+    parser.add_argument("--qps", type=str, default="1,2,4",
+                        help="Comma-separated arrival rates (open loop).")
+    parser.add_argument("--clients", type=str, default="1,2,4,8",
+                        help="Comma-separated client counts (closed loop).")
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="Worker threads serving the open-loop queue.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per level.")
+    parser.add_argument("--think", type=float, default=0.0, help="Closed-loop think time (s).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pipelines", type=int, default=1,
+                        help="Independent pipelines; 1 = shared, as service.py serves.")
+    parser.add_argument("--save", action="store_true", help="Write the results table to output/.")
+    args = parser.parse_args()
+
+    # imported here so GROQ_API_BASE / GROQ_API_KEY from the environment are in place
+    from eval import init_llm_components, GROQ_API_BASE
+
+    print(f"LLM endpoint: {GROQ_API_BASE or 'Groq API (no GROQ_API_BASE set)'}")
+    df = pd.read_csv(args.csv)
+    # no plan cache: every request should exercise the agent path
+    pipelines = Pipelines([init_llm_components(df, use_plan_cache=False)
+                           for _ in range(max(1, args.pipelines))])
+
+    rows = []
+    if args.mode == "open":
+        for qps in (float(q) for q in args.qps.split(",")):
+            records, wall = open_loop(pipelines, qps, args.duration, args.concurrency, args.seed)
+            rows.append(summarize(records, wall, mode="open", offered_qps=qps))
+            print(rows[-1])
+    else:
+        for clients in (int(c) for c in args.clients.split(",")):
+            records, wall = closed_loop(pipelines, clients, args.duration, args.think)
+            rows.append(summarize(records, wall, mode="closed", clients=clients))
+            print(rows[-1])
+
+    print("\n" + pd.DataFrame(rows).to_string(index=False))
+    if args.save:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        path = os.path.join(OUTPUT_DIR, f"loadgen_{args.mode}_{datetime.now():%Y%m%d_%H%M%S}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+        print(f"Saved → {path}")
@@ -0,0 +1,215 @@
+"""
+mock_llm.py
+-----------
+Local stand-in for the Groq (OpenAI-compatible) chat-completions endpoint, for
+load tests that must not hit the real API.
+
+ChatGroq is pointed at it with GROQ_API_BASE (read by eval.build_llm):
+
+    python mock_llm.py --port 8900 --latency lognormal:0.35,0.4 --tokens-per-s 600
+    GROQ_API_BASE=http://127.0.0.1:8900 GROQ_API_KEY=mock python loadgen.py --qps 1,2,4
+
+Behaviour:
+    - time to first token drawn from --latency (fixed:S | uniform:LO,HI |
+      normal:MEAN,STD | lognormal:MEDIAN,SIGMA | exp:MEAN), then decode at
+      --tokens-per-s; both apply to streamed (SSE) and non-streamed responses
+    - --error-rate injects 500s, --rate-limit-rate random 429s, --rpm a token
+      bucket that answers 429 (with retry-after) once exceeded
+    - replies are shaped per pipeline stage (rewriter, guardrail, ReAct agent,
+      text-to-SQL, contextualizer) so the full eval pipeline runs end to end
+
+GET /stats returns request counts per outcome.
+"""
+
+import re
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import argparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# --- Configuration (overridden by the CLI) ---
+CONFIG = {
+    "latency": "lognormal:0.3,0.4",
+    "tokens_per_s": 800.0,
+    "completion_tokens": 60,   # length of free-text (contextualizer) replies
+    "error_rate": 0.0,
+    "rate_limit_rate": 0.0,
+    "rpm": 0,                  # 0 = no token bucket
+    "seed": None,
+}
+
+CHARS_PER_TOKEN = 4
+FILLER = ("The data shows a clear pattern across the recorded samples and the requested "
+          "columns, which answers the question directly. ").split()
+
+stats = {"requests": 0, "ok": 0, "errors": 0, "rate_limited": 0, "streamed": 0}
+bucket = {"tokens": 0.0, "updated": time.monotonic()}
+rng = random.Random()
+
+app = FastAPI(title="mock chat completions")
+
+
+def sample_latency(spec):
+    kind, _, params = spec.partition(":")
+    args = [float(p) for p in params.split(",") if p]
+    if kind == "fixed":
+        return args[0]
+    if kind == "uniform":
+        return rng.uniform(args[0], args[1])
+    if kind == "normal":
+        return max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return rng.lognormvariate(math.log(args[0]), args[1])
+    if kind == "exp":
+        return rng.expovariate(1.0 / args[0])
+    raise ValueError(f"Unknown latency distribution '{spec}'")
+
+
+def _take_rpm_token():
+    rpm = CONFIG["rpm"]
+    if not rpm:
+        return True
+    now = time.monotonic()
+    bucket["tokens"] = min(rpm, bucket["tokens"] + (now - bucket["updated"]) * rpm / 60.0)
+    bucket["updated"] = now
+    if bucket["tokens"] < 1.0:
+        return False
+    bucket["tokens"] -= 1.0
+    return True
+
+
+def _text(message):
+    content = message.get("content", "")
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content or ""
+
+
+def reply_for(messages):
+    """A plausible reply for whichever pipeline stage sent the prompt."""
+    system = " ".join(_text(m) for m in messages if m.get("role") == "system")
+    user = _text(messages[-1]) if messages else ""
+
+    if "semantic query rewriter" in system:
+        query = user.split("Original query:", 1)[-1].strip()
+        return f"REWRITTEN: {query}\nUNMAPPABLE: NONE"
+    if "gatekeeper" in system:
+        return "PROCEED"
+    if "DuckDB SQL" in system:
+        return "SELECT COUNT(*) AS n FROM bus_data"
+    if "Action Input" in user and "Question:" in user:
+        scratchpad = user.rsplit("Question:", 1)[1]
+        observations = re.findall(r"Observation:\s*(.*)", scratchpad)
+        if observations:
+            return f"Thought: I now know the final answer.\nFinal Answer: {observations[-1].strip()}"
+        return "Thought: Count the rows.\nAction: python_repl_ast\nAction Input: len(df)"
+
+    words = [FILLER[i % len(FILLER)] for i in range(CONFIG["completion_tokens"])]
+    return " ".join(words)
+
+
+def _completion(model, content, prompt_chars):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                     "finish_reason": "stop", "logprobs": None}],
+        "usage": {"prompt_tokens": prompt_chars // CHARS_PER_TOKEN,
+                  "completion_tokens": len(content) // CHARS_PER_TOKEN + 1,
+                  "total_tokens": (prompt_chars + len(content)) // CHARS_PER_TOKEN + 1},
+    }
+
+
+def _chunk(completion_id, model, delta, finish=None):
+    return "data: " + json.dumps({
+        "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+        "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+    }) + "\n\n"
+
+
+def _error(status, message, kind, headers=None):
+    return JSONResponse(status_code=status, headers=headers or {},
+                        content={"error": {"message": message, "type": kind}})
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+
+    if not _take_rpm_token() or rng.random() < CONFIG["rate_limit_rate"]:
+        stats["rate_limited"] += 1
+        return _error(429, "Rate limit reached (mock)", "rate_limit_exceeded", {"retry-after": "1"})
+    if rng.random() < CONFIG["error_rate"]:
+        stats["errors"] += 1
+        return _error(500, "Injected server error (mock)", "internal_server_error")
+
+    messages = body.get("messages", [])
+    model = body.get("model", "mock")
+    content = reply_for(messages)
+    for stop in body.get("stop") or []:
+        content = content.split(stop, 1)[0]
+    prompt_chars = sum(len(_text(m)) for m in messages)
+    n_tokens = max(1, len(content) // CHARS_PER_TOKEN)
+    per_token = 1.0 / CONFIG["tokens_per_s"]
+
+    await asyncio.sleep(sample_latency(CONFIG["latency"]))
+
+    if not body.get("stream"):
+        await asyncio.sleep(n_tokens * per_token)
+        stats["ok"] += 1
+        return _completion(model, content, prompt_chars)
+
+    stats["streamed"] += 1
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+    async def events():
+        yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+        for i in range(0, len(content), CHARS_PER_TOKEN):
+            await asyncio.sleep(per_token)
+            yield _chunk(completion_id, model, {"content": content[i:i + CHARS_PER_TOKEN]})
+        yield _chunk(completion_id, model, {}, finish="stop")
+        yield "data: [DONE]\n\n"
+        stats["ok"] += 1
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "config": CONFIG}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Mock OpenAI/Groq chat-completions server.")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=str, default=CONFIG["latency"],
+                        help="Time-to-first-token distribution, e.g. fixed:0.2, lognormal:0.3,0.4")
+    parser.add_argument("--tokens-per-s", type=float, default=CONFIG["tokens_per_s"])
+    parser.add_argument("--completion-tokens", type=int, default=CONFIG["completion_tokens"])
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0, help="Requests per minute before 429s.")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    sample_latency(args.latency)   # fail fast on a bad spec
+    CONFIG.update({
+        "latency": args.latency, "tokens_per_s": args.tokens_per_s,
+        "completion_tokens": args.completion_tokens, "error_rate": args.error_rate,
+        "rate_limit_rate": args.rate_limit_rate, "rpm": args.rpm, "seed": args.seed,
+    })
+    bucket["tokens"] = float(args.rpm)
+    rng.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,275 @@
+"""
+partitions.py
+-------------
+Hive-style partitioned Parquet layout (date=/vehicle=) with partition pruning
+and parallel reads.
+
+Layout under data/processed/partitions/:
+
+    date=2025-06-06/vehicle=bus-01/part-<id>.parquet
+    date=2025-06-07/vehicle=bus-01/part-<id>.parquet
+    ...
+
+Rows keep every original column (the path only drives pruning), so a pruned
+read is a drop-in for pd.read_csv of the flat file. Writers only ever add part
+files: df_enlarge.py --partitioned writes the simulated days, ingest.py
+--partitioned appends each batch (part ids are a hash of the batch, so
+re-folding the same rows after a crash overwrites instead of duplicating).
+Feeds without a vehicle column go under DEFAULT_VEHICLE.
+
+Pruning happens at load: eval.py / gt_executor.py --dates / --vehicles pass a
+partition filter (parse_filter) to read_partitions, so the frame every prebuilt
+index and tool sees is the same pruned frame. Only matching date= directories
+are listed and their files are read by a thread pool (Parquet decoding
+releases the GIL), so a one-day run reads one day of files however long the
+history is.
+
+predicates() reads the time and vehicle constraints of a single question. It
+is a diagnostic for `read --query` (what a question would touch, and how long
+that read takes) only: eval.py and gt_executor.py prune once at load from
+--dates / --vehicles, and every prebuilt index answers from that one frame, so
+no per-query reader sits on the eval path. It understands ISO dates (a single
+date = that day; "between/from/after/since" bound the start, "and/to/until/
+before" the end, inclusive) and known vehicle ids. It only prunes a single
+unambiguous window: negation ("not on", "except"), disjunction ("or") and
+whole-dataset comparisons ("overall", "compared to") return no predicate.
+
+Usage:
+    # Partition an existing CSV:
+    python partitions.py write --csv ../../data/raw/bus_data_enlarged.csv
+
+    # Load only some days / vehicles (also: eval.py --dates, gt_executor.py --dates):
+    python partitions.py read --dates 2025-06-08:2025-06-10 --vehicles bus-01
+
+    # What a query would read, and how long it takes:
+    python partitions.py read --query "average accel_variance on 2025-06-08"
+
+    # Days / vehicles / files on disk:
+    python partitions.py list
+"""
+
+import os
+import re
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+# --- Configuration ---
+BASE_DIR       = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT    = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+PROCESSED_DIR  = os.path.join(BASE_DIR, "data", "processed")
+PARTITION_ROOT = os.path.join(PROCESSED_DIR, "partitions")
+
+TIMESTAMP_COLUMN = "timestamp"
+VEHICLE_COLUMN   = "vehicle_id"
+DEFAULT_VEHICLE  = "bus-01"
+WORKERS          = min(8, os.cpu_count() or 1)
+
+DATE_PATTERN = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+START_WORDS = {"between", "from", "after", "since", "starting"}
+END_WORDS   = {"and", "to", "until", "till", "through", "before", "ending"}
+# the rows asked about are not a single date / vehicle window: never prune
+UNPRUNABLE = re.compile(
+    r"\b(not|no|except|excluding|exclude|besides|other than|outside|or|overall|entire|"
+    r"whole|all days|every day|compared?|comparison|versus|vs|relative|rest of)\b",
+    re.IGNORECASE)
+
+
+def _safe(value):
+    return re.sub(r"[^\w.-]", "_", str(value))
+
+
+def partition_keys(df, vehicle=None):
+    """(date strings, vehicle strings) per row."""
+    dates = pd.to_datetime(df[TIMESTAMP_COLUMN]).dt.strftime("%Y-%m-%d")
+    if VEHICLE_COLUMN in df.columns:
+        vehicles = df[VEHICLE_COLUMN].astype(str).map(_safe)
+    else:
+        vehicles = pd.Series(_safe(vehicle or DEFAULT_VEHICLE), index=df.index)
+    return dates, vehicles
+
+
+def write_partitions(df, root=PARTITION_ROOT, vehicle=None, part_id=None):
+    """
+    Add one part file per (date, vehicle) touched by df. part_id defaults to a
+    hash of the rows, so writing the same rows again replaces the same files.
+    Returns the paths written.
+    """
+    if df.empty:
+        return []
+    if part_id is None:
+        part_id = hashlib.sha1(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes()).hexdigest()[:16]
+    dates, vehicles = partition_keys(df, vehicle)
+    written = []
+    for (date, veh), rows in df.groupby([dates, vehicles], sort=True):
+        directory = os.path.join(root, f"date={date}", f"vehicle={veh}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-{part_id}.parquet")
+        tmp = path + ".tmp"
+        rows.to_parquet(tmp, index=False)
+        os.replace(tmp, path)   # readers never see a half-written file
+        written.append(path)
+    return written
+
+
+def _key_value(name, key):
+    prefix = f"{key}="
+    return name[len(prefix):] if name.startswith(prefix) else None
+
+
+def list_partitions(root=PARTITION_ROOT, start=None, end=None, vehicles=None):
+    """[(date, vehicle, [files])] in date / vehicle order; only matching dirs are listed."""
+    if not os.path.isdir(root):
+        return []
+    found = []
+    for date_dir in sorted(os.listdir(root)):
+        date = _key_value(date_dir, "date")
+        if date is None or (start and date < start) or (end and date > end):
+            continue
+        for vehicle_dir in sorted(os.listdir(os.path.join(root, date_dir))):
+            vehicle = _key_value(vehicle_dir, "vehicle")
+            if vehicle is None or (vehicles and vehicle not in vehicles):
+                continue
+            directory = os.path.join(root, date_dir, vehicle_dir)
+            files = sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                           if f.endswith(".parquet"))
+            if files:
+                found.append((date, vehicle, files))
+    return found
+
+
+def known_vehicles(root=PARTITION_ROOT):
+    """Vehicle ids present under any date (one listing per day)."""
+    vehicles = set()
+    if not os.path.isdir(root):
+        return vehicles
+    for date_dir in os.listdir(root):
+        if _key_value(date_dir, "date") is not None:
+            names = os.listdir(os.path.join(root, date_dir))
+            vehicles.update(v for v in (_key_value(n, "vehicle") for n in names) if v)
+    return vehicles
+
+
+def predicates(text, vehicles=()):
+    """
+    (start date, end date, vehicle ids) implied by a query; None = unconstrained.
+    Anything but a single unambiguous window returns (None, None, None).
+    """
+    text = text or ""
+    if UNPRUNABLE.search(text):
+        return None, None, None
+    start = end = None
+    bounded = False
+    for m in DATE_PATTERN.finditer(text):
+        date = m.group(1)
+        words = re.findall(r"[a-z]+", text[:m.start()].lower())[-2:]
+        if START_WORDS & set(words[-1:]):
+            start, bounded = min(start or date, date), True
+        elif END_WORDS & set(words[-1:]):
+            end, bounded = max(end or date, date), True
+        elif not bounded:
+            # a bare date ("on 2025-06-08") is that day; several widen the range
+            start, end = min(start or date, date), max(end or date, date)
+    if start and end and start > end:
+        return None, None, None
+    mentioned = {v for v in vehicles if re.search(rf"\b{re.escape(v)}\b", text, re.IGNORECASE)}
+    return start, end, mentioned or None
+
+
+def parse_filter(dates=None, vehicles=None):
+    """
+    Partition filter from CLI values: dates "START[:END]" (either side may be
+    empty), vehicles "a,b". Returns a dict of read_partitions keywords, or None.
+    """
+    start = end = None
+    if dates:
+        start, _, end = dates.partition(":") if ":" in dates else (dates, "", dates)
+        for value in (start, end):
+            if value and not DATE_PATTERN.fullmatch(value):
+                raise ValueError(f"--dates expects YYYY-MM-DD[:YYYY-MM-DD], got {dates!r}")
+        start, end = start or None, end or None
+        if start and end and start > end:
+            raise ValueError(f"--dates start {start} is after end {end}")
+    chosen = {_safe(v.strip()) for v in (vehicles or "").split(",") if v.strip()} or None
+    if start is None and end is None and chosen is None:
+        return None
+    return {"start": start, "end": end, "vehicles": chosen}
+
+
+def describe_filter(partition_filter):
+    """Short label for logs / reports, e.g. '2025-06-08..2025-06-10 bus-01'."""
+    if not partition_filter:
+        return "all partitions"
+    start, end = partition_filter.get("start"), partition_filter.get("end")
+    label = start if start and start == end else f"{start or '…'}..{end or '…'}"
+    if partition_filter.get("vehicles"):
+        label += " " + ",".join(sorted(partition_filter["vehicles"]))
+    return label
+
+
+def _read_file(args):
+    path, columns = args
+    return pd.read_parquet(path, columns=columns)
+
+
+def read_partitions(root=PARTITION_ROOT, start=None, end=None, vehicles=None, columns=None,
+                    workers=WORKERS):
+    """Concatenated rows of the matching partitions, read in parallel (file order kept)."""
+    files = [f for _, _, fs in list_partitions(root, start, end, vehicles) for f in fs]
+    if not files:
+        return pd.DataFrame(columns=columns or [])
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        frames = list(pool.map(_read_file, [(f, columns) for f in files]))
+    return pd.concat(frames, ignore_index=True)
+
+
+def iter_partitions(root=PARTITION_ROOT, columns=None, start=None, end=None, vehicles=None):
+    """One frame per part file, in read_partitions order (for streaming passes)."""
+    for _, _, files in list_partitions(root, start, end, vehicles):
+        for path in files:
+            yield pd.read_parquet(path, columns=columns)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Partitioned Parquet layout with pruning.")
+    parser.add_argument("--root", type=str, default=PARTITION_ROOT)
+    sub = parser.add_subparsers(dest="command", required=True)
+    write = sub.add_parser("write", help="Partition a CSV by date and vehicle.")
+    write.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    write.add_argument("--vehicle", type=str, default=DEFAULT_VEHICLE,
+                       help=f"Vehicle id when the CSV has no {VEHICLE_COLUMN} column.")
+    read = sub.add_parser("read", help="Prune for a query or a filter and time the read.")
+    target = read.add_mutually_exclusive_group(required=True)
+    target.add_argument("--query", type=str)
+    target.add_argument("--dates", type=str, help="START[:END], inclusive.")
+    read.add_argument("--vehicles", type=str, help="Comma-separated vehicle ids.")
+    sub.add_parser("list", help="Partitions on disk.")
+    args = parser.parse_args()
+
+    if args.command == "write":
+        t0 = time.perf_counter()
+        paths = write_partitions(pd.read_csv(args.csv), args.root, args.vehicle)
+        print(f"Wrote {len(paths)} partition file(s) under {args.root} in {time.perf_counter() - t0:.2f}s")
+    elif args.command == "read":
+        total = len(list_partitions(args.root))
+        if args.query:
+            start, end, vehicles = predicates(args.query, known_vehicles(args.root))
+            partition_filter = {"start": start, "end": end, "vehicles": vehicles}
+        else:
+            try:
+                partition_filter = parse_filter(args.dates, args.vehicles) or {}
+            except ValueError as e:
+                parser.error(str(e))
+        t0 = time.perf_counter()
+        df = read_partitions(args.root, **partition_filter)
+        selected = list_partitions(args.root, **partition_filter)
+        info = {**partition_filter, "partitions": len(selected), "files": sum(len(fs) for _, _, fs in selected),
+                "read_s": round(time.perf_counter() - t0, 4)}
+        print(f"{info['partitions']} of {total} partition(s), {info['files']} file(s), "
+              f"{len(df):,} rows in {info.get('read_s', 0):.3f}s  {info}")
+    else:
+        for date, vehicle, files in list_partitions(args.root):
+            print(f"date={date}/vehicle={vehicle}: {len(files)} file(s)")
@@ -0,0 +1,347 @@
+"""
+plan_cache.py
+-------------
+Parameterized cache of agent-written pandas code.
+
+The rewritten (column-grounded) query is normalized into a template with its
+literal constants lifted out:
+
+    "How many rows have accel_variance greater than 0.15?"
+      -> "how many rows have accel_variance greater than <num>?"   constants ["0.15"]
+
+When the agent answers a query with a single python_repl_ast call, the same
+constants are located in that code and replaced by placeholders. Only literals
+that are comparison operands or call arguments are lifted, never subscripts
+(in `df[df.x > 0].shape[0]` the threshold is a parameter, the index is not).
+The plan is validated before it is stored under the template:
+
+    - re-running it with the original constants must reproduce the agent's
+      observation;
+    - re-running it with perturbed constants (numbers moved, dates shifted a
+      day) must give a result of the same shape (number / table / text) and
+      no error; constants that only work as integers are marked so, and a
+      later fractional value for them is a miss.
+
+Validation costs 2 + (integer constants) extra REPL runs, so with
+background=True (eval.py) it runs on a worker thread after the answer has
+been returned; the plan is served from the first lookup after it passes.
+
+A later query with the same shape but other thresholds / dates re-executes
+the stored code with its own constants and skips the agent entirely. If that
+run still errors, the caller evicts the plan and falls back to the agent.
+
+Plans are keyed by template + column set, not by data content, so they survive
+dataset updates: the code always runs against the current dataframe. The cache
+is persisted to data/processed/plan_cache.json: each save merges the plans
+other processes wrote since and replaces the file atomically, and an
+unreadable file is treated as empty.
+
+Usage:
+    # List cached plans and hit counts:
+    python plan_cache.py
+"""
+
+import os
+import re
+import ast
+import json
+import queue
+import atexit
+import hashlib
+import argparse
+import threading
+from datetime import datetime, timedelta
+
+# --- Configuration ---
+BASE_DIR      = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
+PLAN_CACHE    = os.path.join(PROCESSED_DIR, "plan_cache.json")
+
+REPL_TOOL = "python_repl_ast"
+
+# timestamps / dates are tried first so their digits are not lifted as numbers
+LITERAL = re.compile(
+    r"(?P<ts>\d{4}-\d{2}-\d{2}(?:[ T]\d{2}:\d{2}(?::\d{2})?)?)"
+    r"|(?P<num>(?<![\w.])-?\d+(?:\.\d+)?(?![\w.]))"
+)
+PLACEHOLDER = "__p{}__"
+# the REPL tool reports exceptions as "<Type>: <message>" observations
+REPL_ERROR = re.compile(r"^\w*(Error|Exception)\b")
+
+
+def templatize(query):
+    """(template, constants): lower-cased query with <ts> / <num> in place of literals."""
+    constants = []
+
+    def lift(match):
+        kind = match.lastgroup
+        constants.append((kind, match.group(0)))
+        return f"<{kind}>"
+
+    template = LITERAL.sub(lift, " ".join(query.lower().split()))
+    return template, constants
+
+
+def _clean_code(code):
+    """Same sanitizing the REPL tool applies to Action Input."""
+    code = re.sub(r"^(\s|`)*(?i:python)?\s*", "", str(code))
+    return re.sub(r"(\s|`)*$", "", code)
+
+
+def repl_failed(observation):
+    """True when a REPL observation is an exception report (or missing)."""
+    return observation is None or bool(REPL_ERROR.match(str(observation).strip()))
+
+
+def _operand_literals(tree):
+    """
+    Constant nodes that are comparison operands or call arguments, with the
+    sign folded in (-0.5 is UnaryOp(USub, 0.5)): (node, value).
+    Subscript indices (shape[0], iloc[-1]) never qualify.
+    """
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Compare):
+            operands = [node.left, *node.comparators]
+        elif isinstance(node, ast.Call):
+            operands = [*node.args, *(k.value for k in node.keywords)]
+        else:
+            continue
+        for op in operands:
+            if (isinstance(op, ast.UnaryOp) and isinstance(op.op, ast.USub)
+                    and isinstance(op.operand, ast.Constant) and isinstance(op.operand.value, (int, float))):
+                yield op, -op.operand.value
+            elif isinstance(op, ast.Constant) and not isinstance(op.value, bool):
+                yield op, op.value
+
+
+def _matches(kind, literal, value):
+    if kind == "ts":
+        # '2025-06-08' also matches '2025-06-08 00:00:00', '2025-06-08 16:00' matches '2025-06-08 16:00:00'
+        return isinstance(value, str) and re.fullmatch(re.escape(literal) + r"(?:[ T:].*)?", value) is not None
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and float(value) == float(literal)
+
+
+def parameterize(code, constants):
+    """
+    Replace each query constant in the code by a placeholder, in comparison
+    and argument positions only. Returns None when the code does not parse or
+    a constant cannot be located unambiguously.
+    """
+    values = [c for _, c in constants]
+    if len(set(values)) != len(values):
+        return None   # "between 5 and 5": cannot tell which literal is which
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+    raw = code.encode("utf-8")
+    line_starts = [0]
+    for line in raw.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+
+    edits = []   # (start byte, end byte, replacement)
+    found = set()
+    for node, value in _operand_literals(tree):
+        start = line_starts[node.lineno - 1] + node.col_offset
+        end = line_starts[node.end_lineno - 1] + node.end_col_offset
+        for i, (kind, literal) in enumerate(constants):
+            if _matches(kind, literal, value):
+                segment = raw[start:end].decode("utf-8")
+                placeholder = PLACEHOLDER.format(i)
+                # dates stay inside their quotes (and any time suffix)
+                edits.append((start, end, segment.replace(literal, placeholder, 1) if kind == "ts" else placeholder))
+                found.add(i)
+                break
+    if len(found) != len(constants):
+        return None
+    for start, end, replacement in sorted(edits, reverse=True):
+        raw = raw[:start] + replacement.encode("utf-8") + raw[end:]
+    return raw.decode("utf-8")
+
+
+def result_shape(observation):
+    """Coarse kind of a REPL observation: error / number / table / text."""
+    text = str(observation).strip()
+    if repl_failed(observation):
+        return "error"
+    try:
+        float(text.replace(",", ""))
+        return "number"
+    except ValueError:
+        pass
+    return "table" if "\n" in text else "text"
+
+
+def _is_integer(literal):
+    return re.fullmatch(r"-?\d+", literal) is not None
+
+
+def perturb(kind, literal, fractional=False):
+    """A different constant of the same kind (dates +1 day, numbers moved)."""
+    if kind == "ts":
+        shifted = datetime.fromisoformat(literal[:10]) + timedelta(days=1)
+        return shifted.strftime("%Y-%m-%d") + literal[10:]
+    if fractional:
+        return str(float(literal) + 0.5)
+    return str(int(literal) + 1) if _is_integer(literal) else str(round(float(literal) * 1.1 + 0.01, 6))
+
+
+def bind(code_template, constants):
+    for i, (_, literal) in enumerate(constants):
+        code_template = code_template.replace(PLACEHOLDER.format(i), literal)
+    return code_template
+
+
+def schema_key(columns):
+    return hashlib.sha1(",".join(sorted(map(str, columns))).encode()).hexdigest()[:12]
+
+
+def _read_payload(path):
+    """The whole cache file ({schema: plans}); {} when missing or unreadable."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+class PlanCache:
+    """template -> validated pandas code with placeholders, for one column set."""
+
+    def __init__(self, columns, path=PLAN_CACHE, background=False):
+        self.schema = schema_key(columns)
+        self.path = path
+        self.plans = _read_payload(path).get(self.schema, {}) if path else {}
+        self.evicted = set()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.background = background
+        self.pending = set()        # templates queued for validation
+        self.jobs = None            # validation queue, with its worker started on first use
+
+    def lookup(self, query):
+        """(code ready to run, template) on a hit, else None."""
+        template, constants = templatize(query)
+        with self.lock:
+            plan = self.plans.get(template)
+            if (plan is None or [k for k, _ in constants] != plan["kinds"]
+                    or any(not _is_integer(constants[i][1]) for i in plan.get("integer", []))):
+                self.misses += 1
+                return None
+            self.hits += 1
+            plan["hits"] = plan.get("hits", 0) + 1
+        return bind(plan["code"], constants), template
+
+    def record(self, query, tool_calls, run_code):
+        """
+        Store the plan behind an answered query. tool_calls are the agent's
+        (tool, input, observation) steps; run_code executes code in the REPL.
+        Only single-REPL-call answers are cached. Returns the template or None;
+        with background=True the plan is queued for validation and None is
+        returned (drain() waits for the queue).
+        """
+        if len(tool_calls) != 1 or tool_calls[0][0] != REPL_TOOL:
+            return None
+        _, code, observation = tool_calls[0]
+        if repl_failed(observation):
+            return None
+        code = _clean_code(code)
+        template, constants = templatize(query)
+        with self.lock:
+            if template in self.plans or template in self.pending:
+                return None
+            code_template = parameterize(code, constants) if constants else code
+            if code_template is None:
+                return None
+            if self.background:
+                self.pending.add(template)
+        job = (query, template, constants, code_template, observation, run_code)
+        if not self.background:
+            return self._validate(*job)
+        if self.jobs is None:
+            self.jobs = queue.Queue()
+            threading.Thread(target=self._worker, name="plan-validation", daemon=True).start()
+            # plans still queued when the process exits are validated first
+            atexit.register(self.drain)
+        self.jobs.put(job)
+        return None
+
+    def drain(self):
+        """Wait until every queued plan has been validated (stored or dropped)."""
+        if self.jobs is not None:
+            self.jobs.join()
+
+    def _worker(self):
+        while True:
+            job = self.jobs.get()
+            try:
+                self._validate(*job)
+            except Exception:
+                pass   # a plan that cannot be validated is simply not cached
+            finally:
+                with self.lock:
+                    self.pending.discard(job[1])
+                self.jobs.task_done()
+
+    def _validate(self, query, template, constants, code_template, observation, run_code):
+        """Re-run the plan; store it and return the template when it holds up."""
+        # validation: the parameterized plan must reproduce the agent's result ...
+        if str(run_code(bind(code_template, constants))).strip() != str(observation).strip():
+            return None
+        # ... and other constants must yield the same kind of result
+        shape = result_shape(observation)
+        moved = [(kind, perturb(kind, literal)) for kind, literal in constants]
+        if constants and result_shape(run_code(bind(code_template, moved))) != shape:
+            return None
+        integer = []
+        for i, (kind, literal) in enumerate(constants):
+            if kind == "num" and _is_integer(literal):
+                fractional = list(constants)
+                fractional[i] = (kind, perturb(kind, literal, fractional=True))
+                if result_shape(run_code(bind(code_template, fractional))) != shape:
+                    integer.append(i)   # e.g. head(5): only whole numbers bind
+        with self.lock:
+            self.plans[template] = {"code": code_template, "kinds": [k for k, _ in constants],
+                                    "integer": integer, "example": query, "hits": 0}
+            self.evicted.discard(template)
+            self.save()
+        return template
+
+    def evict(self, template):
+        """Drop a plan whose bound code failed at run time."""
+        with self.lock:
+            if self.plans.pop(template, None) is not None:
+                self.evicted.add(template)
+                self.save()
+
+    def save(self):
+        """Merge with what other processes saved, then replace the file (call under self.lock)."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        payload = _read_payload(self.path)
+        plans = {**payload.get(self.schema, {}), **self.plans}
+        for template in self.evicted:
+            plans.pop(template, None)
+        self.plans = payload[self.schema] = plans
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        os.replace(tmp, self.path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the parameterized plan cache.")
+    parser.add_argument("--path", type=str, default=PLAN_CACHE)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"No plan cache at {args.path}")
+    else:
+        payload = _read_payload(args.path)
+        for schema, plans in payload.items():
+            print(f"schema {schema}: {len(plans)} plan(s)")
+            for template, plan in plans.items():
+                print(f"  [{plan.get('hits', 0)} hit(s)] {template}\n      {plan['code']}")
@@ -0,0 +1,300 @@
+"""
+quality.py
+----------
+Vectorized data-quality scan of the accelerometer percentile columns, run once
+at load time.
+
+The twelve accel_stats_{x,y,z}_p{1,10,90,99} columns are viewed as one
+(rows x 3 axes x 4 percentiles) array and every check is a whole-array
+comparison, so the scan is a single pass. Each row gets a uint16 bitmask with
+one bit per (check, axis):
+
+    non_monotonic   p1 <= p10 <= p90 <= p99 is violated
+    identical       two adjacent percentiles are equal (degenerate window)
+    inverted        p1 > p90
+    plateau         the four percentiles stay frozen (in time order) for at
+                    least PLATEAU_MIN_S; windows normally refresh every ~3 min,
+                    so longer runs suggest a stuck or saturated sensor
+    non_finite      a percentile is missing or infinite
+
+The report keeps the per-check counts, the plateau segments (run-length
+encoded, with their values) and the flagged rows as [start, stop) ranges per
+bit, and is written to data/processed/quality_report.json together with the
+size / mtime of the source file. Loading the same file again reuses the report
+instead of rescanning. Integrity questions become a lookup (the agent's
+data_quality tool), and load_checked(..., exclude=True) drops flagged rows
+before anything aggregates over them.
+
+Usage:
+    # Scan a dataset and print the report:
+    python quality.py --csv ../../data/raw/bus_data.csv
+
+    # Stricter plateau threshold:
+    python quality.py --plateau_min_s 120
+"""
+
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from shm_frame import load_dataframe
+
+# --- Configuration ---
+BASE_DIR       = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT    = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+PROCESSED_DIR  = os.path.join(BASE_DIR, "data", "processed")
+QUALITY_REPORT = os.path.join(PROCESSED_DIR, "quality_report.json")
+
+AXES        = ("x", "y", "z")
+PERCENTILES = (1, 10, 90, 99)
+CHECKS      = ("non_monotonic", "identical", "inverted", "plateau", "non_finite")
+PLATEAU_MIN_S  = 300   # frozen percentiles for 5+ minutes
+MAX_ROWS_SHOWN = 10
+
+
+def percentile_columns(axis):
+    return [f"accel_stats_{axis}_p{p}" for p in PERCENTILES]
+
+
+def bit(check, axis):
+    """Bit of (check, axis) in the row mask."""
+    return 1 << (CHECKS.index(check) * len(AXES) + AXES.index(axis))
+
+
+def _ranges(flags):
+    """Boolean array -> [[start, stop), ...] of its True runs."""
+    edges = np.flatnonzero(np.diff(np.r_[0, flags.astype(np.int8), 0]))
+    return edges.reshape(-1, 2).tolist()
+
+
+def _from_ranges(ranges, n):
+    flags = np.zeros(n, dtype=bool)
+    for start, stop in ranges:
+        flags[start:stop] = True
+    return flags
+
+
+def _plateaus(values, ts, min_s):
+    """
+    Runs of identical percentile vectors in time order lasting >= min_s.
+    values: (rows x 4) for one axis; ts: int64 seconds. Returns (row flags in
+    the original order, [(first position, last position, rows, seconds)]).
+    """
+    order = np.argsort(ts, kind="stable")
+    v, t = values[order], ts[order]
+    starts = np.flatnonzero(np.r_[True, (v[1:] != v[:-1]).any(axis=1)])
+    ends = np.r_[starts[1:], len(v)] - 1
+    long_runs = (t[ends] - t[starts]) >= min_s
+    flags_sorted = np.repeat(long_runs, ends - starts + 1)
+    flags = np.empty(len(v), dtype=bool)
+    flags[order] = flags_sorted
+    runs = [(int(order[s]), int(order[e]), int(e - s + 1), int(t[e] - t[s]))
+            for s, e in zip(starts[long_runs], ends[long_runs])]
+    return flags, runs
+
+
+def scan(df, plateau_min_s=PLATEAU_MIN_S):
+    """Row bitmask (uint16) and plateau segments of a dataframe."""
+    n = len(df)
+    mask = np.zeros(n, dtype=np.uint16)
+    block = np.stack([df[percentile_columns(a)].to_numpy(np.float64) for a in AXES], axis=1)
+    steps = np.diff(block, axis=2)                          # rows x axes x 3
+    per_check = {
+        "non_monotonic": (steps < 0).any(axis=2),
+        "identical": (steps == 0).any(axis=2),
+        "inverted": block[:, :, 0] > block[:, :, 2],
+        "non_finite": ~np.isfinite(block).all(axis=2),
+    }
+    segments = []
+    if "timestamp" in df.columns:
+        ts = pd.to_datetime(df["timestamp"]).to_numpy("datetime64[s]").astype(np.int64)
+        plateau = np.zeros((n, len(AXES)), dtype=bool)
+        for j, axis in enumerate(AXES):
+            plateau[:, j], runs = _plateaus(block[:, j, :], ts, plateau_min_s)
+            for first, last, rows, seconds in runs:
+                segments.append({
+                    "axis": axis, "start": str(df["timestamp"].iloc[first]),
+                    "end": str(df["timestamp"].iloc[last]), "rows": rows, "seconds": seconds,
+                    "values": dict(zip(percentile_columns(axis), block[first, j].tolist())),
+                })
+        per_check["plateau"] = plateau
+    for check, flags in per_check.items():
+        for j, axis in enumerate(AXES):
+            mask[flags[:, j]] |= bit(check, axis)
+    return mask, segments
+
+
+class QualityReport:
+    """Row bitmask, per-check counts and plateau segments of one dataset."""
+
+    def __init__(self, mask, segments, timestamps=None, source=None, plateau_min_s=PLATEAU_MIN_S):
+        self.mask = mask
+        self.segments = segments
+        self.timestamps = timestamps
+        self.source = source
+        self.plateau_min_s = plateau_min_s
+
+    @classmethod
+    def from_frame(cls, df, plateau_min_s=PLATEAU_MIN_S, source=None):
+        mask, segments = scan(df, plateau_min_s)
+        timestamps = df["timestamp"].astype(str).to_numpy() if "timestamp" in df.columns else None
+        return cls(mask, segments, timestamps, source, plateau_min_s)
+
+    @property
+    def ok(self):
+        """True for rows that pass every check."""
+        return self.mask == 0
+
+    def flagged(self, check=None, axis=None):
+        """Boolean row flags for one check / axis (None = any)."""
+        bits = 0
+        for c in ([check] if check else CHECKS):
+            for a in ([axis] if axis else AXES):
+                bits |= bit(c, a)
+        return (self.mask & bits) != 0
+
+    def counts(self):
+        return {check: {axis: int(self.flagged(check, axis).sum()) for axis in AXES}
+                for check in CHECKS}
+
+    def summary(self):
+        return {"rows": len(self.mask), "bad_rows": int((~self.ok).sum()),
+                "plateau_min_s": self.plateau_min_s, "counts": self.counts(),
+                "plateau_segments": len(self.segments)}
+
+    def describe(self, check=None, axis=None):
+        if check and check not in CHECKS:
+            return f"Unknown check '{check}'. Available: {', '.join(CHECKS)}."
+        if axis and axis not in AXES:
+            return f"Unknown axis '{axis}'. Available: {', '.join(AXES)}."
+        if not check:
+            lines = [f"{len(self.mask):,} rows, {int((~self.ok).sum()):,} failing at least one check."]
+            for name, per_axis in self.counts().items():
+                lines.append(f"  {name}: " + ", ".join(f"{a}={n}" for a, n in per_axis.items()))
+            return "\n".join(lines)
+        rows = np.flatnonzero(self.flagged(check, axis))
+        where = f" on axis {axis}" if axis else ""
+        text = f"{len(rows):,} row(s) {check}{where}."
+        if check == "plateau":
+            segments = [s for s in self.segments if not axis or s["axis"] == axis]
+            shown = pd.DataFrame(segments[:MAX_ROWS_SHOWN], columns=["axis", "start", "end", "rows", "seconds"])
+            return f"{text} {len(segments)} segment(s) of {self.plateau_min_s}s+:\n{shown.to_string(index=False)}" \
+                if segments else text
+        if len(rows) and self.timestamps is not None:
+            text += " First: " + ", ".join(self.timestamps[rows[:MAX_ROWS_SHOWN]])
+        return text
+
+    # ---- persistence ----
+
+    def to_dict(self):
+        return {
+            "source": self.source, "plateau_min_s": self.plateau_min_s, "rows": len(self.mask),
+            "summary": self.summary(), "segments": self.segments,
+            "flagged": {f"{check}:{axis}": _ranges(self.flagged(check, axis))
+                        for check in CHECKS for axis in AXES if self.flagged(check, axis).any()},
+        }
+
+    @classmethod
+    def from_dict(cls, state, timestamps=None):
+        mask = np.zeros(state["rows"], dtype=np.uint16)
+        for key, ranges in state["flagged"].items():
+            check, axis = key.split(":")
+            mask[_from_ranges(ranges, state["rows"])] |= bit(check, axis)
+        return cls(mask, state["segments"], timestamps, state["source"], state["plateau_min_s"])
+
+    def save(self, path=QUALITY_REPORT):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path=QUALITY_REPORT, timestamps=None):
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f), timestamps)
+
+    # ---- agent tool ----
+
+    def quality_tool(self, text=""):
+        from kernels import _parse_tool_input
+        args = _parse_tool_input(text)
+        return self.describe(args.get("check"), args.get("axis"))
+
+    def as_tools(self):
+        from langchain_core.tools import Tool
+
+        return [
+            Tool(name="data_quality", func=self.quality_tool,
+                 description="Precomputed integrity checks of the accel percentile columns: "
+                             f"{', '.join(CHECKS)} (plateau = percentiles frozen for "
+                             f"{self.plateau_min_s}s+). Input: check=<name>, axis=<x|y|z> "
+                             "(both optional; empty = counts of every check)."),
+        ]
+
+
+def _fingerprint(path, partition_filter=None):
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return {"path": os.path.abspath(path), "size": stat.st_size, "mtime": stat.st_mtime}
+    # partitioned directory: the part files that filter selects
+    from partitions import list_partitions
+
+    files = [f for _, _, fs in list_partitions(path, **(partition_filter or {})) for f in fs]
+    stats = [os.stat(f) for f in files]
+    return {"path": os.path.abspath(path), "files": len(files),
+            "size": sum(s.st_size for s in stats), "mtime": max((s.st_mtime for s in stats), default=0),
+            "filter": _filter_key(partition_filter)}
+
+
+def _filter_key(partition_filter):
+    if not partition_filter:
+        return None
+    return {k: sorted(v) if isinstance(v, set) else v for k, v in partition_filter.items()}
+
+
+def load_checked(csv_path=CSV_DEFAULT, manifest_path=None, exclude=False,
+                 report_path=QUALITY_REPORT, plateau_min_s=PLATEAU_MIN_S, partition_filter=None):
+    """
+    The shared loader plus the quality report: (df, report). The report is
+    reused while the source file is unchanged; exclude=True drops flagged rows
+    (the report keeps describing the source, so integrity questions still see them).
+    partition_filter prunes a partitioned directory at load, so every index
+    built on the returned frame sees the same rows.
+    """
+    df = load_dataframe(csv_path, manifest_path, partition_filter)
+    source = _fingerprint(manifest_path or csv_path, None if manifest_path else partition_filter)
+    report = None
+    if os.path.exists(report_path):
+        with open(report_path, encoding="utf-8") as f:
+            state = json.load(f)
+        if (state.get("source") == source and state.get("rows") == len(df)
+                and state.get("plateau_min_s") == plateau_min_s):
+            report = QualityReport.from_dict(state, df["timestamp"].astype(str).to_numpy())
+    if report is None:
+        report = QualityReport.from_frame(df, plateau_min_s, source)
+        report.save(report_path)
+    if exclude and not report.ok.all():
+        df = df[report.ok].reset_index(drop=True)
+    return df, report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan the accel percentile columns for integrity issues.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    parser.add_argument("--plateau_min_s", type=int, default=PLATEAU_MIN_S)
+    parser.add_argument("--report", type=str, default=QUALITY_REPORT)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    t0 = time.perf_counter()
+    report = QualityReport.from_frame(df, args.plateau_min_s, _fingerprint(args.csv))
+    elapsed = time.perf_counter() - t0
+    print(report.describe())
+    for check in CHECKS:
+        if report.flagged(check).any():
+            print(report.describe(check))
+    print(f"\nScanned {len(df):,} rows in {elapsed * 1000:.1f}ms; report → {report.save(args.report)}")
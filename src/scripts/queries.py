@@ -5,6 +5,7 @@ Central registry for all evaluation queries, ground-truth functions,
 and out-of-scope test cases used by eval.py.
 """
 
+import numpy as np
 import pandas as pd
 
 # ====================================================
@@ -54,7 +55,6 @@ OUT_OF_SCOPE = [
     "What is the gyroscope mean value for accel_mean = 9.344?",
     # external data required
     "What was the weather at the location with maximum accel_stats_z_p99?",
-    "Calculate total distance traveled between consecutive timestamps.",
     "Did the vehicle stop at any traffic lights based on longitude?",
     # impossible derivations
     "How many potholes were hit based on accel_stats_x_p90 spikes?",
@@ -62,6 +62,17 @@ OUT_OF_SCOPE = [
     "What is the fuel efficiency during periods of low accel_variance?",
 ]
 
+# ====================================================
+# ROUTE QUERIES (answerable from GPS fixes via route_index.py)
+# Used to be rejected as out-of-scope before the route index existed
+# ====================================================
+
+ROUTE_QUERIES = [
+    "Calculate total distance traveled between consecutive timestamps.",
+    "How far did the bus travel between 2025-06-06 16:01:00 and 2025-06-06 16:37:00?",
+    "How much longer was the first trip than the straight-line distance between its endpoints?",
+]
+
 # ====================================================
 # Ground-truth computations (one per TEST_QUERY, same order)
 # ====================================================
@@ -117,6 +128,49 @@ GROUND_TRUTH_FNS = [
     gt_lon_range,
 ]
 
+# ====================================================
+# Ground-truth computations for ROUTE_QUERIES (plain pandas haversine)
+# ====================================================
+
+TRIP_GAP_S = 30 * 60  # a longer gap between fixes starts a new trip
+
+def _ordered_steps(df):
+    d = df.assign(ts=pd.to_datetime(df["timestamp"])).sort_values("ts", kind="stable")
+    lat, lon = np.radians(d["latitude"].to_numpy()), np.radians(d["longitude"].to_numpy())
+    a = (np.sin(np.diff(lat) / 2) ** 2
+         + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2)
+    step = 2 * 6_371_000 * np.arcsin(np.sqrt(a))
+    new_trip = d["ts"].diff().dt.total_seconds().to_numpy()[1:] > TRIP_GAP_S
+    step[new_trip] = 0.0
+    return d, step, new_trip
+
+def gt_total_distance(df):
+    _, step, _ = _ordered_steps(df)
+    return f"{step.sum():.1f} m"
+
+def gt_distance_window(df):
+    d, step, _ = _ordered_steps(df)
+    inside = ((d["ts"] >= "2025-06-06 16:01:00") & (d["ts"] <= "2025-06-06 16:37:00")).to_numpy()
+    both = inside[:-1] & inside[1:]
+    return f"{step[both].sum():.1f} m"
+
+def gt_first_trip_detour(df):
+    d, step, new_trip = _ordered_steps(df)
+    end = int(np.argmax(new_trip)) if new_trip.any() else len(step)
+    traveled = step[:end].sum()
+    lat = np.radians(d["latitude"].to_numpy()[[0, end]])
+    lon = np.radians(d["longitude"].to_numpy()[[0, end]])
+    a = (np.sin((lat[1] - lat[0]) / 2) ** 2
+         + np.cos(lat[0]) * np.cos(lat[1]) * np.sin((lon[1] - lon[0]) / 2) ** 2)
+    straight = 2 * 6_371_000 * np.arcsin(np.sqrt(a))
+    return f"traveled={traveled:.1f} m, straight={straight:.1f} m, ratio={traveled / straight:.3f}"
+
+GT_ROUTE_FNS = [
+    gt_total_distance,
+    gt_distance_window,
+    gt_first_trip_detour,
+]
+
 # Ground truth responses for out-of-scope queries — all should indicate insufficient data
 GT_OUT_OF_SCOPE = [
     "Dataset lacks vehicle speed column and deriving speed via double-integration is not feasible",
@@ -124,7 +178,6 @@ GT_OUT_OF_SCOPE = [
     "Dataset lacks driver ID column - cannot count unique drivers",
     "Dataset lacks gyroscope data - only has accelerometer statistics",
     "Dataset lacks weather information - cannot correlate with external weather data",
-    "Dataset lacks detailed positional tracking - cannot calculate distance between sparse GPS points",
     "Dataset lacks traffic infrastructure data - cannot identify traffic light locations",
     "Dataset lacks road condition sensors - cannot detect potholes from acceleration alone",
     "Dataset lacks sufficient temporal density - cannot reliably predict future positions",
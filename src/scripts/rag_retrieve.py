@@ -1,29 +1,21 @@
 import os
-import pandas as pd
+import argparse
 
 # ============================================================
 # LangChain RAG Agent with Google Gemini for Bus Data Analysis
 # ============================================================
+# Nothing heavy happens at import time: LangChain, Gemini, the embedding model
+# and Chroma are imported and built inside the functions below, so
+# `import rag_retrieve` (and --help) stays cheap. Run it as a script:
+#
+#     python rag_retrieve.py
+#     python rag_retrieve.py --question "Which axis shows the highest 99th percentile values on average?"
+#     python rag_retrieve.py --reuse_index     # skip re-embedding, use the persisted Chroma store
 
 # --- Configuration ---
-GOOGLE_API_KEY = os.environ["GOOGLE_API_KEY"]
 CSV_PATH = "../../data/raw/bus_data.csv"
 CHROMA_PERSIST_DIR = "./chroma_db_"
-
-# --- Load and Split Documents ---
-from langchain_community.document_loaders import CSVLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-loader = CSVLoader(file_path=CSV_PATH, encoding="utf-8")
-docs = loader.load()
-
-# Split into manageable chunks for embedding
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-chunks = text_splitter.split_documents(docs)
-print(f"Loaded {len(docs)} rows, split into {len(chunks)} chunks")
-
-# --- Initialize Gemini Chat Model ---
-from langchain_google_genai import ChatGoogleGenerativeAI
+DEFAULT_QUESTION = """Find outliers where accel_stats_x_p1 and accel_stats_x_p99 are both extreme (possible sensor issues or very rough segments)."""
 
 """
 # to prepare a langchain dataframe agent, you would run--
@@ -91,71 +83,109 @@ agent.invoke(CSV_PROMPT_PREFIX + QUESTION + CSV_PROMPT_SUFFIX)
 # Agents are good at multi-step math but are less reliable
 """
 
-chat_model = ChatGoogleGenerativeAI(
-    google_api_key=GOOGLE_API_KEY,
-    model="gemini-2.5-flash",
-    temperature=0.2,
-)
-
-# --- Initialize Embedding Model (local, no rate limits) ---
-from langchain_huggingface import HuggingFaceEmbeddings
 
-embedding_model = HuggingFaceEmbeddings(
-    model_name="all-MiniLM-L6-v2"  # Fast and accurate, runs locally
-)
+def load_chunks(csv_path=CSV_PATH):
+    # --- Load and Split Documents ---
+    from langchain_community.document_loaders import CSVLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-# Store the chunks in vector store
-from langchain_community.vectorstores import Chroma
+    loader = CSVLoader(file_path=csv_path, encoding="utf-8")
+    docs = loader.load()
 
-# Embed each chunk and load it into the vector store
-db = Chroma.from_documents(chunks, embedding_model, persist_directory=CHROMA_PERSIST_DIR)
+    # Split into manageable chunks for embedding
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    chunks = text_splitter.split_documents(docs)
+    print(f"Loaded {len(docs)} rows, split into {len(chunks)} chunks")
+    return chunks
 
-# setting a Connection with the ChromaDB
-db_connection = Chroma(persist_directory=CHROMA_PERSIST_DIR, embedding_function=embedding_model)
 
-# converting CHROMA db_connection to Retriever Object
-retriever = db_connection.as_retriever(search_kwargs={"k": 5})
+def build_retriever(csv_path=CSV_PATH, reuse_index=False):
+    # --- Initialize Embedding Model (local, no rate limits) ---
+    from langchain_huggingface import HuggingFaceEmbeddings
+    # Store the chunks in vector store
+    from langchain_community.vectorstores import Chroma
 
-print(f"Retriever ready: {type(retriever)}")
+    embedding_model = HuggingFaceEmbeddings(
+        model_name="all-MiniLM-L6-v2"  # Fast and accurate, runs locally
+    )
 
-from langchain_core.messages import SystemMessage
-from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+    if not reuse_index:
+        # Embed each chunk and load it into the vector store
+        Chroma.from_documents(load_chunks(csv_path), embedding_model, persist_directory=CHROMA_PERSIST_DIR)
 
-chat_template = ChatPromptTemplate.from_messages([
-    # System Message Prompt Template
-    SystemMessage(content="""You are an expert data analyst specializing in bus sensor telemetry data.
-                  Given context from a CSV containing acceleration statistics (accel_stats) with 
-                  percentile columns (p1, p10, p90, p99) for x, y, and z axes, answer questions 
-                  accurately. Provide numerical insights and explain patterns when relevant."""),
-    # Human Message Prompt Template
-    HumanMessagePromptTemplate.from_template("""Answer the question based on the given context.
-    Context: {context}
-    Question: {question}
-    Answer: """)
-])
+    # setting a Connection with the ChromaDB
+    db_connection = Chroma(persist_directory=CHROMA_PERSIST_DIR, embedding_function=embedding_model)
 
-from langchain_core.output_parsers import StrOutputParser
+    # converting CHROMA db_connection to Retriever Object
+    retriever = db_connection.as_retriever(search_kwargs={"k": 5})
 
-output_parser = StrOutputParser()
+    print(f"Retriever ready: {type(retriever)}")
+    return retriever
 
-from langchain_core.runnables import RunnablePassthrough
 
 def format_docs(docs):
     return "\n\n".join(doc.page_content for doc in docs)
 
 
-rag_chain = (
-    {"context": retriever | format_docs, "question": RunnablePassthrough()}
-    | chat_template
-    | chat_model
-    | output_parser
-)
+def build_rag_chain(retriever, google_api_key):
+    # --- Initialize Gemini Chat Model ---
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_core.messages import SystemMessage
+    from langchain_core.prompts import ChatPromptTemplate, HumanMessagePromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnablePassthrough
+
+    chat_model = ChatGoogleGenerativeAI(
+        google_api_key=google_api_key,
+        model="gemini-2.5-flash",
+        temperature=0.2,
+    )
+
+    chat_template = ChatPromptTemplate.from_messages([
+        # System Message Prompt Template
+        SystemMessage(content="""You are an expert data analyst specializing in bus sensor telemetry data.
+                      Given context from a CSV containing acceleration statistics (accel_stats) with 
+                      percentile columns (p1, p10, p90, p99) for x, y, and z axes, answer questions 
+                      accurately. Provide numerical insights and explain patterns when relevant."""),
+        # Human Message Prompt Template
+        HumanMessagePromptTemplate.from_template("""Answer the question based on the given context.
+        Context: {context}
+        Question: {question}
+        Answer: """)
+    ])
+
+    output_parser = StrOutputParser()
+
+    return (
+        {"context": retriever | format_docs, "question": RunnablePassthrough()}
+        | chat_template
+        | chat_model
+        | output_parser
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="RAG over the bus CSV with Gemini.")
+    parser.add_argument("--csv", type=str, default=CSV_PATH)
+    # TODO: we can customize the question below
+    # e.g. --question "Please summarize the csv file"
+    parser.add_argument("--question", type=str, default=DEFAULT_QUESTION)
+    parser.add_argument("--reuse_index", action="store_true",
+                        help="Query the persisted Chroma store instead of re-embedding the CSV.")
+    args = parser.parse_args(argv)
+
+    google_api_key = os.environ["GOOGLE_API_KEY"]
+    rag_chain = build_rag_chain(build_retriever(args.csv, args.reuse_index), google_api_key)
+
+    response = rag_chain.invoke(args.question)
+    print("\n--- Response ---")
+    print(response)
+    return response
+
+
+if __name__ == "__main__":
+    main()
 
-# TODO: we can customize the question below
-# response = rag_chain.invoke("""Please summarize the csv file""")
-response = rag_chain.invoke("""Find outliers where accel_stats_x_p1 and accel_stats_x_p99 are both extreme (possible sensor issues or very rough segments).""")
-print("\n--- Response ---")
-print(response)
 
 ### sample prompts
 
@@ -230,5 +260,3 @@ print(response)
 
 * Compare the distribution of accel_stats_z_p1 and accel_stats_z_p99 to see if the range is realistic.
 """
-
-print(response)
\ No newline at end of file
@@ -0,0 +1,243 @@
+"""
+renderer.py
+-----------
+Deterministic natural-language rendering for simple results.
+
+Most raw answers are a single number, one record, or a short ranked table.
+For those the sentence is assembled from the rewritten (column-grounded)
+query, with no LLM call:
+
+    "How many rows have accel_variance greater than 0.15?" + "412"
+        -> "There are 412 rows that have accel_variance greater than 0.15."
+    "What is the average accel_variance?" + "0.26662674"
+        -> "The average accel_variance is 0.2666."
+
+render_answer returns None unless every part of the query's shape is
+understood: one aggregate over one column, an optional simple comparison
+filter, and nothing else (no "unique", "per hour", units, yes/no questions,
+percentages; "and its timestamp" only when the result is a record carrying
+it). Anything else goes to the (streaming) LLM contextualizer, which sees the
+full query.
+"""
+
+import re
+
+MAX_ROWS_RENDERED = 10
+
+AGGREGATIONS = [
+    ("count", r"\bhow many\b|\bcount(?: of)?\b|\bnumber of\b"),
+    ("percentage", r"\bpercent(age)?\b|\bproportion\b|\bfraction\b|\bshare\b|%"),
+    ("average", r"\baverage\b|\bmean\b"),
+    ("median", r"\bmedian\b"),
+    ("standard deviation", r"\bstandard deviation\b|\bstd\b"),
+    ("maximum", r"\bmax(imum)?\b|\bhighest\b|\blargest\b|\bpeak\b|\blatest\b|\bmost recent\b"),
+    ("minimum", r"\bmin(imum)?\b|\blowest\b|\bsmallest\b|\bearliest\b"),
+    ("total", r"\bsum\b|\btotal\b"),
+]
+# aggregates a scalar sentence can state (a percentage may be a fraction or a percent)
+SCALAR_AGGREGATIONS = ("average", "median", "standard deviation", "maximum", "minimum", "total")
+
+SCALAR = re.compile(r"^(?:np\.\w+\()?(-?[\d,]*\.?\d+(?:[eE][-+]?\d+)?)\)?\.?$")
+TIMESTAMP = re.compile(r"^(?:Timestamp\(')?(\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}:\d{2})?)(?:'\))?$")
+CONDITION = re.compile(r"\b(where|with|that have|that has|have|has|having|whose|in which|when)\b\s+(.*)$")
+SERIES_FOOTER = re.compile(r"^(Name: .*)?(dtype: \w+)?$")
+YES_NO = re.compile(r"^(is|are|was|were|does|do|did|has|have|can|could)\b")
+
+COMPARATOR = (r"(?:is |are |was |were )?(?:greater than or equal to|less than or equal to|greater than|"
+              r"less than|more than|fewer than|above|below|over|under|at least|at most|exceeding|"
+              r"exceeds|equal to|equals|exactly|after|before|on|>=|<=|==|>|<|=)")
+VALUE = r"(?:-?\d+(?:\.\d+)?|\d{4}-\d{2}-\d{2}(?: \d{2}:\d{2}(?::\d{2})?)?)"
+
+# words that carry no meaning beyond the aggregate / column / filter
+FILLER = {"what", "what's", "whats", "is", "was", "are", "were", "the", "of", "a", "an", "value", "values",
+          "in", "dataset", "data", "overall", "all", "across", "for", "find", "compute", "calculate",
+          "give", "me", "tell", "show", "list", "return", "get", "please", "rows", "row", "readings",
+          "reading", "records", "record", "samples", "there", "which", "timestamp"}
+ROW_NOUNS = {"rows", "row", "readings", "reading", "records", "record", "samples"}
+# a record answer may also carry fields the query names ("max X and its timestamp")
+RECORD_FILLER = {"and", "its", "their", "corresponding", "associated", "with", "along", "when", "did", "occur"}
+TABLE_FILLER = {"top", "by", "sorted", "order", "descending", "ascending"}
+
+
+def _columns_in(text, columns):
+    """Columns named in text, longest names first so accel_stats_x_p1 never claims p10."""
+    found = []
+    for col in sorted(columns, key=len, reverse=True):
+        pattern = rf"(?<![\w-]){re.escape(col.lower())}(?![\w-])"
+        if re.search(pattern, text):
+            found.append(col)
+            text = re.sub(pattern, " ", text)
+    return found, text
+
+
+def _simple_condition(text, columns):
+    """True for 'col <comparator> value' clauses joined by 'and' (or 'col between a and b')."""
+    names = "|".join(re.escape(c.lower()) for c in sorted(columns, key=len, reverse=True))
+    if not names:
+        return False
+    clause = rf"(?:{names}) (?:{COMPARATOR} {VALUE}|(?:is )?between {VALUE} and {VALUE})"
+    return re.fullmatch(rf"{clause}(?: and {clause})*", text) is not None
+
+
+def parse_shape(query, columns):
+    """
+    {agg, columns, condition, leftover, when} of a query, or None when it has
+    a part the renderer does not model (yes/no form, complex filter, several
+    aggregates). leftover are the words nothing accounted for.
+    """
+    text = " ".join(query.lower().rstrip(" ?.!").split())
+    if YES_NO.match(text):
+        return None
+    main, condition = text, None
+    match = next((m for m in CONDITION.finditer(text) if m.start() > 0), None)
+    if match:
+        word = match.group(1)
+        if not _simple_condition(match.group(2), columns):
+            return None
+        main = text[:match.start()]
+        condition = f"{'that ' + word if word in ('have', 'has') else word} {match.group(2)}"
+
+    named, rest = _columns_in(main, columns)
+    aggs = []
+    for name, pattern in AGGREGATIONS:
+        if re.search(pattern, rest):
+            aggs.append(name)
+            rest = re.sub(pattern, " ", rest)
+    if len(aggs) > 1:
+        return None
+    words = re.findall(r"[^\s,]+", rest)
+    return {"agg": aggs[0] if aggs else None, "columns": named, "condition": condition,
+            "when": words[:1] == ["when"],
+            "rows": any(w in ROW_NOUNS for w in words),
+            "leftover": [w for w in words if w not in FILLER]}
+
+
+def _aggregation(query):
+    for name, pattern in AGGREGATIONS:
+        if re.search(pattern, query, re.IGNORECASE):
+            return name
+    return None
+
+
+def _fmt_number(value, integer=False):
+    if integer or float(value).is_integer():
+        return f"{int(round(value)):,}"
+    if abs(value) >= 1000:
+        return f"{value:,.2f}"
+    return f"{value:.4g}" if abs(value) < 1e-3 else f"{round(value, 4):g}"
+
+
+def _render_scalar(value_text, shape):
+    if shape["leftover"]:
+        return None
+    agg, condition = shape["agg"], shape["condition"]
+    value = float(value_text.replace(",", ""))
+
+    if agg == "count" and shape["rows"] and not shape["columns"]:
+        if not value.is_integer():
+            return None
+        noun = "row" if value == 1 else "rows"
+        verb = "is" if value == 1 else "are"
+        return f"There {verb} {_fmt_number(value, integer=True)} {noun}" + (
+            f" {condition}." if condition else ".")
+    if agg in SCALAR_AGGREGATIONS and len(shape["columns"]) == 1 and shape["columns"] != ["timestamp"]:
+        tail = f" for rows {condition}" if condition else ""
+        return f"The {agg} {shape['columns'][0]}{tail} is {_fmt_number(value)}."
+    return None
+
+
+def _render_timestamp(stamp, shape):
+    agg, named = shape["agg"], shape["columns"]
+    if shape["condition"] or agg not in ("maximum", "minimum"):
+        return None
+    if named == ["timestamp"] and not shape["leftover"]:
+        return f"The {'earliest' if agg == 'minimum' else 'latest'} timestamp is {stamp}."
+    if shape["when"] and len(named) == 1 and shape["leftover"] == ["when"]:
+        return f"The {agg} {named[0]} occurred at {stamp}."
+    return None
+
+
+def _render_record(pairs, query):
+    fields = ", ".join(f"{k} {v}" for k, v in pairs)
+    agg = _aggregation(query)
+    lead = f"The record with the {agg} value" if agg in ("maximum", "minimum") else "The matching record"
+    return f"{lead} has {fields}."
+
+
+def _render_ranked(pairs, index_name=None):
+    key = index_name
+    items = "; ".join(f"{k} ({v})" for k, v in pairs[:MAX_ROWS_RENDERED])
+    more = f"; and {len(pairs) - MAX_ROWS_RENDERED} more" if len(pairs) > MAX_ROWS_RENDERED else ""
+    label = f"Results by {key}" if key else "Results"
+    return f"{label}: {items}{more}."
+
+
+def _render_table(header, rows, query):
+    n = len(rows)
+    shown = rows[:MAX_ROWS_RENDERED]
+    lines = []
+    for i, values in enumerate(shown, 1):
+        lines.append(f"{i}) " + ", ".join(f"{h} {v}" for h, v in zip(header, values)))
+    agg = _aggregation(query)
+    lead = f"Top {n} rows" if agg in ("maximum", "minimum") or re.search(r"\btop\b", query, re.I) \
+        else f"{n} matching row{'s' if n != 1 else ''}"
+    more = f" (showing the first {MAX_ROWS_RENDERED})" if n > MAX_ROWS_RENDERED else ""
+    return f"{lead}{more}: " + "; ".join(lines) + "."
+
+
+def _pairs(lines):
+    pairs = []
+    for line in lines:
+        parts = re.split(r"\s{2,}", line.strip(), maxsplit=1)
+        if len(parts) != 2:
+            return None
+        pairs.append((parts[0], parts[1].strip()))
+    return pairs
+
+
+def render_answer(query, raw_answer, columns):
+    """One sentence for a scalar / record / ranked result, or None."""
+    text = str(raw_answer).strip("\n")   # keep the indentation of a table header
+    raw = text.strip()
+    if not raw or raw.startswith("[") or "Error" in raw.split("\n", 1)[0]:
+        return None
+    shape = parse_shape(query, columns)
+    if shape is None or shape["agg"] == "percentage":
+        return None
+
+    if SCALAR.match(raw):
+        return _render_scalar(SCALAR.match(raw).group(1), shape)
+    if TIMESTAMP.match(raw):
+        return _render_timestamp(TIMESTAMP.match(raw).group(1), shape)
+    if shape["agg"] not in (None, "maximum", "minimum"):
+        return None
+
+    lines = [l for l in text.splitlines() if l.strip() and not SERIES_FOOTER.match(l.strip())]
+    if len(lines) < 2:
+        return None
+
+    table_words = [w for w in shape["leftover"] if w not in TABLE_FILLER and not re.fullmatch(r"\d+", w)]
+    header = lines[0].split()
+    # a DataFrame header is indented past the (unnamed) index column
+    if lines[0][:1].isspace() and all(h in columns for h in header):
+        rows = [re.split(r"\s{2,}", l.strip()) for l in lines[1:]]
+        # first field is the index label
+        if not table_words and set(shape["columns"]) <= set(header) and all(len(r) == len(header) + 1 for r in rows):
+            return _render_table(header, [r[1:] for r in rows], query)
+        return None
+
+    index_name = None
+    if len(header) == 1:
+        index_name, lines = header[0], lines[1:]   # Series index name (e.g. value_counts)
+    pairs = _pairs(lines)
+    if not pairs:
+        return None
+    if index_name is None and all(k in columns for k, _ in pairs):
+        # every field the query asks for must be in the record
+        if any(w not in RECORD_FILLER for w in shape["leftover"]) or \
+                not set(shape["columns"]) <= {k for k, _ in pairs}:
+            return None
+        return _render_record(pairs, query)
+    if table_words or not set(shape["columns"]) <= {index_name}:
+        return None
+    return _render_ranked(pairs, index_name)
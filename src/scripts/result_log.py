@@ -0,0 +1,198 @@
+"""
+result_log.py
+-------------
+Structured, non-blocking result log for eval runs.
+
+Each answered query becomes one JSON line (run id, dataset, engine, query,
+ground truth, answer, latency, reasoning trace). The caller only enqueues the
+record; a background thread serializes it, appends it to eval_results.jsonl and
+flushes, so a crash loses at most the record in flight and nothing accumulates
+in memory while a run is going. The queue is bounded: if the disk ever falls
+QUEUE_SIZE records behind, producers wait instead of growing the heap.
+
+When the file would exceed MAX_BYTES it is rotated on a record boundary
+(eval_results.jsonl -> .1 -> .2 ... up to BACKUPS files), so the log stays
+bounded across runs. The markdown report (the format eval_responses.md always
+had) is rendered afterwards from the JSONL, for one run or all of them.
+
+Usage:
+    # eval.py writes the log; --markdown also appends the run to eval_responses.md
+    python eval.py --markdown
+
+    # Render the latest run (or a given one) from the JSONL:
+    python result_log.py render
+    python result_log.py render --run 20250606-163634-1234 --out report.md
+
+    # Runs currently in the log:
+    python result_log.py runs
+"""
+
+import os
+import json
+import queue
+import argparse
+import threading
+from datetime import datetime
+
+# --- Configuration ---
+OUTPUT_DIR  = os.path.join(os.path.dirname(__file__), "output")
+RESULTS_LOG = os.path.join(OUTPUT_DIR, "eval_results.jsonl")
+MAX_BYTES   = 5 * 1024 * 1024   # rotate past 5 MB ...
+BACKUPS     = 5                 # ... keeping eval_results.jsonl.1 - .5
+QUEUE_SIZE  = 1000
+
+_STOP = object()
+
+
+def new_run_id():
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+
+
+class ResultLog:
+    """Background JSONL writer with size-based rotation. Use as a context manager."""
+
+    def __init__(self, path=RESULTS_LOG, max_bytes=MAX_BYTES, backups=BACKUPS, queue_size=QUEUE_SIZE):
+        self.path, self.max_bytes, self.backups = path, max_bytes, backups
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.written = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.thread = threading.Thread(target=self._writer, name="result-log", daemon=True)
+        self.thread.start()
+
+    def write(self, record):
+        """Enqueue one record (a JSON-serializable dict); returns immediately."""
+        self.queue.put(record)
+
+    def close(self):
+        """Write everything still queued, then stop the writer thread."""
+        self.queue.put(_STOP)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def _writer(self):
+        f = open(self.path, "a", encoding="utf-8")
+        try:
+            while True:
+                record = self.queue.get()
+                if record is _STOP:
+                    return
+                try:
+                    line = json.dumps(record, default=str, ensure_ascii=False) + "\n"
+                    if f.tell() and f.tell() + len(line.encode("utf-8")) > self.max_bytes:
+                        f.close()
+                        self._rotate()
+                        f = open(self.path, "a", encoding="utf-8")
+                    f.write(line)
+                    f.flush()
+                    self.written += 1
+                except Exception as e:
+                    # a bad record must not take the writer (and every later record) down
+                    print(f"[result_log] dropped record: {e}")
+        finally:
+            f.close()
+
+
+# ====================================================
+# Reading and markdown rendering
+# ====================================================
+
+def log_files(path=RESULTS_LOG, backups=BACKUPS):
+    """Existing log files, oldest first."""
+    rotated = [f"{path}.{i}" for i in range(backups, 0, -1)]
+    return [p for p in rotated + [path] if os.path.exists(p)]
+
+
+def read_records(path=RESULTS_LOG, run_id=None):
+    """Records from every log file in write order, optionally for one run."""
+    for file in log_files(path):
+        with open(file, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue   # torn last line after a crash
+                if run_id is None or record.get("run") == run_id:
+                    yield record
+
+
+def list_runs(path=RESULTS_LOG):
+    """{run id: (started, dataset, records)} in order of first appearance."""
+    runs = {}
+    for r in read_records(path):
+        started, csv, n = runs.get(r["run"], (r["time"], r["csv"], 0))
+        runs[r["run"]] = (started, csv, n + 1)
+    return runs
+
+
+def render_markdown(records):
+    """The eval_responses.md layout: one section per run, one table per query."""
+    runs = {}
+    for r in records:
+        runs.setdefault(r["run"], {}).setdefault(r["i"], []).append(r)
+    out = []
+    for run_queries in runs.values():
+        first = next(iter(run_queries.values()))[0]
+        engines = list(dict.fromkeys(r["engine"] for rows in run_queries.values() for r in rows))
+        out.append(f"\n# Eval Run [{first['time']}] — {first['csv']} (engine: {', '.join(engines)})\n\n")
+        if first.get("excluded"):
+            checks = ", ".join(f"{c}={n:,}" for c, n in first["excluded"]["checks"].items())
+            out.append(f"Excluded {first['excluded']['rows']:,} row(s) failing integrity checks "
+                       f"({checks}); ground truth uses the same rows.\n\n")
+        latencies = {engine: [] for engine in engines}
+        for i, rows in run_queries.items():
+            out.append(f"## Q{i}: {rows[0]['query']}\n\n")
+            out.append("| | Answer |\n|---|---|\n")
+            out.append(f"| **Ground Truth** | {rows[0]['ground_truth']} |\n")
+            for r in rows:
+                out.append(f"| **LLM ({r['engine']})** | {r['answer']} |\n")
+                out.append(f"| **Latency ({r['engine']})** | {r['latency']:.2f}s |\n")
+                latencies[r["engine"]].append(r["latency"])
+            out.append("\n")
+            for r in rows:
+                out.append(f"**Agent Reasoning ({r['engine']}):**\n```\n{r['reasoning']}\n```\n\n")
+            out.append("---\n")
+        for engine, values in latencies.items():
+            if values:
+                out.append(f"\n**Latency summary ({engine}):** avg={sum(values) / len(values):.2f}s, "
+                           f"min={min(values):.2f}s, max={max(values):.2f}s\n")
+    return "".join(out)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and render the eval result log.")
+    parser.add_argument("--log", type=str, default=RESULTS_LOG)
+    sub = parser.add_subparsers(dest="command", required=True)
+    render = sub.add_parser("render", help="Markdown for one run (default: the latest).")
+    render.add_argument("--run", type=str, default=None)
+    render.add_argument("--all", action="store_true", help="Every run in the log.")
+    render.add_argument("--out", type=str, default=None, help="Append to this file instead of printing.")
+    sub.add_parser("runs", help="List the runs in the log.")
+    args = parser.parse_args()
+
+    runs = list_runs(args.log)
+    if args.command == "runs":
+        for run_id, (started, csv, n) in runs.items():
+            print(f"{run_id}  {started}  {n:>4} record(s)  {csv}")
+    else:
+        run_id = None if args.all else args.run or (list(runs)[-1] if runs else None)
+        text = render_markdown(read_records(args.log, run_id))
+        if args.out:
+            with open(args.out, "a", encoding="utf-8") as f:
+                f.write(text)
+            print(f"Rendered → {args.out}")
+        else:
+            print(text)
@@ -0,0 +1,148 @@
+"""
+route_index.py
+--------------
+Cumulative-distance route index for the routeEfficiency intent.
+
+Fixes are time-ordered once, the haversine distance between consecutive fixes
+is computed in one vectorized pass, and a prefix-sum array of cumulative
+distance is kept. Traveled distance, straight-line distance, detour ratio and
+average speed for ANY segment are then O(1) given fix positions (O(log n) when
+the segment is given as timestamps, via a binary search).
+
+Consecutive fixes more than TRIP_GAP_S apart start a new trip; that step adds
+no distance (the enlarged dataset jumps a whole day between copies).
+
+Usage:
+    # Print trip metrics and write data/processed/route_index.json for the dashboard:
+    python route_index.py
+
+    # Point to any CSV:
+    python route_index.py --csv path/to/file.csv
+"""
+
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from geo import haversine_m, time_ordered_fixes
+
+# --- Configuration ---
+BASE_DIR      = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT   = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
+INDEX_JSON    = os.path.join(PROCESSED_DIR, "route_index.json")
+
+TRIP_GAP_S = 30 * 60   # fixes further apart than this belong to different trips
+TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class RouteIndex:
+    """Prefix sums of distance over time-ordered fixes."""
+
+    def __init__(self, df, trip_gap_s=TRIP_GAP_S):
+        self.ts, self.lat, self.lon = time_ordered_fixes(df)
+        self.trip_gap_s = trip_gap_s
+
+        step = haversine_m(self.lat[:-1], self.lon[:-1], self.lat[1:], self.lon[1:])
+        trip_break = np.diff(self.ts) > trip_gap_s
+        step[trip_break] = 0.0
+        self.step_m = step
+        self.cum_m = np.concatenate(([0.0], np.cumsum(step)))
+
+        # trip k spans fixes trip_starts[k] .. trip_ends[k] (inclusive)
+        self.trip_starts = np.concatenate(([0], np.flatnonzero(trip_break) + 1))
+        self.trip_ends = np.concatenate((self.trip_starts[1:] - 1, [len(self.ts) - 1]))
+
+    def __len__(self):
+        return len(self.ts)
+
+    # ---- O(1) lookups ----
+
+    def segment(self, i, j):
+        """Metrics between fix positions i <= j (time order)."""
+        traveled = float(self.cum_m[j] - self.cum_m[i])
+        straight = float(haversine_m(self.lat[i], self.lon[i], self.lat[j], self.lon[j]))
+        elapsed = int(self.ts[j] - self.ts[i])
+        return {
+            "start": _fmt(self.ts[i]),
+            "end": _fmt(self.ts[j]),
+            "traveled_m": round(traveled, 1),
+            "straight_m": round(straight, 1),
+            "detour_ratio": round(traveled / straight, 3) if straight > 0 else None,
+            "elapsed_s": elapsed,
+            "avg_speed_mps": round(traveled / elapsed, 3) if elapsed > 0 else None,
+        }
+
+    def positions(self, start=None, end=None):
+        """Fix positions covering [start, end]; accepts anything pd.Timestamp parses."""
+        i = 0 if start is None else int(np.searchsorted(self.ts, _to_s(start), side="left"))
+        j = len(self.ts) - 1 if end is None else int(np.searchsorted(self.ts, _to_s(end), side="right")) - 1
+        return i, j
+
+    def segment_between(self, start=None, end=None):
+        i, j = self.positions(start, end)
+        if j <= i:
+            raise ValueError(f"No fixes between {start} and {end}")
+        return self.segment(i, j)
+
+    def total_distance_m(self):
+        return float(self.cum_m[-1])
+
+    def trips(self):
+        return pd.DataFrame([self.segment(i, j) for i, j in zip(self.trip_starts, self.trip_ends)
+                             if j > i])
+
+    def efficiency_summary(self):
+        """Template variables for the `efficiency-report` prompt."""
+        trips = self.trips()
+        overall = self.segment(0, len(self.ts) - 1)
+        text = (
+            f"Total distance traveled: {self.total_distance_m():,.1f} m over {len(trips)} trip(s), "
+            f"{overall['elapsed_s']} s from {overall['start']} to {overall['end']}.\n"
+            f"Per trip (traveled vs straight-line):\n{trips.to_string(index=False)}"
+        )
+        return {"efficiency": text}
+
+    def to_json(self, path=INDEX_JSON):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        payload = {
+            "total_distance_m": round(self.total_distance_m(), 1),
+            "trips": self.trips().to_dict(orient="records"),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+
+
+def _to_s(value):
+    return int(pd.Timestamp(value).timestamp())
+
+
+def _fmt(ts_s):
+    return pd.Timestamp(int(ts_s), unit="s").strftime(TS_FORMAT)
+
+
+def efficiency_summary(df):
+    return RouteIndex(df).efficiency_summary()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the cumulative-distance route index.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    t0 = time.perf_counter()
+    index = RouteIndex(df)
+    print(f"Indexed {len(index):,} fixes in {(time.perf_counter() - t0) * 1000:.1f}ms")
+
+    t0 = time.perf_counter()
+    print(index.segment_between())
+    print(f"Whole-route lookup: {(time.perf_counter() - t0) * 1e6:.0f}us")
+
+    print(index.trips().to_string(index=False))
+    index.to_json()
+    print(f"Saved to {INDEX_JSON}")
@@ -0,0 +1,157 @@
+"""
+schema_index.py
+---------------
+Retrieval index over the dataset schema, so the rewriter / guardrail prompts
+carry only the columns a query is about.
+
+eval.py puts every column's metadata into the rewriter prompt and every
+column's dtype + example into the guardrail prompt. That is fine for 17
+columns, but feeds with gyro, GPS quality and CAN-bus fields reach hundreds
+and the prompts grow with them. Here each column becomes one card (name,
+COLUMN_DESCRIPTIONS text or the de-snaked name, dtype) embedded ONCE with the
+same local sentence-transformer as scope_classifier.py; vectors are cached in
+data/processed/schema_index.npz keyed by card text, so a restart only embeds
+new or changed columns.
+
+Per query the top-k columns by cosine similarity (plus a bonus when a column's
+name or name tokens appear literally, which is what the rewritten queries
+contain) are formatted in exactly the lines the prompts used before. When no
+column reaches MIN_SIMILARITY and none is named, retrieve() returns nothing and
+the caller rejects the query. Prompt size is therefore O(k), independent of
+the column count.
+
+Usage:
+    # Show what each eval query retrieves:
+    python schema_index.py --csv ../../data/raw/bus_data.csv --top_k 5
+
+    # One query:
+    python schema_index.py --query "how bumpy was the ride near the stadium?"
+"""
+
+import os
+import re
+import hashlib
+import argparse
+from functools import lru_cache
+
+import numpy as np
+
+from scope_classifier import COLUMN_DESCRIPTIONS, EMBED_MODEL
+
+# --- Configuration ---
+BASE_DIR      = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT   = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
+CACHE_PATH    = os.path.join(PROCESSED_DIR, "schema_index.npz")
+
+TOP_K = 8
+MIN_SIMILARITY = 0.25   # cosine below this (and no name hit) = column not relevant
+NAME_BONUS     = 1.0    # the exact column name appears in the query
+TOKEN_BONUS    = 0.05   # per name token ("variance", "p99", "gyro") in the query
+
+SCHEMA_LINE = re.compile(r"^- '(.+?)' ")
+
+
+def column_card(col, info):
+    """The text embedded for one column."""
+    description = COLUMN_DESCRIPTIONS.get(col, col.replace("_", " "))
+    return f"{col}: {description} ({info.get('dtype', 'unknown')})"
+
+
+def _name_tokens(col):
+    return [t for t in re.split(r"[_\W]+", col.lower()) if len(t) > 1]
+
+
+class SchemaIndex:
+    """Embedded column cards; retrieve(query) -> the top-k relevant columns."""
+
+    def __init__(self, column_metadata, schema, model=None, model_name=EMBED_MODEL,
+                 cache_path=CACHE_PATH):
+        self.columns = list(column_metadata)
+        self.metadata = column_metadata
+        # guardrail lines ("- 'col' (dtype: ..., e.g. ...)") by column name
+        self.schema_lines = {}
+        for line in schema.splitlines():
+            m = SCHEMA_LINE.match(line)
+            if m:
+                self.schema_lines[m.group(1)] = line
+        self.tokens = [_name_tokens(col) for col in self.columns]
+        if model is None:
+            # deferred import: sentence-transformers pulls in torch
+            from sentence_transformers import SentenceTransformer
+            model = SentenceTransformer(model_name, device="cpu")
+        self.model, self.model_name, self.cache_path = model, model_name, cache_path
+        self.vectors = self._embed_cached([column_card(c, column_metadata[c]) for c in self.columns])
+        self._embed_query = lru_cache(maxsize=1024)(lambda q: self._embed([q])[0])
+
+    def _embed(self, texts):
+        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+
+    def _embed_cached(self, cards):
+        """Embed only the cards the cache has not seen (same model)."""
+        keys = [hashlib.sha1(f"{self.model_name}|{c}".encode()).hexdigest() for c in cards]
+        cached = {}
+        if self.cache_path and os.path.exists(self.cache_path):
+            with np.load(self.cache_path) as npz:
+                cached = dict(zip(npz["keys"].tolist(), npz["vectors"]))
+        missing = [i for i, k in enumerate(keys) if k not in cached]
+        if missing:
+            for i, vec in zip(missing, self._embed([cards[i] for i in missing])):
+                cached[keys[i]] = vec
+            if self.cache_path:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                np.savez(self.cache_path, keys=np.array(list(cached)),
+                         vectors=np.vstack(list(cached.values())))
+        return np.vstack([cached[k] for k in keys])
+
+    def scores(self, query):
+        """Similarity + name bonuses per column."""
+        text = (query or "").lower()
+        words = set(re.split(r"[_\W]+", text))
+        # vectors are L2-normalised, so a dot product is the cosine similarity
+        scores = self.vectors @ self._embed_query(text)
+        for j, col in enumerate(self.columns):
+            if re.search(rf"\b{re.escape(col.lower())}\b", text):
+                scores[j] += NAME_BONUS
+            scores[j] += TOKEN_BONUS * sum(t in words for t in self.tokens[j])
+        return scores
+
+    def retrieve(self, query, k=TOP_K):
+        """[(column, score)] best first; empty when nothing is relevant."""
+        scores = self.scores(query)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [(self.columns[j], round(float(scores[j]), 4)) for j in top
+                if scores[j] >= MIN_SIMILARITY]
+
+    def metadata_lines(self, columns):
+        """Rewriter format: "- 'col': {dtype, min, max, ...}"."""
+        return "\n".join(f"- '{col}': {self.metadata[col]}" for col in columns)
+
+    def schema_text(self, columns):
+        """Guardrail format: "- 'col' (dtype: ..., e.g. ...)"."""
+        return "\n".join(self.schema_lines.get(col, f"- '{col}'") for col in columns)
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from eval import build_column_metadata, build_schema_summary
+    from queries import QUERY_INTENT, OUT_OF_SCOPE
+
+    parser = argparse.ArgumentParser(description="Top-k schema retrieval for queries.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    parser.add_argument("--query", type=str, default=None)
+    parser.add_argument("--top_k", type=int, default=TOP_K)
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.csv)
+    meta = build_column_metadata(df)
+    index = SchemaIndex(meta, build_schema_summary(df))
+    full = len("\n".join(f"- '{c}': {i}" for c, i in meta.items()))
+    for query in [args.query] if args.query else QUERY_INTENT + OUT_OF_SCOPE:
+        hits = index.retrieve(query, args.top_k)
+        size = len(index.metadata_lines([c for c, _ in hits]))
+        print(f"\n{query}\n  prompt metadata: {size} of {full} chars")
+        for col, score in hits:
+            print(f"    {score:6.3f}  {col}")
+        if not hits:
+            print("    (no relevant column -> reject)")
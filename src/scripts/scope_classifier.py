@@ -0,0 +1,288 @@
+"""
+scope_classifier.py
+-------------------
+Local intent + scope classifier that sits in front of the LLM guardrail.
+
+Column descriptions and intent exemplars (from intent_catalog.json) are
+embedded ONCE with a small sentence-transformer. Each incoming query is then
+scored by cosine similarity against the in-scope exemplars and a short list of
+concepts the dataset does not cover, plus keyword hits on both sides. The
+result is one of:
+
+    in_scope      -> hand straight to the agent (no guardrail LLM call)
+    out_of_scope  -> reject locally
+    ambiguous     -> escalate to the LLM guardrail in eval.py
+
+Usage:
+    # Accuracy + latency on the OUT_OF_SCOPE and in-scope suites:
+    python scope_classifier.py
+
+    # Also time the LLM guardrail on the same queries (needs GROQ_API_KEY):
+    python scope_classifier.py --compare_llm
+"""
+
+import os
+import re
+import json
+import time
+import argparse
+from functools import lru_cache
+
+import numpy as np
+
+# --- Configuration ---
+BASE_DIR     = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CATALOG_PATH = os.path.join(BASE_DIR, "src", "archive", "config", "intent_catalog.json")
+EMBED_MODEL  = "all-MiniLM-L6-v2"   # same local model rag_retrieve.py uses
+
+KEYWORD_WEIGHT = 0.05   # added to a side's score per keyword hit (capped at 3 hits)
+DECISION_MARGIN = 0.08  # in/out score gap needed to decide without the LLM
+
+IN_SCOPE, OUT_OF_SCOPE_LABEL, AMBIGUOUS = "in_scope", "out_of_scope", "ambiguous"
+
+
+# ====================================================
+# Schema vocabulary
+# ====================================================
+
+COLUMN_DESCRIPTIONS = {
+    "timestamp": "time of the reading (date and clock time), when something happened",
+    "latitude": "GPS latitude of the bus, location or place",
+    "longitude": "GPS longitude of the bus, location or place",
+    "accel_mean": "average acceleration magnitude over the sampling window",
+    "accel_variance": "variance of acceleration, how jerky or bumpy the ride was",
+    "accel_stats_x_p1": "1st percentile of x-axis (longitudinal) acceleration",
+    "accel_stats_x_p10": "10th percentile of x-axis (longitudinal) acceleration",
+    "accel_stats_x_p90": "90th percentile of x-axis (longitudinal) acceleration",
+    "accel_stats_x_p99": "99th percentile of x-axis (longitudinal) acceleration",
+    "accel_stats_y_p1": "1st percentile of y-axis (lateral) acceleration",
+    "accel_stats_y_p10": "10th percentile of y-axis (lateral) acceleration",
+    "accel_stats_y_p90": "90th percentile of y-axis (lateral) acceleration",
+    "accel_stats_y_p99": "99th percentile of y-axis (lateral) acceleration",
+    "accel_stats_z_p1": "1st percentile of z-axis (vertical) acceleration",
+    "accel_stats_z_p10": "10th percentile of z-axis (vertical) acceleration",
+    "accel_stats_z_p90": "90th percentile of z-axis (vertical) acceleration",
+    "accel_stats_z_p99": "99th percentile of z-axis (vertical) acceleration",
+}
+
+# Concepts people ask about that the accelerometer + GPS feed cannot support.
+# (route speed is in scope: route_index derives avg_speed_mps from GPS distance / time)
+OUT_OF_SCOPE_CONCEPTS = [
+    "vehicle speedometer, wheel speed or velocity readings",
+    "battery level or charge",
+    "driver or passenger identity, passenger count",
+    "gyroscope, rotation or angular rate",
+    "weather, temperature or rain",
+    "traffic lights, signals or road infrastructure",
+    "fuel consumption, engine or fuel efficiency",
+    "road surface damage such as potholes",
+    "forecasting or predicting future values",
+]
+
+OUT_OF_SCOPE_KEYWORDS = [
+    # not bare "driver": how the bus is driven is read off the acceleration columns
+    "vehicle speed", "wheel speed", "speedometer", "velocity", "rpm", "battery", "driver id",
+    "driver name", "passenger", "gyroscope", "gyro", "weather", "rain", "temperature", "traffic", "fuel", "engine", "pothole",
+    "predict", "forecast",
+]
+
+COLUMN_KEYWORDS = [
+    "accel", "acceleration", "variance", "percentile", "p1", "p10", "p90", "p99",
+    "x-axis", "y-axis", "z-axis", "latitude", "longitude", "timestamp",
+    "location", "place", "readings", "recording", "distance", "traveled", "speed",
+]
+
+# endings a keyword may take and still count as the same word ("predict" ->
+# "predicted", "stop" -> "stopped"); anything else is a different word ("p1" / "p10")
+KEYWORD_SUFFIX = r"(?:s|es|d|ed|ing|ion|ions|ly|er|ers)?"
+
+
+def load_intent_catalog(catalog_path=CATALOG_PATH):
+    with open(catalog_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _keyword_pattern(kw):
+    # a final consonant may double before the ending (stop -> stopped)
+    double = f"{re.escape(kw[-1])}?" if kw[-1].isalpha() and kw[-1] not in "aeiou" else ""
+    # letters / digits on either side make it another word; _ separates (accel_stats_x_p1)
+    return re.compile(rf"(?<![a-z0-9]){re.escape(kw)}(?:{double}{KEYWORD_SUFFIX})(?![a-z0-9])")
+
+
+_KEYWORD_PATTERNS = {}
+
+
+def keyword_hits(text, keywords):
+    """Whole-word keyword matches (plus KEYWORD_SUFFIX endings) in lowercased text."""
+    hits = []
+    for kw in keywords:
+        pattern = _KEYWORD_PATTERNS.get(kw)
+        if pattern is None:
+            pattern = _KEYWORD_PATTERNS[kw] = _keyword_pattern(kw)
+        if pattern.search(text):
+            hits.append(kw)
+    return hits
+
+
+# ====================================================
+# Classifier
+# ====================================================
+
+class ScopeClassifier:
+    """
+    Embeds the schema + intent exemplars once; classifies queries on CPU.
+    The model loads and the exemplars embed on the first classify() (or
+    prepare()), so building the pipeline does not pay for them.
+    """
+
+    def __init__(self, columns=None, catalog=None, model_name=EMBED_MODEL):
+        self.catalog = catalog or load_intent_catalog()
+        self.oos_threshold = self.catalog.get("oosThreshold", 0.15)
+        self.model_name = model_name
+        self._model = None
+
+        columns = list(columns) if columns is not None else list(COLUMN_DESCRIPTIONS)
+        self.column_texts = [f"{col}: {COLUMN_DESCRIPTIONS.get(col, col.replace('_', ' '))}"
+                             for col in columns]
+        intents = self.catalog["intents"]
+        self.intent_texts = [f"{it['description']} ({', '.join(it['keywords'])})" for it in intents]
+
+        self.intent_ids = [it["id"] for it in intents]
+        self.intent_keywords = {it["id"]: it["keywords"] for it in intents}
+        self.in_keywords = COLUMN_KEYWORDS + [kw for it in intents for kw in it["keywords"]]
+        self.in_vecs = None
+
+        # memoize per query text; repeated eval runs hit this constantly
+        self._embed_query = lru_cache(maxsize=1024)(lambda q: self._embed([q])[0])
+
+    @property
+    def model(self):
+        if self._model is None:
+            # deferred import: sentence-transformers pulls in torch
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name, device="cpu")
+        return self._model
+
+    def prepare(self):
+        """Load the model and embed the exemplars (otherwise done by the first classify)."""
+        if self.in_vecs is None:
+            self.column_vecs = self._embed(self.column_texts)
+            self.intent_vecs = self._embed(self.intent_texts)
+            self.out_vecs = self._embed(OUT_OF_SCOPE_CONCEPTS)
+            self.in_vecs = np.vstack([self.column_vecs, self.intent_vecs])
+        return self
+
+    def _embed(self, texts):
+        return self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+
+    def classify(self, query):
+        """
+        Returns a dict:
+        {label, intent_id, in_score, out_score, in_hits, out_hits, latency_ms}
+        """
+        self.prepare()
+        t0 = time.perf_counter()
+        text = (query or "").lower()
+        q = self._embed_query(text)
+
+        # vectors are L2-normalised, so a dot product is the cosine similarity
+        in_sim  = float(np.max(self.in_vecs @ q))
+        out_sim = float(np.max(self.out_vecs @ q))
+        in_hits  = keyword_hits(text, self.in_keywords)
+        out_hits = keyword_hits(text, OUT_OF_SCOPE_KEYWORDS)
+
+        in_score  = in_sim  + KEYWORD_WEIGHT * min(len(in_hits), 3)
+        out_score = out_sim + KEYWORD_WEIGHT * min(len(out_hits), 3)
+
+        # a single missing concept makes the whole query unanswerable,
+        # so an out-of-scope keyword wins over any number of column hits
+        if out_hits or out_score >= in_score + DECISION_MARGIN:
+            label = OUT_OF_SCOPE_LABEL
+        elif in_sim < self.oos_threshold and not in_hits:
+            label = OUT_OF_SCOPE_LABEL
+        elif in_score >= out_score + DECISION_MARGIN:
+            label = IN_SCOPE
+        else:
+            label = AMBIGUOUS
+
+        # intent: cosine against intent exemplars, nudged by catalog keyword hits
+        intent_sims = self.intent_vecs @ q
+        intent_scores = {
+            iid: float(sim) + KEYWORD_WEIGHT * len(keyword_hits(text, self.intent_keywords[iid]))
+            for iid, sim in zip(self.intent_ids, intent_sims)
+        }
+        intent_id = max(intent_scores, key=intent_scores.get)
+
+        return {
+            "label": label,
+            "intent_id": intent_id,
+            "in_score": round(in_score, 4),
+            "out_score": round(out_score, 4),
+            "in_hits": in_hits,
+            "out_hits": out_hits,
+            "latency_ms": (time.perf_counter() - t0) * 1000,
+        }
+
+
+# ====================================================
+# Benchmark
+# ====================================================
+
+def _latency_summary(latencies_ms):
+    arr = np.asarray(latencies_ms)
+    return (f"mean={arr.mean():.2f}ms, p50={np.percentile(arr, 50):.2f}ms, "
+            f"p99={np.percentile(arr, 99):.2f}ms")
+
+
+def benchmark(compare_llm=False):
+    from queries import TEST_QUERIES, QUERY_INTENT, OUT_OF_SCOPE, ROUTE_QUERIES
+
+    t0 = time.perf_counter()
+    clf = ScopeClassifier().prepare()
+    print(f"Classifier ready in {time.perf_counter() - t0:.2f}s (one-off embedding cost)")
+
+    suites = [
+        ("OUT_OF_SCOPE", OUT_OF_SCOPE, OUT_OF_SCOPE_LABEL),
+        ("TEST_QUERIES", TEST_QUERIES, IN_SCOPE),
+        ("QUERY_INTENT", QUERY_INTENT, IN_SCOPE),
+        ("ROUTE_QUERIES", ROUTE_QUERIES, IN_SCOPE),
+    ]
+
+    all_queries = []
+    for name, queries, expected in suites:
+        clf._embed_query.cache_clear()   # measure cold per-query cost
+        decisions = [clf.classify(q) for q in queries]
+        correct   = sum(d["label"] == expected for d in decisions)
+        escalated = sum(d["label"] == AMBIGUOUS for d in decisions)
+        wrong     = len(decisions) - correct - escalated
+
+        print(f"\n{name} (expected {expected})")
+        for q, d in zip(queries, decisions):
+            mark = "ok " if d["label"] == expected else ("llm" if d["label"] == AMBIGUOUS else "ERR")
+            print(f"  [{mark}] {d['label']:<12} {d['intent_id']:<18} {q}")
+        print(f"  accuracy={correct}/{len(decisions)}  escalated={escalated}  wrong={wrong}")
+        print(f"  latency: {_latency_summary([d['latency_ms'] for d in decisions])}")
+        all_queries.extend(queries)
+
+    if compare_llm:
+        from eval import GROQ_API_KEY, build_llm, build_guardrail_chain, build_schema_summary
+        from eval import CSV_DEFAULT
+        import pandas as pd
+
+        if not GROQ_API_KEY:
+            raise ValueError("Missing GROQ_API_KEY. Set it before using --compare_llm")
+        guardrail_chain = build_guardrail_chain(build_llm(), build_schema_summary(pd.read_csv(CSV_DEFAULT)))
+        llm_latencies = []
+        for q in all_queries:
+            t = time.perf_counter()
+            guardrail_chain.invoke({"query": q})
+            llm_latencies.append((time.perf_counter() - t) * 1000)
+        print(f"\nLLM guardrail latency: {_latency_summary(llm_latencies)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the local scope classifier.")
+    parser.add_argument("--compare_llm", action="store_true",
+                        help="Also time the LLM guardrail on the same queries.")
+    args = parser.parse_args()
+    benchmark(compare_llm=args.compare_llm)
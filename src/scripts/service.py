@@ -0,0 +1,193 @@
+"""
+service.py
+----------
+Long-lived ASGI query service around the eval pipeline.
+
+eval.py / intentRecog.py pay for importing LangChain, reading the CSV, building
+column metadata, the dwell / route / moment indexes and every chain on EACH
+invocation. This service does that once at startup and keeps it warm:
+
+    - one ChatGroq client on a pooled keep-alive httpx client (no TLS handshake per call)
+    - dataframe, indexes, router, plan cache and agent built once by init_llm_components
+    - concurrent requests share that warm agent: its REPL namespace and plan cache
+      take one agent / plan run at a time (eval's repl_turn, which also clears the
+      variables each run defined), while rewriting, gating, routing and
+      contextualizing overlap
+    - percentile integrity report (quality.py) scanned once per dataset version
+    - hot reload: the dataset file's mtime is polled; a changed file is reloaded in
+      the background and swapped in atomically (in-flight queries finish on the old one)
+    - shared memory: with QUERY_SERVICE_SHM set to a manifest written by
+      `shm_frame.py publish`, every worker attaches to ONE published copy of the
+      dataframe instead of parsing the CSV itself; the manifest's mtime then drives
+      the reload (re-publish to roll out a new dataset)
+
+Endpoints:
+    POST /query   {"query": "..."}  -> NDJSON stream: {"event": "accepted"}, then
+                  {"event": "token", "text"}... (simple results arrive as one rendered
+                  sentence, LLM answers token by token), then {"event": "done", "ttfb",
+                  "latency"} (or {"event": "error"})
+    GET  /health  dataset path, rows, integrity summary, load time, reload count
+
+Usage:
+    python service.py                       # http://127.0.0.1:8000
+    python service.py --csv path/to/file.csv --port 8080
+
+    # Several workers sharing one copy of the data:
+    python shm_frame.py publish --csv ../../data/raw/bus_data.csv &
+    QUERY_SERVICE_SHM=../../data/processed/shm_manifest.json \\
+        uvicorn service:app --workers 4
+
+    curl -N -X POST localhost:8000/query -H 'Content-Type: application/json' \\
+         -d '{"query": "What is the average accel_variance?"}'
+
+server.js forwards /api/query here when QUERY_SERVICE_URL is set.
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+
+import httpx
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from eval import CSV_DEFAULT, build_llm, init_llm_components
+from quality import load_checked
+
+# --- Configuration ---
+RELOAD_POLL_S = 5.0   # how often the dataset mtime is checked
+KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY_S = 60.0
+LLM_TIMEOUT_S = 60.0
+
+CSV_PATH = os.getenv("QUERY_SERVICE_CSV", CSV_DEFAULT)
+SHM_MANIFEST = os.getenv("QUERY_SERVICE_SHM")
+
+
+class QueryRequest(BaseModel):
+    query: str
+
+
+class Pipeline:
+    """Everything built from one version of the dataset file."""
+
+    def __init__(self, csv_path, llm, manifest_path=None):
+        self.csv_path = csv_path
+        self.manifest_path = manifest_path
+        # an attached frame changes when the publisher rewrites its manifest
+        self.source = manifest_path or csv_path
+        self.mtime = os.path.getmtime(self.source)
+        t0 = time.time()
+        df, self.quality = load_checked(csv_path, manifest_path)
+        self.rows = len(df)
+        self.ask_agent = init_llm_components(df, llm=llm, quality=self.quality)
+        self.load_s = time.time() - t0
+
+
+state = {"pipeline": None, "reloads": 0}
+
+
+async def _watch_dataset(llm):
+    """Rebuild the pipeline in a worker thread whenever the dataset file changes."""
+    while True:
+        await asyncio.sleep(RELOAD_POLL_S)
+        current = state["pipeline"]
+        try:
+            mtime = os.path.getmtime(current.source)
+        except OSError:
+            continue   # file is being replaced; try again next poll
+        if mtime == current.mtime:
+            continue
+        try:
+            state["pipeline"] = await asyncio.to_thread(
+                Pipeline, current.csv_path, llm, current.manifest_path)
+            state["reloads"] += 1
+            print(f"Reloaded {current.source}: {state['pipeline'].rows:,} rows "
+                  f"in {state['pipeline'].load_s:.2f}s")
+        except Exception as e:
+            # keep serving the previous version; retry when the mtime moves again
+            current.mtime = mtime
+            print(f"Reload failed, keeping previous dataset: {e}")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    limits = httpx.Limits(max_keepalive_connections=KEEPALIVE_CONNECTIONS,
+                          keepalive_expiry=KEEPALIVE_EXPIRY_S)
+    http_client = httpx.Client(limits=limits, timeout=LLM_TIMEOUT_S)
+    http_async_client = httpx.AsyncClient(limits=limits, timeout=LLM_TIMEOUT_S)
+    llm = build_llm(http_client=http_client, http_async_client=http_async_client)
+
+    state["pipeline"] = await asyncio.to_thread(Pipeline, CSV_PATH, llm, SHM_MANIFEST)
+    print(f"Loaded {state['pipeline'].source}: {state['pipeline'].rows:,} rows "
+          f"in {state['pipeline'].load_s:.2f}s")
+    watcher = asyncio.create_task(_watch_dataset(llm))
+    try:
+        yield
+    finally:
+        watcher.cancel()
+        http_client.close()
+        await http_async_client.aclose()
+
+
+app = FastAPI(title="flash-fusion query service", lifespan=lifespan)
+
+
+def _event(payload):
+    return json.dumps(payload, default=str) + "\n"
+
+
+@app.post("/query")
+async def query(request: QueryRequest):
+    if not request.query.strip():
+        raise HTTPException(status_code=400, detail="Empty query")
+    pipeline = state["pipeline"]
+
+    async def stream():
+        t0 = time.time()
+        yield _event({"event": "accepted", "rows": pipeline.rows})
+        first = None
+        try:
+            async for text in pipeline.ask_agent.astream(request.query):
+                first = first or time.time() - t0
+                yield _event({"event": "token", "text": text})
+            yield _event({"event": "done", "ttfb": round(first or 0.0, 3),
+                          "latency": round(time.time() - t0, 3)})
+        except Exception as e:
+            yield _event({"event": "error", "message": str(e)})
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.get("/health")
+async def health():
+    pipeline = state["pipeline"]
+    return {
+        "status": "ok" if pipeline else "loading",
+        "csv": pipeline.csv_path if pipeline else CSV_PATH,
+        "shared_memory": SHM_MANIFEST,
+        "rows": pipeline.rows if pipeline else None,
+        "quality": pipeline.quality.summary() if pipeline else None,
+        "load_s": round(pipeline.load_s, 3) if pipeline else None,
+        "reloads": state["reloads"],
+    }
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the eval pipeline over HTTP.")
+    parser.add_argument("--csv", type=str, default=CSV_PATH)
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--shm", type=str, default=SHM_MANIFEST,
+                        help="Attach to a frame published by shm_frame.py via its manifest.")
+    args = parser.parse_args()
+
+    CSV_PATH = args.csv
+    SHM_MANIFEST = args.shm
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,249 @@
+"""
+shm_frame.py
+------------
+Publish a dataframe once into multiprocessing.shared_memory; worker processes
+attach zero-copy, read-only views and build their agent dataframe over them.
+
+Layout (one segment per block):
+    float block      all numeric columns as float64, column-major (rows x k), so
+                     each column is a contiguous slice and pandas keeps ONE block
+    timestamp block  datetime64[ns] as int64 (the CSV's timestamp strings, parsed once)
+    code block       remaining text columns as int32 category codes; the (small)
+                     category lists travel in the manifest
+
+The manifest (JSON) names the segments and column layout. N workers therefore
+cost one copy of the data, and attaching is a few page-table mappings plus a
+DataFrame header (well under a millisecond).
+
+Rows are published oldest-first (stable sort on the first timestamp column), so
+the time-ordered toolkits (kernels.KernelToolkit, context_sketch, geo's fixes)
+find the frame already sorted and share it instead of each keeping a sorted copy.
+
+Dtypes differ from a plain pd.read_csv: timestamp columns are datetime64[ns]
+(not strings) and other text columns are categorical (not object). Code that
+must run on both — ground truth, plan-cache programs, tools — parses with
+pd.to_datetime / compares values rather than relying on .str or string order.
+
+Views are read-only: agent code that assigns into an existing column gets a
+"read-only" error instead of silently changing every other worker's data;
+adding new columns still works (they are private to the worker).
+
+Usage:
+    # Publish and keep the segments alive until Ctrl-C:
+    python shm_frame.py publish --csv ../../data/raw/bus_data.csv
+
+    # Workers (e.g. service.py) attach through the manifest:
+    QUERY_SERVICE_SHM=../../data/processed/shm_manifest.json uvicorn service:app --workers 4
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+BASE_DIR      = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT   = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+PROCESSED_DIR = os.path.join(BASE_DIR, "data", "processed")
+SHM_MANIFEST  = os.path.join(PROCESSED_DIR, "shm_manifest.json")
+
+TIMESTAMP_COLUMNS = ("timestamp",)
+
+# attached segments must outlive the DataFrames built on them
+_attached = {}
+_published = set()
+
+
+def _column_kind(series):
+    if series.name in TIMESTAMP_COLUMNS or pd.api.types.is_datetime64_any_dtype(series):
+        return "ts"
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return "float"
+    return "code"
+
+
+def _new_block(array, prefix):
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1),
+                                     name=f"{prefix}_{os.getpid()}_{time.time_ns() % 10**9}")
+    view = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf,
+                      order="F" if array.ndim == 2 else "C")
+    view[...] = array
+    _published.add(shm.name)
+    return shm
+
+
+class SharedFrame:
+    """Owner of the published segments; keep it alive while workers are attached."""
+
+    def __init__(self, df):
+        kinds = {col: _column_kind(df[col]) for col in df.columns}
+        float_cols = [c for c in df.columns if kinds[c] == "float"]
+        ts_cols = [c for c in df.columns if kinds[c] == "ts"]
+        code_cols = [c for c in df.columns if kinds[c] == "code"]
+
+        self.blocks = {}
+        self.manifest = {"rows": len(df), "columns": list(map(str, df.columns)),
+                         "kinds": kinds, "float_columns": float_cols,
+                         "ts_columns": ts_cols, "code_columns": code_cols,
+                         "time_ordered": ts_cols[0] if ts_cols else None,
+                         "categories": {}, "blocks": {}}
+
+        if ts_cols:
+            stamps = np.column_stack([
+                pd.to_datetime(df[c]).to_numpy("datetime64[ns]").view(np.int64) for c in ts_cols
+            ])
+            order = np.argsort(stamps[:, 0], kind="stable")
+            if (order != np.arange(len(order))).any():
+                df, stamps = df.iloc[order], stamps[order]
+            self._publish("ts", np.asfortranarray(stamps))
+        if float_cols:
+            values = np.asfortranarray(df[float_cols].to_numpy(np.float64))
+            self._publish("float", values)
+        if code_cols:
+            codes = []
+            for c in code_cols:
+                cat = pd.Categorical(df[c])
+                self.manifest["categories"][c] = cat.categories.tolist()
+                codes.append(cat.codes.astype(np.int32))
+            self._publish("code", np.asfortranarray(np.column_stack(codes)))
+
+    def _publish(self, kind, array):
+        shm = _new_block(array, f"ff_{kind}")
+        self.blocks[kind] = shm
+        self.manifest["blocks"][kind] = {"name": shm.name, "dtype": array.dtype.str,
+                                         "shape": list(array.shape)}
+
+    def save_manifest(self, path=SHM_MANIFEST):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        return path
+
+    def close(self, unlink=True):
+        for shm in self.blocks.values():
+            shm.close()
+            if unlink:
+                shm.unlink()
+        self.blocks = {}
+
+
+def publish(df):
+    return SharedFrame(df)
+
+
+def _open_block(spec):
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(name=spec["name"], track=False)
+    else:
+        shm = shared_memory.SharedMemory(name=spec["name"])
+        # before 3.13 every attaching process registers the segment with its
+        # resource tracker, which would unlink it when that worker exits
+        if spec["name"] not in _published:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+    _attached[spec["name"]] = shm
+    view = np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=shm.buf, order="F")
+    view.flags.writeable = False
+    return view
+
+
+def attach(manifest):
+    """
+    DataFrame over read-only zero-copy views of the published blocks: rows
+    oldest-first, datetime64 timestamps, categorical text (see module docstring).
+    """
+    if isinstance(manifest, str):
+        with open(manifest, encoding="utf-8") as f:
+            manifest = json.load(f)
+
+    views = {kind: _open_block(spec) for kind, spec in manifest["blocks"].items()}
+    position = {kind: {c: i for i, c in enumerate(manifest[f"{kind}_columns"])}
+                for kind in ("float", "ts", "code")}
+
+    # consecutive columns of one kind become one sub-frame over a slice of its block
+    pieces, run = [], []
+    for col in manifest["columns"] + [None]:
+        kind = manifest["kinds"].get(col) if col is not None else None
+        if run and (kind != run[0][1] or col is None):
+            pieces.append(_piece(run, views, position, manifest))
+            run = []
+        if col is not None:
+            run.append((col, kind))
+    return pd.concat(pieces, axis=1, copy=False)
+
+
+def _piece(run, views, position, manifest):
+    kind = run[0][1]
+    cols = [c for c, _ in run]
+    lo, hi = position[kind][cols[0]], position[kind][cols[-1]] + 1
+    block = views[kind][:, lo:hi]
+    if kind == "float":
+        return pd.DataFrame(block, columns=cols, copy=False)
+    if kind == "ts":
+        return pd.DataFrame({c: pd.Series(block[:, i].view("datetime64[ns]"), copy=False)
+                             for i, c in enumerate(cols)}, copy=False)
+    return pd.DataFrame({c: pd.Categorical.from_codes(block[:, i], manifest["categories"][c])
+                         for i, c in enumerate(cols)})
+
+
+def detach():
+    """Close this process's mappings; drop every attached DataFrame first."""
+    for shm in _attached.values():
+        shm.close()
+    _attached.clear()
+
+
+def load_dataframe(csv_path, manifest_path=None, partition_filter=None):
+    """
+    Attach to a published frame when a manifest is given; a directory is a
+    date=/vehicle= partitioned dataset (partitions.py), read through
+    partition_filter (partitions.parse_filter) when given; else read the CSV.
+    Only the attached frame is sorted and typed (datetime64 / categorical);
+    the CSV comes back in file order with string timestamps.
+    """
+    if manifest_path:
+        return attach(manifest_path)
+    if os.path.isdir(csv_path):
+        from partitions import read_partitions
+        return read_partitions(csv_path, **(partition_filter or {}))
+    return pd.read_csv(csv_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish a CSV into shared memory.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pub = sub.add_parser("publish", help="Publish and hold the segments until interrupted.")
+    pub.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    pub.add_argument("--manifest", type=str, default=SHM_MANIFEST)
+    check = sub.add_parser("attach", help="Attach to a published frame and time it.")
+    check.add_argument("--manifest", type=str, default=SHM_MANIFEST)
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        t0 = time.perf_counter()
+        frame = publish(pd.read_csv(args.csv))
+        path = frame.save_manifest(args.manifest)
+        size = sum(shm.size for shm in frame.blocks.values())
+        print(f"Published {frame.manifest['rows']:,} rows ({size / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - t0:.2f}s; manifest → {path}")
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            signal.pause()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            frame.close()
+            os.remove(path)
+            print("Segments released.")
+    else:
+        t0 = time.perf_counter()
+        df = attach(args.manifest)
+        print(f"Attached {len(df):,} rows x {len(df.columns)} columns "
+              f"in {(time.perf_counter() - t0) * 1000:.2f}ms")
+        print(df.head(3).to_string())
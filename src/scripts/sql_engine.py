@@ -0,0 +1,205 @@
+"""
+sql_engine.py
+-------------
+DuckDB execution backend for the eval pipeline — the "SQL" naive baseline named
+in eval.py, next to the pandas dataframe agent.
+
+The frame eval.run loaded (same partition filter and --exclude_bad_rows as the
+pandas engine) is copied into an in-process DuckDB table once; standalone, the
+CSV/Parquet file is read directly. Each query
+goes through the SAME rewriter, local scope classifier / guardrail and
+contextualizer as the pandas engine; only the execution stage differs: a
+text-to-SQL chain writes one SELECT, DuckDB runs it (multi-threaded, vectorized,
+no Python REPL), and a failed statement gets one retry with the error message.
+DuckDB's own parser checks the statement is exactly one SELECT before it runs.
+
+init_sql_components returns an ask_agent with the same signature as the pandas
+one, so run() and the result log in eval.py compare both engines side by side:
+
+    python eval.py --engine sql
+    python eval.py --engine both --enlarged
+"""
+
+import os
+import re
+import time
+
+import duckdb
+import pandas as pd
+
+from scope_classifier import ScopeClassifier
+from renderer import render_answer
+
+# --- Configuration ---
+TABLE_NAME = "bus_data"
+MAX_RESULT_ROWS = 20   # rows of the SQL result passed to the contextualizer
+SQL_RETRIES = 1        # re-prompt once with the DuckDB error message
+
+SQL_SYSTEM = """
+You translate a column-grounded analytics question into ONE DuckDB SQL query.
+
+Table: {table}
+Columns (name, type, example):
+{schema}
+
+Rules:
+- Output ONLY the SQL statement. No explanation, no markdown fences.
+- Read-only: a single SELECT (or WITH ... SELECT) statement.
+- Use only the listed columns; quote nothing that is not a column.
+- 'timestamp' is a TIMESTAMP; compare it with TIMESTAMP 'YYYY-MM-DD HH:MM:SS' literals.
+- For "top N" use ORDER BY ... LIMIT N. For "which/when" questions also return the identifying columns.
+"""
+
+
+def _load_table(con, path, df=None):
+    if df is not None:
+        # the CSV loader keeps timestamps as strings; the prompt promises a TIMESTAMP
+        con.register("frame", df.assign(timestamp=pd.to_datetime(df["timestamp"])))
+        con.execute(f"CREATE OR REPLACE TABLE {TABLE_NAME} AS SELECT * FROM frame")
+        con.unregister("frame")
+        return
+    if os.path.isdir(path):
+        # partitions.py layout: rows keep every column, the date=/vehicle= path is not needed
+        path, reader = os.path.join(path, "*", "*", "*.parquet"), "read_parquet"
+    else:
+        reader = "read_parquet" if path.endswith(".parquet") else "read_csv_auto"
+    con.execute(f"CREATE OR REPLACE TABLE {TABLE_NAME} AS SELECT * FROM {reader}(?)", [path])
+
+
+def build_sql_column_metadata(con):
+    """Same shape as eval.build_column_metadata, computed by DuckDB's SUMMARIZE."""
+    meta = {}
+    for row in con.execute(f"SUMMARIZE {TABLE_NAME}").fetchdf().to_dict(orient="records"):
+        entry = {"dtype": row["column_type"], "n_unique": row["approx_unique"]}
+        if row["avg"] is not None:
+            entry.update({"min": row["min"], "max": row["max"], "mean": round(float(row["avg"]), 4)})
+        else:
+            entry["sample_values"] = [row["min"], row["max"]]
+        meta[row["column_name"]] = entry
+    return meta
+
+
+def build_sql_schema_summary(con):
+    first = con.execute(f"SELECT * FROM {TABLE_NAME} LIMIT 1").fetchdf()
+    lines = []
+    for name, dtype in con.execute(f"SELECT column_name, column_type FROM (DESCRIBE {TABLE_NAME})").fetchall():
+        sample = first[name].iloc[0] if len(first) else "N/A"
+        lines.append(f"- '{name}' (dtype: {dtype}, e.g. {sample})")
+    return "\n".join(lines)
+
+
+def _clean_sql(text):
+    text = text.strip()
+    fenced = re.search(r"```(?:sql)?\s*(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    if fenced:
+        text = fenced.group(1).strip()
+    return text.rstrip(";").strip()
+
+
+def _read_only_error(con, sql):
+    """None if sql parses as exactly one SELECT (WITH ... SELECT included), else the reason."""
+    statements = con.extract_statements(sql)
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        return "only a single SELECT statement is allowed"
+    return None
+
+
+def init_sql_components(path, local_guardrail=True, threads=None, retrieve_schema=None, df=None):
+    # eval.py imports this module lazily; the shared chain builders live there
+    from eval import (
+        GROQ_API_KEY, SCHEMA_INDEX_MIN_COLUMNS, build_llm, build_rewriter, build_contextualizer,
+        build_guardrail_chain, gate_query,
+    )
+    from schema_index import SchemaIndex
+    if not GROQ_API_KEY:
+        raise ValueError("Missing GROQ_API_KEY. Set it before running eval.py")
+
+    from langchain_core.prompts import ChatPromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
+
+    con = duckdb.connect(database=":memory:")
+    if threads:
+        con.execute(f"SET threads TO {int(threads)}")
+
+    t0 = time.time()
+    _load_table(con, path, df)
+    n_rows = con.execute(f"SELECT count(*) FROM {TABLE_NAME}").fetchone()[0]
+    print(f"DuckDB table '{TABLE_NAME}': {n_rows:,} rows loaded in {time.time() - t0:.2f}s")
+
+    llm = build_llm()
+    column_metadata = build_sql_column_metadata(con)
+    schema = build_sql_schema_summary(con)
+
+    scope_classifier = ScopeClassifier(list(column_metadata)) if local_guardrail else None
+    if retrieve_schema is None:
+        retrieve_schema = len(column_metadata) > SCHEMA_INDEX_MIN_COLUMNS
+    schema_index = (SchemaIndex(column_metadata, schema,
+                                model=scope_classifier.model if scope_classifier else None)
+                    if retrieve_schema else None)
+
+    rewrite_query = build_rewriter(llm, column_metadata, schema_index)
+    contextualizer_chain = build_contextualizer(llm)
+    guardrail_chain = build_guardrail_chain(llm, schema, schema_index)
+
+    sql_system = SQL_SYSTEM.format(table=TABLE_NAME, schema=schema).replace("{", "{{").replace("}", "}}")
+    sql_chain = (
+        ChatPromptTemplate.from_messages([
+            ("system", sql_system),
+            ("human", "Question: {query}{error_hint}"),
+        ])
+        | llm
+        | StrOutputParser()
+    )
+
+    def run_sql(rewritten_query, trace):
+        error_hint = ""
+        for attempt in range(SQL_RETRIES + 1):
+            sql = _clean_sql(sql_chain.invoke({"query": rewritten_query, "error_hint": error_hint}))
+            trace.append(f"SQL (attempt {attempt + 1}): {sql}")
+            try:
+                error = _read_only_error(con, sql)
+                if error is None:
+                    result = con.execute(sql).fetchdf()
+                    if result.shape == (1, 1):
+                        raw = str(result.iat[0, 0])   # scalar, as the pandas agent returns it
+                    else:
+                        raw = result.head(MAX_RESULT_ROWS).to_string()
+                    if len(result) > MAX_RESULT_ROWS:
+                        raw += f"\n... ({len(result)} rows total)"
+                    trace.append(f"Result:\n{raw}")
+                    return raw
+            except duckdb.Error as e:
+                error = str(e).splitlines()[0]
+            trace.append(f"Error: {error}")
+            error_hint = f"\n\nYour previous SQL failed with: {error}\nPrevious SQL: {sql}\nFix it."
+        raise RuntimeError(f"SQL generation failed: {error}")
+
+    def ask_agent(user_query):
+        t0 = time.time()
+
+        rewritten_query, unmappable = rewrite_query(user_query)
+        if unmappable:
+            reason = f"Query requires concepts not present in dataset: {', '.join(unmappable)}"
+            return f"[REJECTED] {reason}", f"Unmappable concepts detected: {unmappable}", time.time() - t0
+
+        rejection = gate_query(rewritten_query, scope_classifier, guardrail_chain)
+        if rejection:
+            answer, trace = rejection
+            return answer, trace, time.time() - t0
+
+        trace = [f"Rewritten: {rewritten_query}"]
+        try:
+            raw_answer = run_sql(rewritten_query, trace)
+            rendered = render_answer(rewritten_query, raw_answer, list(column_metadata))
+            if rendered:
+                trace.append("Rendered without LLM")
+                return rendered, "\n".join(trace), time.time() - t0
+            nl_answer = contextualizer_chain.invoke({
+                "question": user_query,
+                "raw_answer": raw_answer,
+            }).strip()
+            return nl_answer, "\n".join(trace), time.time() - t0
+        except Exception as e:
+            return f"[ERROR] {e}", "\n".join(trace), time.time() - t0
+
+    return ask_agent
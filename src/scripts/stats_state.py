@@ -0,0 +1,272 @@
+"""
+stats_state.py
+--------------
+Mergeable running statistics over the accelerometer columns, maintained next to
+the loaded dataframe so correlation / PCA / moment questions never rescan it.
+
+State per column: count, mean and central moment sums M2..M4, plus the full
+co-moment matrix across columns. A new batch is summarised in one vectorized
+pass and folded in with the pairwise (Chan / Pébay) update, which costs
+O(columns^2) regardless of how many rows were seen before. Two states built on
+different chunks or files merge the same way.
+
+Usage:
+    # Build the state for a CSV (optionally chunked) and print the summaries:
+    python stats_state.py
+    python stats_state.py --csv path/to/file.csv --chunksize 100000
+"""
+
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+BASE_DIR    = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+CSV_DEFAULT = os.path.join(BASE_DIR, "data", "raw", "bus_data.csv")
+
+ACCEL_COLUMNS = ["accel_mean", "accel_variance"] + [
+    f"accel_stats_{axis}_p{p}" for axis in "xyz" for p in (1, 10, 90, 99)
+]
+
+
+class MomentState:
+    """Running count, mean, M2..M4 per column and co-moments across columns."""
+
+    def __init__(self, columns=ACCEL_COLUMNS):
+        k = len(columns)
+        self.columns = list(columns)
+        self.n = 0
+        self.mean = np.zeros(k)
+        self.m2 = np.zeros(k)
+        self.m3 = np.zeros(k)
+        self.m4 = np.zeros(k)
+        self.comoment = np.zeros((k, k))
+
+    # ---- building ----
+
+    @classmethod
+    def from_frame(cls, df, columns=ACCEL_COLUMNS):
+        state = cls(columns)
+        state.update(df)
+        return state
+
+    @classmethod
+    def _from_array(cls, x, columns):
+        """Exact moments of one batch (rows x columns), in a single pass over it."""
+        state = cls(columns)
+        state.n = len(x)
+        if not state.n:
+            return state
+        state.mean = x.mean(axis=0)
+        d = x - state.mean
+        d2 = d * d
+        state.m2 = d2.sum(axis=0)
+        state.m3 = (d2 * d).sum(axis=0)
+        state.m4 = (d2 * d2).sum(axis=0)
+        state.comoment = d.T @ d
+        return state
+
+    def update(self, df):
+        """Fold a new batch of rows into the state."""
+        x = df[self.columns].dropna().to_numpy(np.float64)
+        self.merge_in(MomentState._from_array(x, self.columns))
+        return self
+
+    def merge_in(self, other):
+        """Pairwise merge (Pébay 2008); cost is independent of row counts."""
+        if other.columns != self.columns:
+            raise ValueError("Cannot merge states over different columns")
+        if not other.n:
+            return self
+        if not self.n:
+            self.__dict__.update({k: (v.copy() if isinstance(v, np.ndarray) else v)
+                                  for k, v in other.__dict__.items()})
+            return self
+
+        na, nb = self.n, other.n
+        n = na + nb
+        delta = other.mean - self.mean
+        d2 = delta * delta
+
+        m4 = (self.m4 + other.m4
+              + d2 * d2 * na * nb * (na * na - na * nb + nb * nb) / n ** 3
+              + 6 * d2 * (na * na * other.m2 + nb * nb * self.m2) / n ** 2
+              + 4 * delta * (na * other.m3 - nb * self.m3) / n)
+        m3 = (self.m3 + other.m3
+              + d2 * delta * na * nb * (na - nb) / n ** 2
+              + 3 * delta * (na * other.m2 - nb * self.m2) / n)
+        m2 = self.m2 + other.m2 + d2 * na * nb / n
+
+        self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * na * nb / n
+        self.mean = self.mean + delta * nb / n
+        self.m2, self.m3, self.m4 = m2, m3, m4
+        self.n = n
+        return self
+
+    @staticmethod
+    def merge(states):
+        merged = MomentState(states[0].columns)
+        for state in states:
+            merged.merge_in(state)
+        return merged
+
+    # ---- queries (sample statistics, matching pandas defaults) ----
+
+    def var(self):
+        return self.m2 / (self.n - 1)
+
+    def std(self):
+        return np.sqrt(self.var())
+
+    def skew(self):
+        """Adjusted Fisher-Pearson skewness, as pandas .skew()."""
+        n = self.n
+        g1 = np.sqrt(n) * self.m3 / self.m2 ** 1.5
+        return g1 * np.sqrt(n * (n - 1)) / (n - 2)
+
+    def kurtosis(self):
+        """Excess kurtosis with the small-sample correction, as pandas .kurt()."""
+        n = self.n
+        g2 = n * self.m4 / self.m2 ** 2 - 3
+        return ((n + 1) * g2 + 6) * (n - 1) / ((n - 2) * (n - 3))
+
+    def cov(self):
+        return pd.DataFrame(self.comoment / (self.n - 1), index=self.columns, columns=self.columns)
+
+    def corr(self):
+        scale = np.sqrt(np.diag(self.comoment))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = self.comoment / np.outer(scale, scale)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    def moments(self):
+        return pd.DataFrame({
+            "mean": self.mean, "std": self.std(),
+            "skew": self.skew(), "kurtosis": self.kurtosis(),
+        }, index=self.columns)
+
+    def pca(self, columns=None, standardize=True):
+        """
+        Eigen-decomposition of the (correlation or covariance) matrix. Constant
+        columns have no correlation (NaN rows) and are left out, under "dropped".
+        """
+        columns = columns or self.columns
+        m2 = dict(zip(self.columns, self.m2))
+        dropped = [c for c in columns if not m2[c] > 0]
+        columns = [c for c in columns if c not in dropped]
+        if not columns:
+            raise ValueError(f"no column with nonzero variance among {', '.join(dropped)}")
+        matrix = (self.corr() if standardize else self.cov()).loc[columns, columns].to_numpy()
+        eigvals, eigvecs = np.linalg.eigh(matrix)
+        order = np.argsort(eigvals)[::-1]
+        eigvals, eigvecs = eigvals[order], eigvecs[:, order]
+        ratio = eigvals / eigvals.sum()
+        return {
+            "explained_variance_ratio": ratio,
+            "cumulative": np.cumsum(ratio),
+            "components": pd.DataFrame(eigvecs, index=columns,
+                                       columns=[f"PC{i + 1}" for i in range(len(columns))]),
+            "dropped": dropped,
+        }
+
+    def heavy_tail_ranking(self):
+        return self.moments().sort_values("kurtosis", ascending=False)
+
+    # ---- persistence ----
+
+    def to_dict(self):
+        return {"columns": self.columns, "n": self.n, "mean": self.mean.tolist(),
+                "m2": self.m2.tolist(), "m3": self.m3.tolist(), "m4": self.m4.tolist(),
+                "comoment": self.comoment.tolist()}
+
+    @classmethod
+    def from_dict(cls, payload):
+        state = cls(payload["columns"])
+        state.n = payload["n"]
+        for key in ("mean", "m2", "m3", "m4", "comoment"):
+            setattr(state, key, np.asarray(payload[key], dtype=np.float64))
+        return state
+
+    # ---- agent tools ----
+
+    def correlation_tool(self, text):
+        cols = [c.strip(" '\"`") for c in str(text).split(",") if c.strip(" '\"`") in self.columns]
+        corr = self.corr().loc[cols, cols] if len(cols) >= 2 else self.corr()
+        return corr.round(4).to_string()
+
+    def pca_tool(self, text):
+        cols = [c.strip(" '\"`") for c in str(text).split(",") if c.strip(" '\"`") in self.columns]
+        result = self.pca(cols if len(cols) >= 2 else None)
+        k90 = int(np.searchsorted(result["cumulative"], 0.9) + 1)
+        ratios = ", ".join(f"PC{i + 1}={r:.3f}" for i, r in enumerate(result["explained_variance_ratio"]))
+        dropped = (f"Constant column(s) left out: {', '.join(result['dropped'])}\n"
+                   if result["dropped"] else "")
+        return (f"{dropped}Explained variance ratio: {ratios}\n"
+                f"{k90} component(s) explain >= 90% of the variance.\n"
+                f"Loadings (first 3):\n{result['components'].iloc[:, :3].round(3).to_string()}")
+
+    def moments_tool(self, text):
+        return (f"n={self.n:,}\n"
+                f"{self.heavy_tail_ranking().round(4).to_string()}")
+
+    def as_tools(self):
+        from langchain_core.tools import Tool
+
+        def safe(fn):
+            # bad inputs / degenerate state go back to the agent as an observation
+            # (np.linalg.LinAlgError is a ValueError)
+            def call(text):
+                try:
+                    return fn(text)
+                except (ValueError, KeyError, TypeError) as e:
+                    return f"Error: {e}"
+            return call
+
+        return [
+            Tool(name="correlation", func=safe(self.correlation_tool),
+                 description="Pearson correlation matrix from precomputed state. "
+                             "Input: comma-separated column names (empty = all accel columns)."),
+            Tool(name="pca", func=safe(self.pca_tool),
+                 description="PCA on the correlation matrix of accel columns from precomputed state. "
+                             "Input: comma-separated column names (empty = all)."),
+            Tool(name="moments", func=safe(self.moments_tool),
+                 description="mean, std, skew and excess kurtosis for every accel column, ranked "
+                             "by kurtosis (most heavy-tailed first). Input: ignored."),
+        ]
+
+
+def state_from_csv(path, chunksize=None, columns=ACCEL_COLUMNS):
+    """Build a state from a CSV, optionally chunk by chunk (bounded memory)."""
+    if not chunksize:
+        return MomentState.from_frame(pd.read_csv(path, usecols=columns), columns)
+    state = MomentState(columns)
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=chunksize):
+        state.update(chunk)
+    return state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build mergeable moment/covariance state.")
+    parser.add_argument("--csv", type=str, default=CSV_DEFAULT)
+    parser.add_argument("--chunksize", type=int, default=None)
+    parser.add_argument("--save", type=str, default=None, help="Write the state as JSON.")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    state = state_from_csv(args.csv, args.chunksize)
+    print(f"State over {state.n:,} rows built in {time.perf_counter() - t0:.3f}s")
+
+    t0 = time.perf_counter()
+    corr = state.corr()
+    pca = state.pca()
+    print(f"corr + PCA from state: {(time.perf_counter() - t0) * 1e6:.0f}us")
+    print(state.heavy_tail_ranking().round(4).to_string())
+    print(f"\nPCA cumulative: {np.round(pca['cumulative'], 3)}")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(state.to_dict(), f)
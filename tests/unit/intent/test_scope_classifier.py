@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+from scope_classifier import ScopeClassifier, IN_SCOPE, OUT_OF_SCOPE_LABEL, AMBIGUOUS
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return ScopeClassifier().prepare()
+
+
+@pytest.mark.parametrize("query, labels", [
+    # driving behaviour is inferred from acceleration: never rejected locally
+    ("How aggressive is the driver when braking?", {IN_SCOPE, AMBIGUOUS}),
+    ("What is the average accel_variance?", {IN_SCOPE}),
+    ("Show the 99th percentile of x-axis acceleration by location", {IN_SCOPE}),
+    # an out-of-scope keyword wins over any column hit
+    ("How many unique driver IDs are in the dataset?", {OUT_OF_SCOPE_LABEL}),
+    ("What was the battery level when accel_variance peaked?", {OUT_OF_SCOPE_LABEL}),
+    ("Forecast tomorrow's acceleration", {OUT_OF_SCOPE_LABEL}),
+])
+def test_classify_label(classifier, query, labels):
+    assert classifier.classify(query)["label"] in labels
+
+
+@pytest.mark.parametrize("query, intent_id", [
+    ("How aggressive is the driver when braking?", "aggressivePatterns"),
+    ("Where did the bus dwell the longest?", "dwellTime"),
+])
+def test_classify_intent(classifier, query, intent_id):
+    assert classifier.classify(query)["intent_id"] == intent_id
+
+
+def test_classify_reports_keyword_hits(classifier):
+    result = classifier.classify("How aggressive is the driver when braking?")
+    assert result["out_hits"] == [] and "aggressive" in result["in_hits"]
@@ -0,0 +1,41 @@
+import pytest
+
+from queries import TEST_QUERIES, QUERY_INTENT, OUT_OF_SCOPE, ROUTE_QUERIES
+from scope_classifier import keyword_hits, OUT_OF_SCOPE_KEYWORDS, COLUMN_KEYWORDS
+
+
+@pytest.mark.parametrize("text, keywords, expected", [
+    # whole words only
+    ("ratio of stops", ["ratio"], ["ratio"]),
+    ("average acceleration", ["ratio"], []),
+    ("what is accel_stats_x_p10?", ["p1"], []),
+    ("what is accel_stats_x_p1?", ["p1"], ["p1"]),
+    # KEYWORD_SUFFIX endings, with a doubled final consonant
+    ("where was the bus stopped", ["stop"], ["stop"]),
+    ("how many stops", ["stop"], ["stop"]),
+    ("any potholes", ["pothole"], ["pothole"]),
+    ("a stopwatch reading", ["stop"], []),
+    # multi-word keywords
+    ("average vehicle speed", ["vehicle speed", "speed"], ["vehicle speed", "speed"]),
+    ("average speed along the route", ["vehicle speed"], []),
+])
+def test_keyword_hits(text, keywords, expected):
+    assert keyword_hits(text, keywords) == expected
+
+
+@pytest.mark.parametrize("query", OUT_OF_SCOPE)
+def test_out_of_scope_suite_hits_an_oos_keyword(query):
+    assert keyword_hits(query.lower(), OUT_OF_SCOPE_KEYWORDS)
+
+
+@pytest.mark.parametrize("query", TEST_QUERIES + QUERY_INTENT + ROUTE_QUERIES + [
+    "What was the average speed of the bus?",
+    "How long did the bus stay stopped at each stop?",
+    "How aggressive is the driver when braking?",
+])
+def test_in_scope_queries_hit_no_oos_keyword(query):
+    assert keyword_hits(query.lower(), OUT_OF_SCOPE_KEYWORDS) == []
+
+
+def test_route_speed_is_a_column_keyword():
+    assert keyword_hits("average speed between stops", COLUMN_KEYWORDS) == ["speed"]
@@ -0,0 +1,31 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from context_sketch import build_sketch, estimate_tokens, CSV_DEFAULT, TOKEN_BUDGET
+
+
+def _bus():
+    if not os.path.exists(CSV_DEFAULT):
+        pytest.skip("raw bus data not available")
+    return pd.read_csv(CSV_DEFAULT)
+
+
+def _wide(columns=337, rows=500):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(rng.normal(size=(rows, columns)), columns=[f"sensor_{i}" for i in range(columns)])
+    df.insert(0, "timestamp", pd.date_range("2025-06-06", periods=rows, freq="s").astype(str))
+    return df
+
+
+@pytest.mark.parametrize("frame", [_bus, _wide])
+@pytest.mark.parametrize("budget", [1, 10, 30, 100, 200, TOKEN_BUDGET])
+def test_sketch_fits_budget(frame, budget):
+    assert estimate_tokens(build_sketch(frame(), budget)) <= budget
+
+
+def test_default_budget_keeps_detail():
+    text = build_sketch(_bus())
+    assert "Quantiles" in text and "Trends" in text and "Representative rows" in text
@@ -0,0 +1,110 @@
+import pandas as pd
+import pytest
+
+from plan_cache import PlanCache, parameterize, templatize, result_shape
+
+DF = pd.DataFrame({
+    "timestamp": pd.date_range("2025-06-06", periods=6, freq="12h").astype(str),
+    "accel_variance": [0.0, 0.1, 0.2, 0.3, 0.4, 0.5],
+})
+
+
+def run(code):
+    """Stand-in for the REPL tool: value of the last line, or the exception as text."""
+    namespace = {"df": DF, "pd": pd}
+    try:
+        *body, last = code.strip().split("\n")
+        exec("\n".join(body), namespace)
+        return str(eval(last, namespace))
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+@pytest.mark.parametrize("query, code, expected", [
+    ("rows with accel_variance greater than 0",
+     "df[df['accel_variance'] > 0].shape[0]",
+     "df[df['accel_variance'] > __p0__].shape[0]"),
+    ("rows with accel_variance above -0.5",
+     "df[df.accel_variance > -0.5].iloc[-1]",
+     "df[df.accel_variance > __p0__].iloc[-1]"),
+    ("top 3 rows by accel_variance",
+     "df.nlargest(3, 'accel_variance')",
+     "df.nlargest(__p0__, 'accel_variance')"),
+    ("rows after 2025-06-07",
+     "(df['timestamp'] > '2025-06-07 00:00:00').sum()",
+     "(df['timestamp'] > '__p0__ 00:00:00').sum()"),
+    # the constant only appears as an index: nothing to lift
+    ("value of row 2", "df['accel_variance'].iloc[2]", None),
+    # ambiguous constants
+    ("between 5 and 5", "df[(df.a >= 5) & (df.a <= 5)]", None),
+])
+def test_parameterize_lifts_operands_not_subscripts(query, code, expected):
+    assert parameterize(code, templatize(query)[1]) == expected
+
+
+def test_cached_plan_rebinds_new_threshold():
+    cache = PlanCache(DF.columns, path=None)
+    query, code = "How many rows have accel_variance greater than 0?", "df[df['accel_variance'] > 0].shape[0]"
+    assert cache.record(query, [("python_repl_ast", code, run(code))], run)
+    code, _ = cache.lookup("How many rows have accel_variance greater than 0.15?")
+    assert run(code) == "4"
+
+
+def test_integer_only_constant_misses_on_fraction():
+    cache = PlanCache(DF.columns, path=None)
+    query, code = "top 3 rows by accel_variance", "df.nlargest(3, 'accel_variance')"
+    assert cache.record(query, [("python_repl_ast", code, run(code))], run)
+    assert cache.lookup("top 2.5 rows by accel_variance") is None
+    assert cache.lookup("top 2 rows by accel_variance") is not None
+
+
+def test_plan_failing_with_perturbed_constants_is_not_recorded():
+    cache = PlanCache(DF.columns, path=None)
+    # the constant is an argument, but only the original value is a valid position
+    query, code = "value of accel_variance above 5", "df['accel_variance'].to_list().pop(5)"
+    assert cache.record(query, [("python_repl_ast", code, run(code))], run) is None
+
+
+def test_evict():
+    cache = PlanCache(DF.columns, path=None)
+    query, code = "rows above 0.1", "(df.accel_variance > 0.1).sum()"
+    template = cache.record(query, [("python_repl_ast", code, run(code))], run)
+    cache.evict(template)
+    assert cache.lookup(query) is None
+
+
+def test_background_validation_stores_after_drain():
+    cache = PlanCache(DF.columns, path=None, background=True)
+    query, code = "rows above 0.1", "(df.accel_variance > 0.1).sum()"
+    assert cache.record(query, [("python_repl_ast", code, run(code))], run) is None
+    cache.drain()
+    code, _ = cache.lookup("rows above 0.3")
+    assert run(code) == "2"
+
+
+def test_corrupt_file_loads_empty_and_is_replaced(tmp_path):
+    path = tmp_path / "plan_cache.json"
+    path.write_text('{"truncated": {')
+    cache = PlanCache(DF.columns, path=str(path))
+    assert cache.plans == {}
+    query, code = "rows above 0.1", "(df.accel_variance > 0.1).sum()"
+    assert cache.record(query, [("python_repl_ast", code, run(code))], run)
+    assert PlanCache(DF.columns, path=str(path)).lookup("rows above 0.2") is not None
+
+
+def test_save_keeps_plans_other_processes_wrote(tmp_path):
+    path = str(tmp_path / "plan_cache.json")
+    first, second = PlanCache(DF.columns, path=path), PlanCache(DF.columns, path=path)
+    for cache, (query, code) in ((first, ("rows above 0.1", "(df.accel_variance > 0.1).sum()")),
+                                 (second, ("top 3 rows by accel_variance", "df.nlargest(3, 'accel_variance')"))):
+        assert cache.record(query, [("python_repl_ast", code, run(code))], run)
+    reloaded = PlanCache(DF.columns, path=path)
+    assert reloaded.lookup("rows above 0.2") and reloaded.lookup("top 2 rows by accel_variance")
+
+
+@pytest.mark.parametrize("observation, shape", [
+    ("42", "number"), ("1,218", "number"), ("TypeError: tuple indices must be integers", "error"),
+    ("   a  b\n0  1  2", "table"), ("Monday", "text"),
+])
+def test_result_shape(observation, shape):
+    assert result_shape(observation) == shape
@@ -0,0 +1,52 @@
+import pytest
+
+from renderer import render_answer
+
+COLUMNS = ["timestamp", "latitude", "longitude", "accel_mean", "accel_variance",
+           "accel_stats_x_p1", "accel_stats_x_p10", "accel_stats_x_p99"]
+
+
+@pytest.mark.parametrize("query, raw, expected", [
+    ("How many rows have accel_variance greater than 0.15?", "412",
+     "There are 412 rows that have accel_variance greater than 0.15."),
+    ("What is the average accel_variance?", "0.26662674", "The average accel_variance is 0.2666."),
+    ("What is the maximum accel_stats_x_p99?", "4.61", "The maximum accel_stats_x_p99 is 4.61."),
+    ("What is the average accel_mean where accel_variance > 0.2?", "9.3",
+     "The average accel_mean for rows where accel_variance > 0.2 is 9.3."),
+    ("What is the earliest timestamp?", "2025-06-06 10:00:00", "The earliest timestamp is 2025-06-06 10:00:00."),
+    ("When was accel_variance highest?", "2025-06-06 10:00:00",
+     "The maximum accel_variance occurred at 2025-06-06 10:00:00."),
+    ("max accel_stats_x_p99 and its corresponding timestamp",
+     "accel_stats_x_p99    4.61\ntimestamp    2025-06-06 10:00:00",
+     "The record with the maximum value has accel_stats_x_p99 4.61, timestamp 2025-06-06 10:00:00."),
+])
+def test_renders_fully_understood_shapes(query, raw, expected):
+    assert render_answer(query, raw, COLUMNS) == expected
+
+
+@pytest.mark.parametrize("query, raw", [
+    # counts something other than rows
+    ("Count the number of unique latitude-longitude locations", "1218"),
+    # asks for a field the result does not contain
+    ("max accel_stats_x_p99 and its corresponding timestamp", "4.61"),
+    # a fraction is not a percentage
+    ("What proportion of rows have accel_variance greater than 0.1?", "0.5"),
+    ("What percentage of rows have accel_variance greater than 0.1?", "50"),
+    # yes/no question
+    ("Is there any row where accel_variance is above 5?", "0"),
+    # qualifiers and units the sentence would drop
+    ("What is the average accel_variance per hour?", "0.2"),
+    ("What is the average accel_stats_x_p10 in m/s2?", "1.2"),
+    ("What is the earliest accel_variance spike?", "2025-06-06 10:00:00"),
+    # filter the renderer cannot restate
+    ("How many rows have accel_variance above the average?", "600"),
+    ("", "1"),
+])
+def test_falls_back_to_the_contextualizer(query, raw):
+    assert render_answer(query, raw, COLUMNS) is None
+
+
+def test_prefix_column_names_do_not_collide():
+    # accel_stats_x_p1 must not be read inside accel_stats_x_p10
+    assert render_answer("What is the average accel_stats_x_p10?", "1.5", COLUMNS) == \
+        "The average accel_stats_x_p10 is 1.5."
@@ -0,0 +1,39 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from extremes import ExtremeIndex, Window, exact_top_n, CSV_DEFAULT, SCORES
+
+
+@pytest.fixture(scope="module")
+def bus():
+    if not os.path.exists(CSV_DEFAULT):
+        pytest.skip("raw bus data not available")
+    df = pd.read_csv(CSV_DEFAULT)
+    # through a save/load round trip, as ingest.py keeps it
+    index = ExtremeIndex.from_dict(json.loads(json.dumps(ExtremeIndex.from_frame(df).to_dict())))
+    return df, index
+
+
+@pytest.mark.parametrize("score, n, min_rate", [
+    ("magnitude", 1, 0.9),
+    ("x_p99", 1, 0.9),
+    ("magnitude", 5, 0.85),
+])
+def test_time_windows_certify(bus, score, n, min_rate):
+    df, index = bus
+    stamps = np.sort(pd.to_datetime(df["timestamp"]).to_numpy())
+    rng = np.random.default_rng(0)
+    certified = 0
+    for _ in range(200):
+        a, b = np.sort(rng.choice(len(stamps), 2, replace=False))
+        start, end = str(pd.Timestamp(stamps[a])), str(pd.Timestamp(stamps[b]))
+        r = index.top_n(score, n, start, end)
+        if r["exact"]:
+            certified += 1
+            assert r["rows"] == exact_top_n(df, SCORES[score], n, Window(start, end))
+    assert certified / 200 >= min_rate
+